@@ -1,14 +1,17 @@
 import bpy
 import copy
 
-from ..utils.obj_utils import ObjUtils
+from concurrent.futures import ThreadPoolExecutor
+
 from ..utils.log_utils import LOG
+from ..utils.timer_utils import TimerUtils
 from ..utils.collection_utils import CollectionUtils, CollectionColor
 from ..utils.config_utils import ConfigUtils
 
 from ..common.migoto_format import M_Key, ObjDataModel, M_Condition, D3D11GameType
+from ..config.properties_generate_mod import Properties_GenerateMod
 
-from .mesh_exporter import MeshExporter
+from .mesh_exporter import MeshExporter, BufferModel
 
 
 
@@ -240,11 +243,10 @@ class BranchModel:
         (2) 读取obj的ib
         (3) 设置到最终的ordered_draw_obj_model_list
         '''
-        __obj_name_ib_dict:dict[str,list] = {} 
-        __obj_name_category_buffer_list_dict:dict[str,list] =  {} 
-
         obj_name_obj_model_cache_dict:dict[str,ObjDataModel] = {}
+        obj_name_buffer_model_dict:dict[str,BufferModel] = {}
 
+        # (1) 第一阶段：在主线程中依次从Blender读取每个obj的数据，bpy不是线程安全的，所以这一步不能并行
         for obj_model in self.ordered_draw_obj_data_model_list:
 
             # 只统计给定DrawIB的数据
@@ -253,43 +255,47 @@ class BranchModel:
 
             obj_name = obj_model.obj_name
 
-            obj = bpy.data.objects[obj_name]
-            
-            obj_model = obj_name_obj_model_cache_dict.get(obj_name,None)
-            if obj_model is not None:
+            if obj_name in obj_name_obj_model_cache_dict or obj_name in obj_name_buffer_model_dict:
                 LOG.info("Using cached model for " + obj_name)
-                __obj_name_ib_dict[obj.name] = obj_model.ib
-                __obj_name_category_buffer_list_dict[obj.name] = obj_model.category_buffer_dict
-            else:
-                # 选中当前obj对象
-                bpy.context.view_layer.objects.active = obj
+                continue
 
-                # XXX 我们在导出具体数据之前，先对模型整体的权重进行normalize_all预处理，才能让后续的具体每一个权重的normalize_all更好的工作
-                # 使用这个的前提是当前obj中没有锁定的顶点组，所以这里要先进行判断。
+            obj = bpy.data.objects[obj_name]
 
-                # XXX 这里不论开关都不对鸣潮Mod造成影响
-                if "Blend" in d3d11_game_type.OrderedCategoryNameList:
-                    all_vgs_locked = ObjUtils.is_all_vertex_groups_locked(obj)
-                    if not all_vgs_locked:
-                        ObjUtils.normalize_all(obj)
+            # 选中当前obj对象
+            bpy.context.view_layer.objects.active = obj
 
-                # print("DrawIB BranchModel")
-                ib, category_buffer_dict, index_vertex_id_dict = MeshExporter.get_buffer_ib_vb_fast(d3d11_game_type)
+            # XXX 我们在导出具体数据之前，先对模型整体的权重进行normalize_all预处理，才能让后续的具体每一个权重的normalize_all更好的工作
+            # 这里直接在读取出的权重上规格化，不再切换到权重绘制模式调用bpy.ops，也不会修改场景中的obj，锁定的顶点组在gather_buffer_model中处理
 
-                # print(len(category_buffer_dict["Blend"]))
-                # print(len(index_vertex_id_dict))
-                
-                __obj_name_ib_dict[obj.name] = ib
-                __obj_name_category_buffer_list_dict[obj.name] = category_buffer_dict
+            # XXX 这里不论开关都不对鸣潮Mod造成影响
+            normalize_all_weights = "Blend" in d3d11_game_type.OrderedCategoryNameList
 
-                obj_model = ObjDataModel(obj_name=obj.name)
-                obj_model.ib = ib
-                obj_model.category_buffer_dict = category_buffer_dict
-                obj_name_obj_model_cache_dict[obj_name] = obj_model
+            # print("DrawIB BranchModel")
+            buffer_model, cached_obj_model = MeshExporter.gather_buffer_model(d3d11_game_type,use_export_cache=Properties_GenerateMod.use_export_cache(),normalize_all_weights=normalize_all_weights)
+            if cached_obj_model is not None:
+                obj_name_obj_model_cache_dict[obj_name] = cached_obj_model
+            else:
+                obj_name_buffer_model_dict[obj_name] = buffer_model
+
+        # (2) 第二阶段：此时所有数据都已经是numpy数组，去重、重计算TANGENT和拆分CategoryBuffer都不再访问bpy，
+        # 所以可以交给线程池同时计算，numpy的排序和拷贝在计算时会释放GIL
+        # 计时和日志只在主线程中进行，calc_buffer_model中不使用TimerUtils，避免多个线程的计时和输出交错
+        buffer_model_list = list(obj_name_buffer_model_dict.values())
+        TimerUtils.Start("Calc Buffer Model")
+        if Properties_GenerateMod.use_parallel_export() and len(buffer_model_list) > 1:
+            with ThreadPoolExecutor() as executor:
+                calculated_obj_model_list = list(executor.map(MeshExporter.calc_buffer_model, buffer_model_list))
+        else:
+            calculated_obj_model_list = [MeshExporter.calc_buffer_model(buffer_model) for buffer_model in buffer_model_list]
+        TimerUtils.End("Calc Buffer Model")
+
+        for obj_name, calculated_obj_model in zip(obj_name_buffer_model_dict.keys(), calculated_obj_model_list):
+            obj_name_obj_model_cache_dict[obj_name] = calculated_obj_model
         
+        # (3) 按照绘制顺序组装结果
         final_ordered_draw_obj_model_list:list[ObjDataModel] = [] 
 
-        print(__obj_name_ib_dict.keys())
+        print(obj_name_obj_model_cache_dict.keys())
         
         for obj_model in self.ordered_draw_obj_data_model_list:
 
@@ -299,8 +305,8 @@ class BranchModel:
 
             obj_name = obj_model.obj_name
 
-            obj_model.ib = __obj_name_ib_dict[obj_name]
-            obj_model.category_buffer_dict = __obj_name_category_buffer_list_dict[obj_name]
+            obj_model.ib = obj_name_obj_model_cache_dict[obj_name].ib
+            obj_model.category_buffer_dict = obj_name_obj_model_cache_dict[obj_name].category_buffer_dict
 
             final_ordered_draw_obj_model_list.append(copy.deepcopy(obj_model))
         
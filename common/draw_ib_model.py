@@ -1,5 +1,4 @@
 import numpy
-import struct
 import re
 import copy
 
@@ -12,6 +11,7 @@ from ..utils.json_utils import *
 from ..utils.timer_utils import *
 from ..common.migoto_format import M_DrawIndexed, TextureReplace,ObjDataModel
 from ..config.import_config import ImportConfig
+from ..config.properties_generate_mod import Properties_GenerateMod
 
 from .branch_model import BranchModel
 
@@ -86,12 +86,20 @@ class DrawIBModel:
         # 用于写出IB时使用
         self.PartName_IBResourceName_Dict = {}
         self.PartName_IBBufferFileName_Dict = {}
+        self.PartName_IBFormat_Dict = {}
         self.combine_partname_ib_resource_and_filename_dict()
         self.write_buffer_files()
 
 
     def parse_categoryname_bytelist_dict_3(self):
+        '''
+        按绘制顺序把每个obj的CategoryBuffer拼接为整个DrawIB的CategoryBuffer
+
+        之前每遇到一个obj就concatenate一次，obj数量多时每次都要把前面的数据整体复制一遍。
+        现在先统计每个Category的总字节数，一次性分配好数组，再把每个obj的数据复制到对应位置。
+        '''
         processed_obj_name_list = [] # 用于记录已经处理过的obj_name，避免重复处理
+        ordered_category_buffer_dict_list = []
 
         for component_model in self.component_model_list:
             for obj_model in component_model.final_ordered_draw_obj_model_list:
@@ -109,24 +117,18 @@ class DrawIBModel:
                     print("Can't find vb object for " + obj_name +",skip this obj process.")
                     continue
 
-                for category_name in self.d3d11GameType.OrderedCategoryNameList:
-                    if category_name not in self.__categoryname_bytelist_dict:
-                        self.__categoryname_bytelist_dict[category_name] =  category_buffer_list[category_name]
-                    else:
-                        existing_array = self.__categoryname_bytelist_dict[category_name]
-                        buffer_array = category_buffer_list[category_name]
+                ordered_category_buffer_dict_list.append(category_buffer_list)
 
-                        # 确保两个数组都是NumPy数组
-                        existing_array = numpy.asarray(existing_array)
-                        buffer_array = numpy.asarray(buffer_array)
+        for category_name in self.d3d11GameType.OrderedCategoryNameList:
+            category_buffer_list = [numpy.asarray(category_buffer_dict[category_name], dtype=numpy.uint8) for category_buffer_dict in ordered_category_buffer_dict_list]
 
-                        # 使用 concatenate 连接两个数组，确保传递的是一个序列（如列表或元组）
-                        concatenated_array = numpy.concatenate((existing_array, buffer_array))
-
-                        # 更新字典中的值
-                        self.__categoryname_bytelist_dict[category_name] = concatenated_array
+            category_buf = numpy.empty(sum(len(category_buffer) for category_buffer in category_buffer_list), dtype=numpy.uint8)
+            offset = 0
+            for category_buffer in category_buffer_list:
+                category_buf[offset:offset + len(category_buffer)] = category_buffer
+                offset += len(category_buffer)
 
-                        # self.__categoryname_bytelist_dict[category_name] = numpy.concatenate(self.__categoryname_bytelist_dict[category_name],category_buffer_list[category_name])
+            self.__categoryname_bytelist_dict[category_name] = category_buf
 
         # 顺便计算一下步长得到总顶点数
         # print(self.d3d11GameType.CategoryStrideDict)
@@ -147,7 +149,7 @@ class DrawIBModel:
         obj_name_drawindexedobj_cache_dict:dict[str,M_DrawIndexed] = {}
 
         vertex_number_ib_offset = 0
-        ib_buf = []
+        offset_ib_list:list[numpy.ndarray] = []
         draw_offset = 0
 
         new_component_model_list = []
@@ -166,19 +168,17 @@ class DrawIBModel:
                 else:
                     # print("processing: " + obj_name)
                     ib = obj_model.ib
-                    # ib的数据类型是list[int]
-                    unique_vertex_number_set = set(ib)
-                    unique_vertex_number = len(unique_vertex_number_set)
 
                     if ib is None:
                         print("Can't find ib object for " + obj_name +",skip this obj process.")
                         continue
+
+                    # ib的数据类型是numpy.uint32数组，且一定覆盖了0到最大索引的所有顶点，所以最大值+1就是唯一顶点数
+                    unique_vertex_number = int(ib.max()) + 1 if len(ib) != 0 else 0
                     
                     # 扩充总IB Buffer
-                    offset_ib = []
-                    for ib_number in ib:
-                        offset_ib.append(ib_number + vertex_number_ib_offset)
-                    ib_buf.extend(offset_ib)
+                    offset_ib = ib + numpy.uint32(vertex_number_ib_offset)
+                    offset_ib_list.append(offset_ib)
                     # Add UniqueVertexNumber to show vertex count in mod ini.
                     # print("Draw Number: " + str(unique_vertex_number))
                     vertex_number_ib_offset = vertex_number_ib_offset + unique_vertex_number
@@ -205,6 +205,8 @@ class DrawIBModel:
         # 累加完毕后draw_offset的值就是总的index_count的值，正好作为WWMI的$object_id
         self.total_index_count = draw_offset
 
+        ib_buf = numpy.concatenate(offset_ib_list) if len(offset_ib_list) != 0 else numpy.empty(0, dtype=numpy.uint32)
+
         for component_model in self.component_model_list:
             # Only export if it's not empty.
             if len(ib_buf) != 0:
@@ -220,7 +222,7 @@ class DrawIBModel:
 
         new_component_model_list = []
         for component_model in self.component_model_list:
-            ib_buf = []
+            offset_ib_list:list[numpy.ndarray] = []
             offset = 0
 
             new_final_ordered_draw_obj_model_list:list[ObjDataModel] = [] 
@@ -236,21 +238,18 @@ class DrawIBModel:
                     # print("processing: " + obj_name)
                     ib =  obj_model.ib
 
-                    # ib的数据类型是list[int]
-                    unique_vertex_number_set = set(ib)
-                    unique_vertex_number = len(unique_vertex_number_set)
-
                     if ib is None:
                         print("Can't find ib object for " + obj_name +",skip this obj process.")
                         continue
 
-                    offset_ib = []
-                    for ib_number in ib:
-                        offset_ib.append(ib_number + vertex_number_ib_offset)
+                    # ib的数据类型是numpy.uint32数组，且一定覆盖了0到最大索引的所有顶点，所以最大值+1就是唯一顶点数
+                    unique_vertex_number = int(ib.max()) + 1 if len(ib) != 0 else 0
+
+                    offset_ib = ib + numpy.uint32(vertex_number_ib_offset)
                     
                     # print("Component name: " + component_name)
                     # print("Draw Offset: " + str(vertex_number_ib_offset))
-                    ib_buf.extend(offset_ib)
+                    offset_ib_list.append(offset_ib)
 
                     drawindexed_obj = M_DrawIndexed()
                     draw_number = len(offset_ib)
@@ -280,6 +279,7 @@ class DrawIBModel:
             self.component_name_component_model_dict[component_model.component_name] = copy.deepcopy(component_model)
 
             # Only export if it's not empty.
+            ib_buf = numpy.concatenate(offset_ib_list) if len(offset_ib_list) != 0 else numpy.empty(0, dtype=numpy.uint32)
             if len(ib_buf) == 0:
                 LOG.warning(self.draw_ib + " collection: " + component_model.component_name + " is hide, skip export ib buf.")
             else:
@@ -302,6 +302,13 @@ class DrawIBModel:
             self.PartName_IBResourceName_Dict[partname] = ib_resource_name
             self.PartName_IBBufferFileName_Dict[partname] = ib_buf_filename
 
+            # 最大索引小于65536时才能使用R16_UINT，否则仍然使用R32_UINT
+            ib_format = "DXGI_FORMAT_R32_UINT"
+            ib_buf = self.componentname_ibbuf_dict.get("Component " + partname,None)
+            if Properties_GenerateMod.use_r16_uint_index_buffer() and ib_buf is not None and len(ib_buf) != 0 and int(ib_buf.max()) < 65536:
+                ib_format = "DXGI_FORMAT_R16_UINT"
+            self.PartName_IBFormat_Dict[partname] = ib_format
+
     def write_buffer_files(self):
         '''
         导出当前Mod的所有Buffer文件
@@ -318,9 +325,12 @@ class DrawIBModel:
             else:
                 ib_path = buf_output_folder + self.PartName_IBBufferFileName_Dict[partname]
 
-                packed_data = struct.pack(f'<{len(ib_buf)}I', *ib_buf)
+                ib_dtype = '<u4'
+                if self.PartName_IBFormat_Dict[partname] == "DXGI_FORMAT_R16_UINT":
+                    ib_dtype = '<u2'
+
                 with open(ib_path, 'wb') as ibf:
-                    ibf.write(packed_data) 
+                    numpy.asarray(ib_buf).astype(ib_dtype).tofile(ibf)
             
         # print("Export Category Buffers::")
         # Export category buffer files.
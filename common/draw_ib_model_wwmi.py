@@ -1,5 +1,4 @@
 import numpy
-import struct
 import re
 import copy
 
@@ -111,11 +110,11 @@ class DrawIBModelWWMI:
         bpy.context.view_layer.objects.active = merged_obj
         
         # 计算得到MergedObj的IndexBuffer和CategoryBuffer
-        ib, category_buffer_dict,index_vertex_id_dict = MeshExporter.get_buffer_ib_vb_fast(self.d3d11GameType)
+        ib, category_buffer_dict,index_vertex_id_ndarray = MeshExporter.get_buffer_ib_vb_fast(self.d3d11GameType)
         # 写出到文件
         self.write_out_index_buffer(ib=ib)
         self.write_out_category_buffer(category_buffer_dict=category_buffer_dict)
-        self.write_out_shapekey_buffer(merged_obj=merged_obj, index_vertex_id_dict=index_vertex_id_dict)
+        self.write_out_shapekey_buffer(merged_obj=merged_obj, index_vertex_id_ndarray=index_vertex_id_ndarray)
         
         # 删除临时融合的obj对象
         bpy.data.objects.remove(merged_obj, do_unlink=True)
@@ -124,44 +123,26 @@ class DrawIBModelWWMI:
     def write_out_index_buffer(self,ib):
         buf_output_folder = GlobalConfig.path_generatemod_buffer_folder(draw_ib=self.draw_ib)
 
-        packed_data = struct.pack(f'<{len(ib)}I', *ib)
         with open(buf_output_folder + self.draw_ib + "-Component1.buf", 'wb') as ibf:
-            ibf.write(packed_data) 
+            numpy.asarray(ib, dtype='<u4').tofile(ibf)
 
     def write_out_category_buffer(self,category_buffer_dict):
-        __categoryname_bytelist_dict = {} 
-        for category_name in self.d3d11GameType.OrderedCategoryNameList:
-            if category_name not in __categoryname_bytelist_dict:
-                __categoryname_bytelist_dict[category_name] =  category_buffer_dict[category_name]
-            else:
-                existing_array = __categoryname_bytelist_dict[category_name]
-                buffer_array = category_buffer_dict[category_name]
-
-                # 确保两个数组都是NumPy数组
-                existing_array = numpy.asarray(existing_array)
-                buffer_array = numpy.asarray(buffer_array)
-
-                # 使用 concatenate 连接两个数组，确保传递的是一个序列（如列表或元组）
-                concatenated_array = numpy.concatenate((existing_array, buffer_array))
-
-                # 更新字典中的值
-                __categoryname_bytelist_dict[category_name] = concatenated_array
-
+        '''
+        WWMI中所有obj已经融合成了一个MergedObj，所以每个Category只有一份数据，直接写出即可，不需要再拼接
+        '''
         # 顺便计算一下步长得到总顶点数
         position_stride = self.d3d11GameType.CategoryStrideDict["Position"]
-        position_bytelength = len(__categoryname_bytelist_dict["Position"])
+        position_bytelength = len(category_buffer_dict["Position"])
         self.mesh_vertex_count = int(position_bytelength/position_stride)
 
         buf_output_folder = GlobalConfig.path_generatemod_buffer_folder(draw_ib=self.draw_ib)
             
-        for category_name, category_buf in __categoryname_bytelist_dict.items():
+        for category_name in self.d3d11GameType.OrderedCategoryNameList:
             buf_path = buf_output_folder + self.draw_ib + "-" + category_name + ".buf"
-             # 将 list 转换为 numpy 数组
-            # category_array = numpy.array(category_buf, dtype=numpy.uint8)
             with open(buf_path, 'wb') as ibf:
-                category_buf.tofile(ibf)
+                numpy.asarray(category_buffer_dict[category_name], dtype=numpy.uint8).tofile(ibf)
 
-    def write_out_shapekey_buffer(self,merged_obj,index_vertex_id_dict):
+    def write_out_shapekey_buffer(self,merged_obj,index_vertex_id_ndarray):
         buf_output_folder = GlobalConfig.path_generatemod_buffer_folder(draw_ib=self.draw_ib)
 
         self.shapekey_offsets = []
@@ -172,9 +153,9 @@ class DrawIBModelWWMI:
         if merged_obj.data.shape_keys is None or len(getattr(merged_obj.data.shape_keys, 'key_blocks', [])) == 0:
             print(f'No shapekeys found to process!')
         else:
-            shapekey_offsets,shapekey_vertex_ids,shapekey_vertex_offsets_np = ShapeKeyUtils.extract_shapekey_data(merged_obj=merged_obj,index_vertex_id_dict=index_vertex_id_dict)
+            shapekey_offsets,shapekey_vertex_ids,shapekey_vertex_offsets_np = ShapeKeyUtils.extract_shapekey_data(merged_obj=merged_obj,index_vertex_id_ndarray=index_vertex_id_ndarray)
             # extract_shapekey_data_v2
-            # shapekey_offsets,shapekey_vertex_ids,shapekey_vertex_offsets_np = ShapeKeyUtils.extract_shapekey_data_v2(mesh=mesh,index_vertex_id_dict=index_vertex_id_dict)
+            # shapekey_offsets,shapekey_vertex_ids,shapekey_vertex_offsets_np = ShapeKeyUtils.extract_shapekey_data_v2(mesh=mesh,index_vertex_id_ndarray=index_vertex_id_ndarray)
 
             self.shapekey_offsets = shapekey_offsets
             self.shapekey_vertex_ids = shapekey_vertex_ids
@@ -183,23 +164,15 @@ class DrawIBModelWWMI:
             # 鸣潮的ShapeKey三个Buffer的导出
             if len(self.shapekey_offsets) != 0:
                 with open(buf_output_folder + self.draw_ib + "-" + "ShapeKeyOffset.buf", 'wb') as file:
-                    for number in self.shapekey_offsets:
-                        # 假设数字是32位整数，使用'i'格式符
-                        # 根据实际需要调整数字格式和相应的格式符
-                        data = struct.pack('i', number)
-                        file.write(data)
+                    numpy.asarray(self.shapekey_offsets, dtype=numpy.int32).tofile(file)
             
             if len(self.shapekey_vertex_ids) != 0:
                 with open(buf_output_folder + self.draw_ib + "-" + "ShapeKeyVertexId.buf", 'wb') as file:
-                    for number in self.shapekey_vertex_ids:
-                        # 假设数字是32位整数，使用'i'格式符
-                        # 根据实际需要调整数字格式和相应的格式符
-                        data = struct.pack('i', number)
-                        file.write(data)
+                    numpy.asarray(self.shapekey_vertex_ids, dtype=numpy.int32).tofile(file)
             
             if len(self.shapekey_vertex_offsets) != 0:
-                # 将列表转换为numpy数组，并改变其数据类型为float16
-                float_array = numpy.array(self.shapekey_vertex_offsets, dtype=numpy.float32).astype(numpy.float16)
+                # 改变其数据类型为float16
+                float_array = numpy.asarray(self.shapekey_vertex_offsets, dtype=numpy.float32).astype(numpy.float16)
                 with open(buf_output_folder + self.draw_ib + "-" + "ShapeKeyVertexOffset.buf", 'wb') as file:
                     float_array.tofile(file)
 
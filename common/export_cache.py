@@ -0,0 +1,158 @@
+import bpy
+import os
+import numpy
+import hashlib
+
+from ..utils.log_utils import LOG
+from ..utils.vertexgroup_utils import VertexGroupUtils
+
+from ..config.main_config import GlobalConfig
+from ..config.properties_import_model import Properties_ImportModel
+from ..config.properties_generate_mod import Properties_GenerateMod
+
+from .migoto_format import D3D11GameType, ObjDataModel
+
+
+class ExportCache:
+    '''
+    生成Mod时每个obj的IB和CategoryBuffer的磁盘缓存
+
+    缓存放在当前工作空间的ExportCache文件夹下，每个obj一个.npz文件，
+    文件中记录了计算时的指纹，只有指纹完全一致时才会使用缓存。
+    指纹由三角化并计算TANGENT后的mesh数据、修改器堆栈、数据类型文件内容以及影响导出结果的各个选项共同决定，
+    所以只要obj被修改过，哪怕只改了一个顶点，也会重新计算。
+    '''
+
+    # 缓存格式或导出算法发生变化时修改这里，让旧缓存全部失效
+    cache_version = "4"
+
+    @classmethod
+    def path_export_cache_folder(cls) -> str:
+        export_cache_folder = os.path.join(GlobalConfig.path_workspace_folder(), "ExportCache")
+        # 多线程计算时可能有多个线程同时创建，所以这里用exist_ok
+        os.makedirs(export_cache_folder, exist_ok=True)
+        return export_cache_folder
+
+    @classmethod
+    def path_export_cache_file(cls,obj_name:str) -> str:
+        # obj名称里可能有不能作为文件名的字符，所以这里用名称的hash作为文件名
+        return os.path.join(cls.path_export_cache_folder(), hashlib.md5(obj_name.encode("utf-8")).hexdigest() + ".npz")
+
+    @classmethod
+    def get_mesh_fingerprint(cls,obj:bpy.types.Object,mesh:bpy.types.Mesh,d3d11GameType:D3D11GameType,normalize_all_lock_flags = None) -> str:
+        '''
+        计算指纹，mesh必须是已经三角化并调用过calc_tangents的导出用mesh
+        '''
+        hasher = hashlib.blake2b(digest_size=20)
+
+        def update_str(value):
+            hasher.update(str(value).encode("utf-8"))
+            hasher.update(b"\0")
+
+        def update_array(collection, attribute_name, dtype, length, width=1):
+            data = numpy.empty(length * width, dtype=dtype)
+            collection.foreach_get(attribute_name, data)
+            hasher.update(data.tobytes())
+
+        # (1) 影响导出结果的选项
+        update_str(cls.cache_version)
+        update_str(GlobalConfig.logic_name)
+        update_str(Properties_ImportModel.use_mirror_workflow())
+        update_str(Properties_GenerateMod.recalculate_tangent())
+        update_str(Properties_GenerateMod.recalculate_color())
+        update_str(obj.get("3DMigoto:RecalculateTANGENT",False))
+        update_str(obj.get("3DMigoto:RecalculateCOLOR",False))
+
+        # (2) 数据类型文件
+        # 数据类型可能被多个DrawIB共享，这里使用数据类型内容的hash而不是某一个tmp.json文件的hash
+        update_str(d3d11GameType.SharedKey)
+
+        # (3) 修改器堆栈，修改器的效果已经体现在mesh中，这里只是为了修改器变化时更保险
+        for modifier in obj.modifiers:
+            update_str((modifier.name, modifier.type, modifier.show_viewport))
+
+        # (4) mesh数据
+        mesh_vertices_length = len(mesh.vertices)
+        mesh_loops_length = len(mesh.loops)
+        mesh_polygons_length = len(mesh.polygons)
+        update_str((mesh_vertices_length, mesh_loops_length, mesh_polygons_length))
+
+        update_array(mesh.vertices, "undeformed_co", numpy.float32, mesh_vertices_length, 3)
+        update_array(mesh.polygons, "loop_start", numpy.int32, mesh_polygons_length)
+        update_array(mesh.loops, "vertex_index", numpy.int32, mesh_loops_length)
+        update_array(mesh.loops, "normal", numpy.float32, mesh_loops_length, 3)
+        update_array(mesh.loops, "tangent", numpy.float32, mesh_loops_length, 3)
+        update_array(mesh.loops, "bitangent_sign", numpy.float32, mesh_loops_length)
+
+        for uv_layer in mesh.uv_layers:
+            update_str(uv_layer.name)
+            update_array(uv_layer.data, "uv", numpy.float32, mesh_loops_length, 2)
+
+        for color_layer in mesh.vertex_colors:
+            update_str(color_layer.name)
+            update_array(color_layer.data, "color", numpy.float32, mesh_loops_length, 4)
+
+        # (5) 权重
+        for vertex_group in obj.vertex_groups:
+            update_str((vertex_group.index, vertex_group.name))
+
+        # 导出时在内存中执行Normalize All，锁定的顶点组不同结果也不同
+        if normalize_all_lock_flags is None:
+            update_str(None)
+        else:
+            update_str(normalize_all_lock_flags.tolist())
+
+        offsets, group_ids, weights = VertexGroupUtils.get_vertex_group_weight_csr(mesh)
+        hasher.update(offsets.tobytes())
+        hasher.update(group_ids.tobytes())
+        hasher.update(weights.tobytes())
+
+        return hasher.hexdigest()
+
+    @classmethod
+    def load(cls,obj_name:str,fingerprint:str):
+        '''
+        指纹一致时返回缓存的ObjDataModel，否则返回None
+        '''
+        cache_file_path = cls.path_export_cache_file(obj_name)
+        if not os.path.exists(cache_file_path):
+            return None
+
+        try:
+            with numpy.load(cache_file_path) as cache_data:
+                if str(cache_data["fingerprint"]) != fingerprint:
+                    return None
+
+                obj_model = ObjDataModel(obj_name)
+                obj_model.ib = cache_data["ib"]
+                obj_model.category_buffer_dict = {}
+                for key in cache_data.files:
+                    if key.startswith("category_"):
+                        obj_model.category_buffer_dict[key[len("category_"):]] = cache_data[key]
+                if "index_vertex_id_ndarray" in cache_data.files:
+                    obj_model.index_vertex_id_ndarray = cache_data["index_vertex_id_ndarray"]
+                else:
+                    obj_model.index_vertex_id_ndarray = None
+                return obj_model
+        except Exception as e:
+            # 缓存文件损坏时直接重新计算就好
+            LOG.warning("Failed to read export cache for " + obj_name + ": " + str(e))
+            return None
+
+    @classmethod
+    def save(cls,obj_name:str,fingerprint:str,obj_model:ObjDataModel):
+        cache_dict = {
+            "fingerprint": numpy.array(fingerprint),
+            "ib": numpy.asarray(obj_model.ib, dtype=numpy.uint32),
+        }
+        for category_name, category_buffer in obj_model.category_buffer_dict.items():
+            cache_dict["category_" + category_name] = numpy.asarray(category_buffer, dtype=numpy.uint8)
+        if obj_model.index_vertex_id_ndarray is not None:
+            cache_dict["index_vertex_id_ndarray"] = numpy.asarray(obj_model.index_vertex_id_ndarray, dtype=numpy.int32)
+
+        # 先写到临时文件再替换，避免中途失败时留下损坏的缓存文件
+        cache_file_path = cls.path_export_cache_file(obj_name)
+        tmp_cache_file_path = cache_file_path + ".tmp"
+        with open(tmp_cache_file_path, 'wb') as f:
+            numpy.savez(f, **cache_dict)
+        os.replace(tmp_cache_file_path, cache_file_path)
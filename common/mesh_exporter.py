@@ -1,17 +1,18 @@
 import bpy
 import numpy
-import collections
 
 from ..utils.format_utils import FormatUtils, Fatal
 from ..utils.timer_utils import TimerUtils
 from ..utils.vertexgroup_utils import VertexGroupUtils
 from ..utils.obj_utils import ObjUtils
+from ..utils.mesh_utils import MeshUtils
 
 from ..config.main_config import GlobalConfig, LogicName
 from ..config.properties_import_model import Properties_ImportModel
 from ..config.properties_generate_mod import Properties_GenerateMod
 
 from .migoto_format import D3D11GameType,ObjDataModel
+from .export_cache import ExportCache
 
 class BufferModel:
     '''
@@ -23,6 +24,55 @@ class BufferModel:
 
         self.dtype = None
         self.element_vertex_ndarray  = None
+
+        # 以下数据都在主线程中通过parse_mesh_data从Blender中读取，
+        # 后续的calc_index_vertex_buffer只使用这些数据，不再访问bpy，所以可以放到其它线程中计算
+        self.obj_name = ""
+        self.mesh_name = ""
+        self.export_cache_fingerprint = None # 不使用ExportCache时为None
+        self.ordered_loop_indices = None
+        self.loop_vertex_indices = None
+        self.recalculate_tangent = False
+        self.recalculate_color = False
+        self.flip_face_direction = False
+        # 不为None时，读取权重时先在内存中执行Normalize All，见VertexGroupUtils.get_normalize_all_lock_flags
+        self.normalize_all_lock_flags = None
+
+    def parse_mesh_data(self,obj:bpy.types.Object,mesh:bpy.types.Mesh):
+        '''
+        读取计算IB和CategoryBuffer需要的所有数据，必须在主线程中调用
+        '''
+        self.parse_elementname_ravel_ndarray_dict(mesh)
+
+        self.mesh_name = mesh.name
+        self.ordered_loop_indices = self.get_ordered_loop_indices(mesh)
+
+        self.loop_vertex_indices = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+        mesh.loops.foreach_get("vertex_index", self.loop_vertex_indices)
+
+        self.recalculate_tangent = Properties_GenerateMod.recalculate_tangent() or bool(obj.get("3DMigoto:RecalculateTANGENT",False))
+        self.recalculate_color = Properties_GenerateMod.recalculate_color() or bool(obj.get("3DMigoto:RecalculateCOLOR",False))
+
+        if Properties_ImportModel.use_mirror_workflow():
+            self.flip_face_direction = GlobalConfig.logic_name != LogicName.YYSLS
+        else:
+            self.flip_face_direction = GlobalConfig.logic_name == LogicName.YYSLS
+
+    def calc_index_vertex_buffer(self)->ObjDataModel:
+        '''
+        根据当前游戏选择对应的计算方式，只使用parse_mesh_data读取好的数据，不访问bpy
+        这里可能在线程池中执行，所以计算过程中不使用TimerUtils，也不输出日志，避免多个线程的计时和输出交错
+        '''
+        # 因为只有存在TANGENT时，顶点数才会增加，所以如果是GF2并且存在TANGENT才使用共享TANGENT防止增加顶点数
+        if GlobalConfig.logic_name == LogicName.UnityCPU and "TANGENT" in self.d3d11GameType.OrderedFullElementList:
+            return self.calc_index_vertex_buffer_girlsfrontline2()
+        elif GlobalConfig.logic_name == LogicName.WutheringWaves:
+            return self.calc_index_vertex_buffer_wwmi()
+        elif GlobalConfig.logic_name == LogicName.SnowBreak:
+            return self.calc_index_vertex_buffer_wwmi()
+        else:
+            # 计算IndexBuffer和CategoryBufferDict
+            return self.calc_index_vertex_buffer_universal()
         
     def check_and_verify_attributes(self,obj:bpy.types.Object):
         '''
@@ -100,12 +150,12 @@ class BufferModel:
 
         if GlobalConfig.logic_name == LogicName.WutheringWaves:
             print("鸣潮专属测试版权重处理：")
-            blendweights_dict, blendindices_dict = VertexGroupUtils.get_blendweights_blendindices_v4(mesh=mesh,normalize_weights = normalize_weights,blend_size=blend_size)
+            blendweights_dict, blendindices_dict = VertexGroupUtils.get_blendweights_blendindices_v4(mesh=mesh,normalize_weights = normalize_weights,blend_size=blend_size,normalize_all_lock_flags=self.normalize_all_lock_flags)
         elif GlobalConfig.logic_name == LogicName.SnowBreak:
             print("尘白禁区权重处理")
-            blendweights_dict, blendindices_dict = VertexGroupUtils.get_blendweights_blendindices_v4(mesh=mesh,normalize_weights = normalize_weights,blend_size=blend_size)
+            blendweights_dict, blendindices_dict = VertexGroupUtils.get_blendweights_blendindices_v4(mesh=mesh,normalize_weights = normalize_weights,blend_size=blend_size,normalize_all_lock_flags=self.normalize_all_lock_flags)
         else:
-            blendweights_dict, blendindices_dict = VertexGroupUtils.get_blendweights_blendindices_v3(mesh=mesh,normalize_weights = normalize_weights)
+            blendweights_dict, blendindices_dict = VertexGroupUtils.get_blendweights_blendindices_v3(mesh=mesh,normalize_weights = normalize_weights,normalize_all_lock_flags=self.normalize_all_lock_flags)
 
 
         # 对每一种Element都获取对应的数据
@@ -417,54 +467,29 @@ class BufferModel:
                     print(blendweights.shape)
                     raise Fatal("未知的BLENDWEIGHTS格式")
 
-    def calc_index_vertex_buffer_girlsfrontline2(self,obj,mesh:bpy.types.Mesh)->ObjDataModel:
+    def calc_index_vertex_buffer_girlsfrontline2(self)->ObjDataModel:
         '''
         计算IndexBuffer和CategoryBufferDict并返回
-
-        这里是速度瓶颈，23万顶点情况下测试，前面的获取mesh数据只用了1.5秒
-        但是这里两个步骤加起来用了6秒，占了4/5运行时间。
-        不过暂时也够用了，先不管了。
         '''
         # TimerUtils.Start("Calc IB VB")
         # (1) 统计模型的索引和唯一顶点
         '''
         保持相同顶点数时，让相同顶点使用相同的TANGENT值来避免增加索引数和顶点数。
         这里我们使用每个顶点第一次出现的TANGENT值。
-        效率比下面的低50%，不过能使用这个选项的场景只有导入直接导出原模型，所以总运行时间基本都在0.4秒以内，用户感觉不到差距的，没问题。
-        '''
-        print("calc ivb gf2")
-        # 创建一个空列表用于存储最终的结果
-        ib = []
-        indexed_vertices = collections.OrderedDict()
-        # 一个字典确保每个符合条件的position只出现过一次
-        position_normal_sharedtangent_dict = {}
-        # 遍历每个多边形（polygon）
-        for poly in mesh.polygons:
-            # 创建一个临时列表用于存储当前多边形的索引
-            vertex_indices = []
-            
-            # 遍历当前多边形中的每一个环（loop），根据多边形的起始环和环总数
-            for blender_lvertex in mesh.loops[poly.loop_start:poly.loop_start + poly.loop_total]:
-                vertex_data_get = self.element_vertex_ndarray[blender_lvertex.index].copy()
-                poskey = tuple(vertex_data_get['POSITION'] + vertex_data_get['NORMAL'])
-                if poskey in position_normal_sharedtangent_dict:
-                    tangent_var = position_normal_sharedtangent_dict[poskey]
-                    vertex_data_get['TANGENT'] = tangent_var
-                else:
-                    tangent_var = vertex_data_get['TANGENT']
-                    position_normal_sharedtangent_dict[poskey] = tangent_var
-                
-                vertex_data = vertex_data_get.tobytes()
-                index = indexed_vertices.setdefault(vertex_data, len(indexed_vertices))
-                vertex_indices.append(index)
-            
-            # 将当前多边形的顶点索引列表添加到最终结果列表中
-            ib.append(vertex_indices)
+        '''
+        ordered_element_vertex_ndarray = self.element_vertex_ndarray[self.ordered_loop_indices]
 
-        # print("长度：")
-        # print(len(position_normal_sharedtangent_dict))
-            
-        flattened_ib = [item for sublist in ib for item in sublist]
+        # 之前的实现使用tuple(POSITION + NORMAL)作为key，注意这里是按分量相加而不是拼接，
+        # 为了保证导出结果逐字节一致，这里仍然使用相加后的值进行分组
+        position_normal_keys = ordered_element_vertex_ndarray['POSITION'] + ordered_element_vertex_ndarray['NORMAL']
+        position_normal_keys = position_normal_keys.reshape(len(ordered_element_vertex_ndarray), -1)
+
+        # 每个loop都使用同一组中第一次出现的TANGENT值
+        shared_tangent_indices = self.get_first_occurrence_indices(position_normal_keys)
+        ordered_element_vertex_ndarray['TANGENT'] = ordered_element_vertex_ndarray['TANGENT'][shared_tangent_indices]
+
+        indexed_vertices, flattened_ib = self.unique_element_vertex_ndarray(ordered_element_vertex_ndarray)
+        flattened_ib = flattened_ib.astype(numpy.uint32)
         # TimerUtils.End("Calc IB VB")
 
         # (2) 转换为CategoryBufferDict
@@ -474,55 +499,34 @@ class BufferModel:
         for categoryname,category_stride in self.d3d11GameType.CategoryStrideDict.items():
             category_buffer_dict[categoryname] = []
 
-        data_matrix = numpy.array([numpy.frombuffer(byte_data,dtype=numpy.uint8) for byte_data in indexed_vertices])
+        data_matrix = numpy.ascontiguousarray(indexed_vertices).view(numpy.uint8).reshape(len(indexed_vertices), indexed_vertices.dtype.itemsize)
         stride_offset = 0
         for categoryname,category_stride in category_stride_dict.items():
             category_buffer_dict[categoryname] = data_matrix[:,stride_offset:stride_offset + category_stride].flatten()
             stride_offset += category_stride
 
-        obj_model = ObjDataModel(mesh.name)
+        obj_model = ObjDataModel(self.mesh_name)
         obj_model.ib = flattened_ib
         obj_model.category_buffer_dict = category_buffer_dict
-        obj_model.index_vertex_id_dict = None
+        obj_model.index_vertex_id_ndarray = None
         return obj_model
 
-    def calc_index_vertex_buffer_wwmi(self,obj,mesh:bpy.types.Mesh)->ObjDataModel:
+    def calc_index_vertex_buffer_wwmi(self)->ObjDataModel:
         '''
         计算IndexBuffer和CategoryBufferDict并返回
-
-        这里是速度瓶颈，23万顶点情况下测试，前面的获取mesh数据只用了1.5秒
-        但是这里两个步骤加起来用了6秒，占了4/5运行时间。
-        不过暂时也够用了，先不管了。
+        同时返回每个唯一顶点对应的Blender顶点ID数组，用于后续形态键数据的计算
         '''
         # TimerUtils.Start("Calc IB VB")
         # (1) 统计模型的索引和唯一顶点
+        ordered_element_vertex_ndarray = self.element_vertex_ndarray[self.ordered_loop_indices]
+        indexed_vertices, flattened_ib = self.unique_element_vertex_ndarray(ordered_element_vertex_ndarray)
 
-        # 创建一个空列表用于存储最终的结果
-        # print("calc ivb wwmi")
-        index_vertex_id_dict = {}
-        ib = []
-        indexed_vertices = collections.OrderedDict()
-        # 一个字典确保每个符合条件的position只出现过一次
-        # 遍历每个多边形（polygon）
-        for poly in mesh.polygons:
-            # 创建一个临时列表用于存储当前多边形的索引
-            vertex_indices = []
-            
-            # 遍历当前多边形中的每一个环（loop），根据多边形的起始环和环总数
-            for blender_lvertex in mesh.loops[poly.loop_start:poly.loop_start + poly.loop_total]:
-                vertex_data_get = self.element_vertex_ndarray[blender_lvertex.index].copy()
-                vertex_data = vertex_data_get.tobytes()
-                index = indexed_vertices.setdefault(vertex_data, len(indexed_vertices))
-                vertex_indices.append(index)
-                index_vertex_id_dict[index] = blender_lvertex.vertex_index
-            
-            # 将当前多边形的顶点索引列表添加到最终结果列表中
-            ib.append(vertex_indices)
+        ordered_loop_vertex_indices = self.loop_vertex_indices[self.ordered_loop_indices]
 
-        # print("长度：")
-        # print(len(position_normal_sharedtangent_dict))
-            
-        flattened_ib = [item for sublist in ib for item in sublist]
+        # 和之前的字典写法保持一致，多个loop对应同一个唯一顶点时，以最后一个loop的顶点ID为准
+        ib_sort_indices = numpy.argsort(flattened_ib, kind="stable")
+        last_loop_indices = ib_sort_indices[numpy.cumsum(numpy.bincount(flattened_ib, minlength=len(indexed_vertices))) - 1]
+        index_vertex_id_ndarray = ordered_loop_vertex_indices[last_loop_indices].astype(numpy.int32)
         # TimerUtils.End("Calc IB VB")
 
         # (2) 转换为CategoryBufferDict
@@ -532,57 +536,103 @@ class BufferModel:
         for categoryname,category_stride in self.d3d11GameType.CategoryStrideDict.items():
             category_buffer_dict[categoryname] = []
 
-        data_matrix = numpy.array([numpy.frombuffer(byte_data,dtype=numpy.uint8) for byte_data in indexed_vertices])
+        data_matrix = numpy.ascontiguousarray(indexed_vertices).view(numpy.uint8).reshape(len(indexed_vertices), indexed_vertices.dtype.itemsize)
         stride_offset = 0
         for categoryname,category_stride in category_stride_dict.items():
             category_buffer_dict[categoryname] = data_matrix[:,stride_offset:stride_offset + category_stride].flatten()
             stride_offset += category_stride
 
-        obj_model = ObjDataModel(mesh.name)
-        # obj_model.ib = flattened_ib
+        obj_model = ObjDataModel(self.mesh_name)
 
-        print("导出时翻转面朝向")
-        flipped_indices = []
-        # print(flattened_ib[0],flattened_ib[1],flattened_ib[2])
-        for i in range(0, len(flattened_ib), 3):
-            triangle = flattened_ib[i:i+3]
-            flipped_triangle = triangle[::-1]
-            flipped_indices.extend(flipped_triangle)
-        # print(flipped_indices[0],flipped_indices[1],flipped_indices[2])
-
-        obj_model.ib = flipped_indices
+        obj_model.ib = MeshUtils.flip_triangle_winding(flattened_ib).astype(numpy.uint32)
 
         obj_model.category_buffer_dict = category_buffer_dict
-        obj_model.index_vertex_id_dict = index_vertex_id_dict
+        obj_model.index_vertex_id_ndarray = index_vertex_id_ndarray
         return obj_model
 
-    def calc_index_vertex_buffer_universal(self,obj,mesh:bpy.types.Mesh)->ObjDataModel:
+    def get_ordered_loop_indices(self,mesh:bpy.types.Mesh) -> numpy.ndarray:
+        '''
+        按照遍历mesh.polygons再遍历每个polygon的loops的顺序，返回loop索引数组
+        三角化后一般就是0到len(loops)-1，但这里仍然以polygon的loop_start为准，保证和逐个遍历时的顺序完全一致
+        '''
+        mesh_polygons_length = len(mesh.polygons)
+        loop_starts = numpy.empty(mesh_polygons_length, dtype=numpy.int32)
+        loop_totals = numpy.empty(mesh_polygons_length, dtype=numpy.int32)
+        mesh.polygons.foreach_get("loop_start", loop_starts)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+
+        # 每个loop在自己所属polygon中的偏移
+        polygon_offsets = numpy.cumsum(loop_totals) - loop_totals
+        inner_offsets = numpy.arange(loop_totals.sum()) - numpy.repeat(polygon_offsets, loop_totals)
+        return numpy.repeat(loop_starts, loop_totals) + inner_offsets
+
+    def get_first_occurrence_indices(self,row_keys:numpy.ndarray) -> numpy.ndarray:
+        '''
+        输入形状为(N,K)的二维数组，对每一行返回和它相等的行中第一次出现的那一行的索引
+        行的比较是按值比较，所以0.0和-0.0视为相等，而含有NaN的行永远只和自己相等。
+        '''
+        row_count = len(row_keys)
+        if row_count == 0:
+            return numpy.empty(0, dtype=numpy.int64)
+
+        # lexsort是稳定排序，所以每组中排在最前面的一定是第一次出现的那个
+        sort_indices = numpy.lexsort(row_keys.T)
+        sorted_keys = row_keys[sort_indices]
+        is_group_start = numpy.empty(row_count, dtype=bool)
+        is_group_start[0] = True
+        numpy.any(sorted_keys[1:] != sorted_keys[:-1], axis=1, out=is_group_start[1:])
+        sorted_group_ids = numpy.cumsum(is_group_start) - 1
+
+        first_occurrence_indices = numpy.empty(row_count, dtype=numpy.int64)
+        first_occurrence_indices[sort_indices] = sort_indices[is_group_start][sorted_group_ids]
+        return first_occurrence_indices
+
+    def unique_element_vertex_ndarray(self,element_vertex_ndarray:numpy.ndarray):
+        '''
+        对结构化数组按整行字节去重，返回(唯一顶点数组, 索引数组)
+        唯一顶点的顺序为每个顶点第一次出现的顺序，和之前OrderedDict.setdefault(tobytes())的结果逐字节一致
+
+        这里没有直接对void类型调用numpy.unique，因为void比较是逐字节的通用比较，排序非常慢。
+        把每行补齐到8字节的倍数后看作多个uint64再lexsort，字节相同等价于所有uint64相同。
+        '''
+        vertex_count = len(element_vertex_ndarray)
+        element_vertex_ndarray = numpy.ascontiguousarray(element_vertex_ndarray)
+        itemsize = element_vertex_ndarray.dtype.itemsize
+        row_bytes = element_vertex_ndarray.view(numpy.uint8).reshape(vertex_count, itemsize)
+        pad_size = (-itemsize) % 8
+        if pad_size != 0:
+            row_bytes = numpy.pad(row_bytes, ((0, 0), (0, pad_size)))
+        row_keys = numpy.ascontiguousarray(row_bytes).view(numpy.uint64)
+
+        first_occurrence_indices = self.get_first_occurrence_indices(row_keys)
+
+        # 第一次出现的顶点按出现顺序依次编号，其它顶点使用它第一次出现时的编号
+        is_first_occurrence = first_occurrence_indices == numpy.arange(vertex_count)
+        new_indices = numpy.cumsum(is_first_occurrence) - 1
+        ib = new_indices[first_occurrence_indices]
+
+        unique_vertex_ndarray = element_vertex_ndarray[is_first_occurrence]
+        return unique_vertex_ndarray, ib
+
+    def calc_index_vertex_buffer_universal(self)->ObjDataModel:
         '''
         计算IndexBuffer和CategoryBufferDict并返回
 
-        这里是速度瓶颈，23万顶点情况下测试，前面的获取mesh数据只用了1.5秒
-        但是这里两个步骤加起来用了6秒，占了4/5运行时间。
-        不过暂时也够用了，先不管了。
+        之前这里逐个loop调用tobytes()再用OrderedDict.setdefault去重，23万顶点下要6秒，占了4/5运行时间。
+        现在整个去重过程都在numpy中完成，结果和之前逐字节一致。
         '''
         # TimerUtils.Start("Calc IB VB")
         # (1) 统计模型的索引和唯一顶点
-        '''
-        不保持相同顶点时，仍然使用经典而又快速的方法
-        '''
-        # print("calc ivb universal")
-        indexed_vertices = collections.OrderedDict()
-        ib = [[indexed_vertices.setdefault(self.element_vertex_ndarray[blender_lvertex.index].tobytes(), len(indexed_vertices))
-                for blender_lvertex in mesh.loops[poly.loop_start:poly.loop_start + poly.loop_total]
-                    ]for poly in mesh.polygons] 
-            
-        flattened_ib = [item for sublist in ib for item in sublist]
+        ordered_element_vertex_ndarray = self.element_vertex_ndarray[self.ordered_loop_indices]
+        indexed_vertices, flattened_ib = self.unique_element_vertex_ndarray(ordered_element_vertex_ndarray)
+        flattened_ib = flattened_ib.astype(numpy.uint32)
         # TimerUtils.End("Calc IB VB")
 
         # 重计算TANGENT步骤
-        indexed_vertices = self.average_normal_tangent(obj=obj, indexed_vertices=indexed_vertices, d3d11GameType=self.d3d11GameType,dtype=self.dtype)
+        indexed_vertices = self.average_normal_tangent(indexed_vertices=indexed_vertices, d3d11GameType=self.d3d11GameType,dtype=self.dtype)
         
         # 重计算COLOR步骤
-        indexed_vertices = self.average_normal_color(obj=obj, indexed_vertices=indexed_vertices, d3d11GameType=self.d3d11GameType,dtype=self.dtype)
+        indexed_vertices = self.average_normal_color(indexed_vertices=indexed_vertices, d3d11GameType=self.d3d11GameType,dtype=self.dtype)
 
         # print("indexed_vertices:")
         # print(str(len(indexed_vertices)))
@@ -594,48 +644,29 @@ class BufferModel:
         for categoryname,category_stride in self.d3d11GameType.CategoryStrideDict.items():
             category_buffer_dict[categoryname] = []
 
-        data_matrix = numpy.array([numpy.frombuffer(byte_data,dtype=numpy.uint8) for byte_data in indexed_vertices])
+        data_matrix = numpy.ascontiguousarray(indexed_vertices).view(numpy.uint8).reshape(len(indexed_vertices), indexed_vertices.dtype.itemsize)
         stride_offset = 0
         for categoryname,category_stride in category_stride_dict.items():
             category_buffer_dict[categoryname] = data_matrix[:,stride_offset:stride_offset + category_stride].flatten()
             stride_offset += category_stride
 
-        obj_model = ObjDataModel(mesh.name)
+        obj_model = ObjDataModel(self.mesh_name)
 
         
 
         obj_model.ib = flattened_ib
 
-        flip_face_direction = False
-
-        if Properties_ImportModel.use_mirror_workflow():
-            flip_face_direction = True
-            if GlobalConfig.logic_name == LogicName.YYSLS:
-                flip_face_direction = False
-        else:
-            if GlobalConfig.logic_name == LogicName.YYSLS:
-                flip_face_direction = True
-
-        if flip_face_direction:
-            print("导出时翻转面朝向")
-
-            flipped_indices = []
-            # print(flattened_ib[0],flattened_ib[1],flattened_ib[2])
-            for i in range(0, len(flattened_ib), 3):
-                triangle = flattened_ib[i:i+3]
-                flipped_triangle = triangle[::-1]
-                flipped_indices.extend(flipped_triangle)
-            # print(flipped_indices[0],flipped_indices[1],flipped_indices[2])
-            obj_model.ib = flipped_indices
+        if self.flip_face_direction:
+            obj_model.ib = MeshUtils.flip_triangle_winding(flattened_ib)
 
 
 
         obj_model.category_buffer_dict = category_buffer_dict
-        obj_model.index_vertex_id_dict = None
+        obj_model.index_vertex_id_ndarray = None
         return obj_model
 
 
-    def average_normal_tangent(self,obj,indexed_vertices,d3d11GameType,dtype):
+    def average_normal_tangent(self,indexed_vertices,d3d11GameType,dtype):
         '''
         Nico: 米游所有游戏都能用到这个，还有曾经的GPU-PreSkinning的GF2也会用到这个，崩坏三2.0新角色除外。
         尽管这个可以起到相似的效果，但是仍然无法完美获取模型本身的TANGENT数据，只能做到身体轮廓线99%近似。
@@ -645,24 +676,16 @@ class BufferModel:
 
         if "TANGENT" not in d3d11GameType.OrderedFullElementList:
             return indexed_vertices
-        allow_calc = False
-        if Properties_GenerateMod.recalculate_tangent():
-            allow_calc = True
-        elif obj.get("3DMigoto:RecalculateTANGENT",False): 
-            allow_calc = True
         
-        if not allow_calc:
+        if not self.recalculate_tangent:
             return indexed_vertices
         
-        # 不用担心这个转换的效率，速度非常快
-        vb = bytearray()
-        for vertex in indexed_vertices:
-            vb += bytes(vertex)
-        vb = numpy.frombuffer(vb, dtype = dtype)
+        # indexed_vertices已经是去重后的结构化数组，复制一份避免修改原数据
+        vb = numpy.array(indexed_vertices, dtype = dtype)
 
         # 开始重计算TANGENT
-        positions = numpy.array([val['POSITION'] for val in vb])
-        normals = numpy.array([val['NORMAL'] for val in vb], dtype=float)
+        positions = vb['POSITION']
+        normals = vb['NORMAL'].astype(float)
 
         # 对位置进行排序，以便相同的位置会相邻
         sort_indices = numpy.lexsort(positions.T)
@@ -670,28 +693,25 @@ class BufferModel:
         sorted_normals = normals[sort_indices]
 
         # 找出位置变化的地方，即我们需要分组的地方
-        group_indices = numpy.flatnonzero(numpy.any(sorted_positions[:-1] != sorted_positions[1:], axis=1))
-        group_indices = numpy.r_[0, group_indices + 1, len(sorted_positions)]
+        is_group_start = numpy.empty(len(sorted_positions), dtype=bool)
+        is_group_start[:1] = True
+        numpy.any(sorted_positions[:-1] != sorted_positions[1:], axis=1, out=is_group_start[1:])
+        group_indices = numpy.flatnonzero(is_group_start)
 
-        # 累加法线和计算计数
-        unique_positions = sorted_positions[group_indices[:-1]]
-        accumulated_normals = numpy.add.reduceat(sorted_normals, group_indices[:-1], axis=0)
-        counts = numpy.diff(group_indices)
+        # 累加法线
+        accumulated_normals = numpy.add.reduceat(sorted_normals, group_indices, axis=0)
 
         # 归一化累积法线向量
         normalized_normals = accumulated_normals / numpy.linalg.norm(accumulated_normals, axis=1)[:, numpy.newaxis]
         normalized_normals[numpy.isnan(normalized_normals)] = 0  # 处理任何可能出现的零向量导致的除零错误
 
-        # 构建结果字典
-        position_normal_dict = dict(zip(map(tuple, unique_positions), normalized_normals))
-
         # TimerUtils.End("Recalculate TANGENT")
 
-        # 获取所有位置并转换为元组，用于查找字典
-        positions = [tuple(pos) for pos in vb['POSITION']]
-
-        # 从字典中获取对应的标准化法线
-        normalized_normals = numpy.array([position_normal_dict[pos] for pos in positions])
+        # 不再通过位置tuple查字典，而是用排序后的分组编号直接把结果放回每个顶点原来的位置
+        sorted_group_ids = numpy.cumsum(is_group_start) - 1
+        vertex_normalized_normals = numpy.empty((len(vb), normalized_normals.shape[1]), dtype=normalized_normals.dtype)
+        vertex_normalized_normals[sort_indices] = normalized_normals[sorted_group_ids]
+        normalized_normals = vertex_normalized_normals
 
         # 计算 w 并调整 tangent 的第四个分量
         w = numpy.where(vb['TANGENT'][:, 3] >= 0, -1.0, 1.0)
@@ -705,44 +725,27 @@ class BufferModel:
         return vb
 
 
-    def average_normal_color(self,obj,indexed_vertices,d3d11GameType,dtype):
+    def average_normal_color(self,indexed_vertices,d3d11GameType,dtype):
         '''
         Nico: 算数平均归一化法线，HI3 2.0角色使用的方法
         '''
         if "COLOR" not in d3d11GameType.OrderedFullElementList:
             return indexed_vertices
-        allow_calc = False
-        if Properties_GenerateMod.recalculate_color():
-            allow_calc = True
-        elif obj.get("3DMigoto:RecalculateCOLOR",False): 
-            allow_calc = True
-        if not allow_calc:
+        if not self.recalculate_color:
             return indexed_vertices
 
         # 开始重计算COLOR
-        TimerUtils.Start("Recalculate COLOR")
-
-        # 不用担心这个转换的效率，速度非常快
-        vb = bytearray()
-        for vertex in indexed_vertices:
-            vb += bytes(vertex)
-        vb = numpy.frombuffer(vb, dtype = dtype)
+        # indexed_vertices已经是去重后的结构化数组，复制一份避免修改原数据
+        vb = numpy.array(indexed_vertices, dtype = dtype)
 
         # 首先提取所有唯一的位置，并创建一个索引映射
-        unique_positions, position_indices = numpy.unique(
-            [tuple(val['POSITION']) for val in vb], 
-            return_inverse=True, 
-            axis=0
-        )
+        unique_positions, position_indices = numpy.unique(vb['POSITION'], return_inverse=True, axis=0)
+        position_indices = position_indices.reshape(-1)
 
-        # 初始化累积法线和计数器为零
+        # 按顶点顺序累加法线并计数，numpy.add.at不会合并重复索引，累加顺序和逐个顶点累加时一致
         accumulated_normals = numpy.zeros((len(unique_positions), 3), dtype=float)
-        counts = numpy.zeros(len(unique_positions), dtype=int)
-
-        # 累加法线并增加计数（这里假设vb是一个list）
-        for i, val in enumerate(vb):
-            accumulated_normals[position_indices[i]] += numpy.array(val['NORMAL'], dtype=float)
-            counts[position_indices[i]] += 1
+        numpy.add.at(accumulated_normals, position_indices, vb['NORMAL'][:, :3].astype(float))
+        counts = numpy.bincount(position_indices, minlength=len(unique_positions))
 
         # 对所有位置的法线进行一次性规范化处理
         mask = counts > 0
@@ -752,24 +755,11 @@ class BufferModel:
         # 归一化到[0,1]，然后映射到颜色值
         normalized_normals = ((average_normals + 1) / 2 * 255).astype(numpy.uint8)
 
-        # 更新颜色信息
-        new_color = []
-        for i, val in enumerate(vb):
-            color = [0, 0, 0, val['COLOR'][3]]  # 保留原来的Alpha通道
-            
-            if mask[position_indices[i]]:
-                color[:3] = normalized_normals[position_indices[i]]
-
-            new_color.append(color)
-
-        # 将新的颜色列表转换为NumPy数组
-        new_color_array = numpy.array(new_color, dtype=numpy.uint8)
-
-        # 更新vb中的颜色信息
-        for i, val in enumerate(vb):
-            val['COLOR'] = new_color_array[i]
-
-        TimerUtils.End("Recalculate COLOR")
+        # 更新颜色信息，保留原来的Alpha通道
+        new_color_array = numpy.zeros((len(vb), 4), dtype=numpy.uint8)
+        new_color_array[:, :3] = normalized_normals[position_indices]
+        new_color_array[:, 3] = vb['COLOR'][:, 3].astype(numpy.uint8)
+        vb['COLOR'] = new_color_array
         return vb
 
 
@@ -777,18 +767,17 @@ class BufferModel:
 class MeshExporter:
 
     @classmethod
-    def get_buffer_ib_vb_fast(cls,d3d11GameType:D3D11GameType):
+    def gather_buffer_model(cls,d3d11GameType:D3D11GameType,use_export_cache:bool = False,normalize_all_weights:bool = False):
         '''
-        使用Numpy直接从当前选中的obj的mesh中转换数据到目标格式Buffer
+        导出的第一阶段：从当前选中的obj中读取计算需要的所有数据，访问了bpy，所以必须在主线程中依次调用
 
+        normalize_all_weights为True时，在读取出的权重上执行和Normalize All相同的规格化，
+        不需要切换到权重绘制模式，也不会修改场景中的obj
 
-        TODO 目前这个函数分别在BranchModel和DrawIBModelWWMI中被调用，
-        这是因为我们对indexid_vertexid_dict的组合还没有搞清楚导致的
-        实际上全部都应该在BranchModel中进行调用。
-
-        TODO 且获取indexid_vertexid_dict很明显导致导出速度变慢，算法仍然有问题
+        返回(buffer_model, cached_obj_model)
+        命中ExportCache时buffer_model为None，直接使用cached_obj_model，否则cached_obj_model为None，
+        需要再调用calc_buffer_model完成计算。
         '''
-        # TimerUtils.Start("get_buffer_ib_vb_fast")
         buffer_model = BufferModel(d3d11GameType=d3d11GameType)
 
         obj = ObjUtils.get_bpy_context_object()
@@ -804,29 +793,53 @@ class MeshExporter:
         # Calculates tangents and makes loop normals valid (still with our custom normal data from import time):
         # 前提是有UVMap，前面的步骤应该保证了模型至少有一个TEXCOORD.xy
         mesh.calc_tangents()
+
+        buffer_model.obj_name = obj.name
+        if normalize_all_weights:
+            buffer_model.normalize_all_lock_flags = VertexGroupUtils.get_normalize_all_lock_flags(obj)
+
+        if use_export_cache:
+            buffer_model.export_cache_fingerprint = ExportCache.get_mesh_fingerprint(obj, mesh, d3d11GameType, buffer_model.normalize_all_lock_flags)
+            cached_obj_model = ExportCache.load(obj.name, buffer_model.export_cache_fingerprint)
+            if cached_obj_model is not None:
+                print("Using export cache for " + obj.name)
+                return None, cached_obj_model
     
         # 读取并解析数据
-        buffer_model.parse_elementname_ravel_ndarray_dict(mesh)
+        buffer_model.parse_mesh_data(obj, mesh)
+        return buffer_model, None
+
+    @classmethod
+    def calc_buffer_model(cls,buffer_model:BufferModel) -> ObjDataModel:
+        '''
+        导出的第二阶段：只使用gather_buffer_model读取好的numpy数组计算IB和CategoryBuffer，不访问bpy，可以在其它线程中调用
+        '''
+        obj_model = buffer_model.calc_index_vertex_buffer()
 
-        obj_model = ObjDataModel(mesh.name)
+        if buffer_model.export_cache_fingerprint is not None:
+            ExportCache.save(buffer_model.obj_name, buffer_model.export_cache_fingerprint, obj_model)
 
-        # 因为只有存在TANGENT时，顶点数才会增加，所以如果是GF2并且存在TANGENT才使用共享TANGENT防止增加顶点数
-        if GlobalConfig.logic_name == LogicName.UnityCPU and "TANGENT" in buffer_model.d3d11GameType.OrderedFullElementList:
-            obj_model = buffer_model.calc_index_vertex_buffer_girlsfrontline2(obj, mesh)
-        elif GlobalConfig.logic_name == LogicName.WutheringWaves:
-            print("calc_index_vertex_buffer_wwmi::")
-            
-            obj_model = buffer_model.calc_index_vertex_buffer_wwmi(obj, mesh)
+        return obj_model
 
-        elif GlobalConfig.logic_name == LogicName.SnowBreak:
-            obj_model = buffer_model.calc_index_vertex_buffer_wwmi(obj, mesh)
-        else:
-            # 计算IndexBuffer和CategoryBufferDict
-            obj_model = buffer_model.calc_index_vertex_buffer_universal(obj, mesh)
-            
+    @classmethod
+    def get_buffer_ib_vb_fast(cls,d3d11GameType:D3D11GameType,use_export_cache:bool = False):
+        '''
+        使用Numpy直接从当前选中的obj的mesh中转换数据到目标格式Buffer
+
+        use_export_cache为True时，mesh数据和导出选项都没有变化的obj会直接从ExportCache中读取结果
+
+        TODO 目前这个函数分别在BranchModel和DrawIBModelWWMI中被调用，
+        这是因为我们对index_vertex_id_ndarray的组合还没有搞清楚导致的
+        实际上全部都应该在BranchModel中进行调用。
+
+        '''
+        # TimerUtils.Start("get_buffer_ib_vb_fast")
+        buffer_model, obj_model = cls.gather_buffer_model(d3d11GameType,use_export_cache=use_export_cache)
+        if obj_model is None:
+            obj_model = cls.calc_buffer_model(buffer_model)
         # TimerUtils.End("get_buffer_ib_vb_fast")
         
-        return obj_model.ib, obj_model.category_buffer_dict, obj_model.index_vertex_id_dict
+        return obj_model.ib, obj_model.category_buffer_dict, obj_model.index_vertex_id_ndarray
 
 
 
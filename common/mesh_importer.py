@@ -3,7 +3,6 @@
 import bpy
 import os
 import numpy
-import itertools
 import math
 
 from ..utils.timer_utils import TimerUtils
@@ -12,6 +11,7 @@ from ..utils.format_utils import Fatal,FormatUtils
 from ..utils.texture_utils import TextureUtils
 from ..utils.mesh_utils import MeshUtils
 from ..utils.log_utils import LOG
+from ..utils.parse_cache_utils import ParseCacheUtils
 
 from ..config.main_config import GlobalConfig, LogicName
 from ..config.properties_import_model import Properties_ImportModel
@@ -21,7 +21,7 @@ from ..common.migoto_format import D3D11Element
 from ..common.extracted_object import ExtractedObjectHelper
 
 # 用于解决 AttributeError: 'IMPORT_MESH_OT_migoto_raw_buffers_mmt' object has no attribute 'filepath'
-from bpy_extras.io_utils import unpack_list, axis_conversion
+from bpy_extras.io_utils import axis_conversion
 
 
 class FMTFile:
@@ -149,22 +149,27 @@ class MigotoBinaryFile:
 
     '''
     def __init__(self, fmt_path:str, mesh_name:str = ""):
-        self.fmt_file = FMTFile(fmt_path)
-        print("fmt_path: " + fmt_path)
+        # 一键导入时这里在工作线程中执行，日志先记录下来，由create_mesh_obj_from_mbf在主线程中输出，避免多个线程的输出交错
+        self.log_message_list:list[str] = []
+
+        # fmt文件没有修改过时复用之前的解析结果，fmt_file是共享的，这里不能修改它
+        self.fmt_file:FMTFile = ParseCacheUtils.get_or_parse("FMTFile", fmt_path, FMTFile)
+        self.log_message_list.append("fmt_path: " + fmt_path)
         location_folder_path = os.path.dirname(fmt_path)
-        print("location_folder_path: " + location_folder_path)
+        self.log_message_list.append("location_folder_path: " + location_folder_path)
 
-        if self.fmt_file.prefix == "":
-            self.fmt_file.prefix = os.path.basename(fmt_path).split(".fmt")[0]
+        prefix = self.fmt_file.prefix
+        if prefix == "":
+            prefix = os.path.basename(fmt_path).split(".fmt")[0]
 
         if mesh_name == "":
-            self.mesh_name = self.fmt_file.prefix
+            self.mesh_name = prefix
         else:
             self.mesh_name = mesh_name
         
 
-        print("prefix: " + self.fmt_file.prefix)
-        self.init_from_prefix(self.fmt_file.prefix, location_folder_path)
+        self.log_message_list.append("prefix: " + prefix)
+        self.init_from_prefix(prefix, location_folder_path)
 
     def init_from_prefix(self,prefix:str, location_folder_path:str):
 
@@ -186,18 +191,48 @@ class MigotoBinaryFile:
         self.init_data()
 
     def init_data(self):
+        '''
+        .ib和.vb文件都使用numpy.memmap只读映射，不会一次性全部读入内存，
+        每个Element的数据在用到时才通过get_element_data读取并解码，用不到的Element不会产生任何开销。
+        '''
         ib_stride = FormatUtils.format_size(self.fmt_file.format)
 
         self.ib_count = int(self.ib_file_size / ib_stride)
         self.ib_polygon_count = int(self.ib_count / 3)
-        self.ib_data = numpy.fromfile(self.ib_bin_path, dtype=FormatUtils.get_nptype_from_format(self.fmt_file.format), count=self.ib_count)
+        self.ib_data = self.open_memmap(self.ib_bin_path, dtype=FormatUtils.get_nptype_from_format(self.fmt_file.format), count=self.ib_count)
         
         # 读取fmt文件，解析出后面要用的dtype
         fmt_dtype = self.fmt_file.get_dtype()
         vb_stride = fmt_dtype.itemsize
 
         self.vb_vertex_count = int(self.vb_file_size / vb_stride)
-        self.vb_data = numpy.fromfile(self.vb_bin_path, dtype=fmt_dtype, count=self.vb_vertex_count)
+        self.vb_data = self.open_memmap(self.vb_bin_path, dtype=fmt_dtype, count=self.vb_vertex_count)
+
+    def open_memmap(self,file_path:str,dtype,count:int):
+        # 空文件无法创建memmap，这种情况直接返回空数组，后面的file_size_check会跳过导入
+        if count == 0:
+            return numpy.empty(0, dtype=dtype)
+        return numpy.memmap(file_path, dtype=dtype, mode='r', shape=(count,))
+
+    def get_element_data(self,element:D3D11Element,copy:bool=True) -> numpy.ndarray:
+        '''
+        读取并解码单个Element的数据
+        copy为True时返回的数组不引用memmap，所以close之后仍然可以继续使用
+        copy为False时，不需要格式转换的Element会直接返回memmap上的只读视图，调用方必须在close之前复制出来
+        '''
+        raw_data = self.vb_data[element.ElementName]
+        data = FormatUtils.apply_format_conversion(raw_data, element.Format)
+        if copy and data is raw_data:
+            data = numpy.array(raw_data)
+        return data
+
+    def close(self):
+        '''
+        释放.ib和.vb文件的memmap，导入完成后必须调用
+        Windows下memmap没有释放时对应文件会一直被占用，无法被覆盖写入
+        '''
+        self.ib_data = None
+        self.vb_data = None
 
     
     def file_sanity_check(self):
@@ -228,87 +263,93 @@ class MigotoBinaryFile:
         
         return True
 
+class MeshImportData:
+    '''
+    导入一个模型需要的所有numpy数据，由MeshImporter.read_mesh_import_data计算得到
+    这一步只读取文件和计算numpy数组，不访问bpy，所以可以在其它线程中提前计算好，主线程只负责创建mesh
+    '''
+    def __init__(self):
+        self.ib = None # 已经按需翻转过面朝向的索引，也就是每个loop对应的顶点索引
+        self.positions = None
+        self.normals = None # 没有NORMAL时为None
+        self.loop_color_dict:dict[str,numpy.ndarray] = {} # ElementName和每个loop的RGBA颜色
+        self.loop_uv_dict:dict[str,numpy.ndarray] = {} # UV名称和每个loop的UV
+        self.blend_indices = {}
+        self.blend_weights = {}
+        self.shapekey_ids:list[int] = [] # 每个形状键的SemanticIndex
+        self.shapekey_offsets = None # (形状键数量, 顶点数, 3)的偏移量，没有形状键时为None
+        self.component = None # 如果是一键导入WWMI的模型则为Metadata.json中对应的component
+        self.log_message_list:list[str] = [] # 计算过程中的日志，由create_mesh_obj_from_mbf在主线程中输出
+
+
 class MeshImporter:
     '''
     这个类依赖于提供的MigotoBinaryFile进行数据导入和处理
     '''
     @classmethod
-    def create_mesh_obj_from_mbf(cls, mbf:MigotoBinaryFile):
-        TimerUtils.Start("Import 3Dmigoto Raw")
-        print("导入模型: " + mbf.mesh_name)
-        
-        if not mbf.file_size_check():
-            return None
-
-        # 创建mesh和obj
-        mesh = bpy.data.meshes.new(mbf.mesh_name)
-        obj = bpy.data.objects.new(mesh.name, mesh)
-
-        MeshImporter.set_import_coordinate(obj=obj)
-        MeshImporter.set_import_attributes(obj=obj, mbf=mbf)
-        MeshImporter.initialize_mesh(mesh, mbf)
+    def read_mesh_import_data(cls, mbf:MigotoBinaryFile, use_mirror_workflow:bool, import_merged_vgmap:bool) -> MeshImportData:
+        '''
+        读取并计算导入需要的所有数据，不访问bpy，可以在其它线程中调用
+        use_mirror_workflow和import_merged_vgmap是bpy中的选项，所以要由调用方在主线程中读取后传进来
+        这里不直接print，日志记录在import_data.log_message_list中，由主线程统一输出
+        '''
+        import_data = MeshImportData()
+        import_data.ib = cls.get_import_ib(mbf, use_mirror_workflow)
 
-        blend_indices = {}
-        blend_weights = {}
         texcoords = {}
-        shapekeys = {}
-        use_normals = False
-        normals = []
-
-
-
+        shapekey_element_list = []
 
         for element in mbf.fmt_file.elements:
-            data = mbf.vb_data[element.ElementName]
+            # TANGENT和BINORMAL导入时用不到，直接跳过，不读取也不解码
+            if element.SemanticName == "TANGENT" or element.SemanticName == "BINORMAL":
+                continue
+
+            # 形状键在后面统一读取到一整块数组里
+            if element.SemanticName.startswith("SHAPEKEY"):
+                shapekey_element_list.append(element)
+                continue
 
-            print("当前Element: " + element.ElementName)
-            print("当前数据转换前 Shape: " + str(data.shape))
-            data = FormatUtils.apply_format_conversion(data, element.Format)
-            print("当前数据转换后 Shape: " + str(data.shape))
+            import_data.log_message_list.append("当前Element: " + element.ElementName)
+            data = mbf.get_element_data(element)
+            import_data.log_message_list.append("当前数据转换后 Shape: " + str(data.shape))
 
             if element.SemanticName == "POSITION":
-                if len(data[0]) == 4:
+                if data.shape[1] == 4:
                     # Nico: 这里改为只要所有的第四位都是0或1就可以近似看为3D的 POSITION
                     # 这种处理是偷懒，第四位直接不管了，呵呵呵
-                    if not all(x[3] in (0, 1) for x in data):
-                    # if ([x[3] for x in data] != [1.0] * len(data)) and ([x[3] for x in data] != [0] * len(data)):
+                    if not numpy.isin(data[:, 3], (0, 1)).all():
                         raise Fatal('Positions are 4D')
-                    
+
+                positions = numpy.array(data[:, :3], dtype=numpy.float32)
+
                 # XXX 翻转X轴，Blender的X轴是左手系，D3D11是右手系
                 # 这一步是为了解决导入的模型是镜像的问题
-                if Properties_ImportModel.use_mirror_workflow():
-                    print("使用非镜像工作流导入模型")
-                    positions = [(x[0] * -1, x[1] , x[2] ) for x in data]
-                else:
-                    positions = [(x[0], x[1] , x[2] ) for x in data]
+                if use_mirror_workflow:
+                    import_data.log_message_list.append("使用非镜像工作流导入模型")
+                    positions[:, 0] *= -1
 
-                mesh.vertices.foreach_set('co', unpack_list(positions))
+                import_data.positions = positions
             elif element.SemanticName.startswith("COLOR"):
-                mesh.vertex_colors.new(name=element.ElementName)
-                color_layer = mesh.vertex_colors[element.ElementName].data
-                for l in mesh.loops:
-                    color_layer[l.index].color = list(data[l.vertex_index]) + [0] * (4 - len(data[l.vertex_index]))
+                # 不足4个分量的补0，再按每个loop的顶点索引展开
+                colors = numpy.zeros((len(data), 4), dtype=numpy.float32)
+                colors[:, :data.shape[1]] = data[:, :4]
+                import_data.loop_color_dict[element.ElementName] = colors[import_data.ib]
                 
             elif element.SemanticName == "BLENDINDICES":
                 if data.ndim == 1:
-                    # 如果data是一维数组，转换为包含元组的2D数组，用于处理只有一个R32_UINT的情况
-                    data_2d = numpy.array([(x,) for x in data])
-                    blend_indices[element.SemanticIndex] = data_2d
-                else:
-                    blend_indices[element.SemanticIndex] = data
+                    # 如果data是一维数组，转换为只有一列的2D数组，用于处理只有一个R32_UINT的情况
+                    data = data.reshape(-1, 1)
+                import_data.blend_indices[element.SemanticIndex] = cls.sanitize_blend_indices(data)
                 # print("Import BLENDINDICES Shape: " + str(blend_indices[element.SemanticIndex].shape))
             
             # 因为历史遗留问题，部分名为BLENDWEIGHT部分名为BLENDWEIGHTS，所以这里俩都判断
             # 而由于YYSLS中出现了BLENDWEIGHTEXT，BLENDINDICESEXT，所以不能用StartsWith("BLENDWEIGHT")来判断
             elif element.SemanticName == "BLENDWEIGHT" or element.SemanticName == "BLENDWEIGHTS":
-                blend_weights[element.SemanticIndex] = data
+                import_data.blend_weights[element.SemanticIndex] = data
                 # print("Import BLENDWEIGHT Shape: " + str(blend_indices[element.SemanticIndex].shape))
             elif element.SemanticName.startswith("TEXCOORD"):
                 texcoords[element.SemanticIndex] = data
-            elif element.SemanticName.startswith("SHAPEKEY"):
-                shapekeys[element.SemanticIndex] = data
             elif element.SemanticName.startswith("NORMAL"):
-                use_normals = True
                 '''
                 燕云十六声在导入法线时，必须先进行处理。
                 这里要注意一个点，如果dump出来的法线数据，全部是正数的话，说明导出时进行了归一化
@@ -319,59 +360,113 @@ class MeshImporter:
                 # (此处感谢 球球 的代码开发)
                 '''
                 if GlobalConfig.logic_name == LogicName.YYSLS:
-                    print("燕云十六声法线处理")
-                    normals = [(x[0] * 2 - 1, x[1] * 2 - 1, x[2] * 2 - 1) for x in data]
+                    import_data.log_message_list.append("燕云十六声法线处理")
+                    import_data.normals = numpy.array(data[:, :3] * 2 - 1, dtype=numpy.float32)
                 else:
-                    normals = [(x[0], x[1], x[2]) for x in data]
-            elif element.SemanticName == "TANGENT":
-                pass
-            elif element.SemanticName == "BINORMAL":
-                pass
+                    import_data.normals = numpy.array(data[:, :3], dtype=numpy.float32)
             else:
                 raise Fatal("Unknown ElementName: " + element.ElementName)
 
         # 导入完之后，如果发现blend_weights是空的，则自动补充默认值为1,0,0,0的BLENDWEIGHTS
-        if len(blend_weights) == 0 and len(blend_indices) != 0:
-            print("检测到BLENDWEIGHTS为空，但是含有BLENDINDICES数据，特殊情况，默认补充1,0,0,0的BLENDWEIGHTS")
-            tmpi = 0
-            for blendindices_turple in blend_indices.values():
-                # print(blendindices_turple)
-                new_dict = []
-                for indices in blendindices_turple:
-                    new_dict.append((1.0,0,0,0))
-                blend_weights[tmpi] = new_dict
-                tmpi = tmpi + 1
-
-        MeshImporter.import_uv_layers(mesh, obj, texcoords)
+        if len(import_data.blend_weights) == 0 and len(import_data.blend_indices) != 0:
+            import_data.log_message_list.append("检测到BLENDWEIGHTS为空，但是含有BLENDINDICES数据，特殊情况，默认补充1,0,0,0的BLENDWEIGHTS")
+            # 所有BLENDINDICES的顶点数都相同，导入时只读不写，所以共用同一个数组
+            default_blend_weights = numpy.zeros((mbf.vb_vertex_count, 4), dtype=numpy.float32)
+            default_blend_weights[:, 0] = 1.0
+            for semantic_index in import_data.blend_indices.keys():
+                import_data.blend_weights[semantic_index] = default_blend_weights
+
+        import_data.loop_uv_dict = cls.get_loop_uv_dict(texcoords, import_data.ib)
+
+        # 所有形状键直接从vb解码到同一个(K,N,3)数组中，不需要转换格式的形状键不会产生中间副本
+        if len(shapekey_element_list) != 0:
+            import_data.shapekey_offsets = numpy.empty((len(shapekey_element_list), mbf.vb_vertex_count, 3), dtype=numpy.float32)
+            for shapekey_index, element in enumerate(shapekey_element_list):
+                import_data.shapekey_ids.append(element.SemanticIndex)
+                import_data.shapekey_offsets[shapekey_index] = mbf.get_element_data(element, copy=False)[:, :3]
 
         #  metadata.json, if contains then we can import merged vgmap.
-        component = None
-        if Properties_WWMI.import_merged_vgmap() and GlobalConfig.logic_name == LogicName.WutheringWaves:
-            print("尝试读取Metadata.json")
+        if import_merged_vgmap and GlobalConfig.logic_name == LogicName.WutheringWaves:
+            import_data.log_message_list.append("尝试读取Metadata.json")
             metadatajsonpath = os.path.join(os.path.dirname(mbf.fmt_path),'Metadata.json')
             if os.path.exists(metadatajsonpath):
-                print("鸣潮读取Metadata.json")
+                import_data.log_message_list.append("鸣潮读取Metadata.json")
                 extracted_object = ExtractedObjectHelper.read_metadata(metadatajsonpath)
                 if "-" in mbf.mesh_name:
                     partname_count = int(mbf.mesh_name.split("-")[1]) - 1
-                    print("import partname count: " + str(partname_count))
-                    component = extracted_object.components[partname_count]
-        # print(len(blend_indices))
-        # print(len(blend_weights))
+                    import_data.log_message_list.append("import partname count: " + str(partname_count))
+                    import_data.component = extracted_object.components[partname_count]
+
+        return import_data
+
+    @classmethod
+    def prepare_import(cls, fmt_path:str, mesh_name:str, use_mirror_workflow:bool, import_merged_vgmap:bool):
+        '''
+        读取fmt、vb、ib文件并计算好导入需要的所有数据，返回(mbf, import_data)，不访问bpy，可以在其它线程中调用
+        vb或ib文件为空时import_data为None，由create_mesh_obj_from_mbf跳过导入
+        返回的mbf已经close，只保留fmt和文件信息
+        '''
+        mbf = MigotoBinaryFile(fmt_path=fmt_path, mesh_name=mesh_name)
+        import_data = None
+        try:
+            if mbf.vb_file_size != 0 and mbf.ib_file_size != 0:
+                import_data = cls.read_mesh_import_data(mbf, use_mirror_workflow=use_mirror_workflow, import_merged_vgmap=import_merged_vgmap)
+        finally:
+            mbf.close()
+        return mbf, import_data
+
+    @classmethod
+    def create_mesh_obj_from_mbf(cls, mbf:MigotoBinaryFile, import_data:MeshImportData = None):
+        '''
+        import_data为None时在这里读取计算，否则直接使用提前在其它线程中准备好的import_data
+        '''
+        TimerUtils.Start("Import 3Dmigoto Raw")
+        print("导入模型: " + mbf.mesh_name)
+        for log_message in mbf.log_message_list:
+            print(log_message)
+        
+        if not mbf.file_size_check():
+            return None
+
+        if import_data is None:
+            import_data = MeshImporter.read_mesh_import_data(mbf, use_mirror_workflow=Properties_ImportModel.use_mirror_workflow(), import_merged_vgmap=Properties_WWMI.import_merged_vgmap())
+        for log_message in import_data.log_message_list:
+            print(log_message)
+
+        # 创建mesh和obj
+        mesh = bpy.data.meshes.new(mbf.mesh_name)
+        obj = bpy.data.objects.new(mesh.name, mesh)
+
+        MeshImporter.set_import_coordinate(obj=obj)
+        MeshImporter.set_import_attributes(obj=obj, mbf=mbf)
+        MeshImporter.initialize_mesh(mesh, mbf, import_data.ib)
+
+        if import_data.positions is not None:
+            mesh.vertices.foreach_set('co', import_data.positions.ravel())
+
+        for color_name, loop_colors in import_data.loop_color_dict.items():
+            # 使用CORNER域的BYTE_COLOR颜色属性，和旧的vertex_colors是同一种数据，导出时仍然可以通过vertex_colors读取
+            # 旧的vertex_colors的color就是sRGB空间的原始值，所以这里写入color_srgb，保证导入导出数值一致
+            color_attribute = mesh.color_attributes.new(name=color_name, type='BYTE_COLOR', domain='CORNER')
+            color_attribute.data.foreach_set("color_srgb", loop_colors.ravel())
+
+        for uv_name, loop_uvs in import_data.loop_uv_dict.items():
+            mesh.uv_layers.new(name=uv_name)
+            mesh.uv_layers[uv_name].data.foreach_set('uv', loop_uvs.ravel())
 
         print("导入顶点组")
-        MeshImporter.import_vertex_groups(mesh, obj, blend_indices, blend_weights, component)
+        MeshImporter.import_vertex_groups(mesh, obj, import_data.blend_indices, import_data.blend_weights, import_data.component)
         print("导入顶点组完毕")
 
 
-        MeshImporter.import_shapekeys(mesh, obj, shapekeys)
+        MeshImporter.import_shapekeys(mesh, obj, import_data.shapekey_ids, import_data.shapekey_offsets)
 
         # Validate closes the loops so they don't disappear after edit mode and probably other important things:
         mesh.validate(verbose=False, clean_customdata=False)  
         mesh.update()
         # XXX 这个方法还必须得在mesh.validate和mesh.update之后调用 3.6和4.2都可以用这个
-        if use_normals:
-            MeshUtils.set_import_normals(mesh=mesh,normals=normals)
+        if import_data.normals is not None:
+            MeshUtils.set_import_normals(mesh=mesh,normals=import_data.normals)
         
         MeshImporter.create_bsdf_with_diffuse_linked(obj, mesh_name=mbf.mesh_name,directory=os.path.dirname(mbf.fmt_path))
         MeshImporter.set_import_rotate_angle(obj=obj, mbf=mbf)
@@ -426,43 +521,38 @@ class MeshImporter:
             obj.rotation_euler[2] = math.radians(mbf.fmt_file.rotate_angle_z)
 
     @classmethod
-    def initialize_mesh(cls,mesh, mbf:MigotoBinaryFile):
-        # 翻转索引顺序以改变面朝向，只能改变面朝向，模型依然是镜像的
-        # print(mbf.ib_data[0],mbf.ib_data[1],mbf.ib_data[2])
-        if Properties_ImportModel.use_mirror_workflow():
+    def get_import_ib(cls, mbf:MigotoBinaryFile, use_mirror_workflow:bool) -> numpy.ndarray:
+        '''
+        返回按需翻转过面朝向的int32索引
+        翻转索引顺序以改变面朝向，只能改变面朝向，模型依然是镜像的
+        '''
+        ib = numpy.asarray(mbf.ib_data, dtype=numpy.int32)
+        if use_mirror_workflow:
             if not mbf.fmt_file.flip_face_orientation:  # 假设你有一个标志位控制是否翻转
-                flipped_indices = []
-                for i in range(0, len(mbf.ib_data), 3):
-                    triangle = mbf.ib_data[i:i+3]
-                    flipped_triangle = triangle[::-1]
-                    flipped_indices.extend(flipped_triangle)
-                mbf.ib_data = flipped_indices
+                ib = MeshUtils.flip_triangle_winding(ib)
         else:
             if mbf.fmt_file.flip_face_orientation:  # 假设你有一个标志位控制是否翻转
-                flipped_indices = []
-                for i in range(0, len(mbf.ib_data), 3):
-                    triangle = mbf.ib_data[i:i+3]
-                    flipped_triangle = triangle[::-1]
-                    flipped_indices.extend(flipped_triangle)
-                mbf.ib_data = flipped_indices
-        # print(mbf.ib_data[0],mbf.ib_data[1],mbf.ib_data[2])
+                ib = MeshUtils.flip_triangle_winding(ib)
+        return ib
 
+    @classmethod
+    def initialize_mesh(cls,mesh, mbf:MigotoBinaryFile, ib:numpy.ndarray):
         # 导入IB文件设置为mesh的三角形索引
         mesh.loops.add(mbf.ib_count)
         mesh.polygons.add(mbf.ib_polygon_count)
-        mesh.loops.foreach_set('vertex_index', mbf.ib_data)
-        mesh.polygons.foreach_set('loop_start', [x * 3 for x in range(mbf.ib_polygon_count)])
-        mesh.polygons.foreach_set('loop_total', [3] * mbf.ib_polygon_count)
+        mesh.loops.foreach_set('vertex_index', ib)
+        mesh.polygons.foreach_set('loop_start', MeshUtils.get_triangle_loop_starts(mbf.ib_polygon_count))
+        mesh.polygons.foreach_set('loop_total', MeshUtils.get_triangle_loop_totals(mbf.ib_polygon_count))
 
         # 根据vb文件的顶点数设置mesh的顶点数
         mesh.vertices.add(mbf.vb_vertex_count)
 
     @classmethod
-    def import_uv_layers(cls,mesh, obj, texcoords):
-        # 预先获取所有循环的顶点索引并转换为numpy数组
-        loops = mesh.loops
-        vertex_indices = numpy.array([l.vertex_index for l in loops], dtype=numpy.int32)
-        
+    def get_loop_uv_dict(cls, texcoords, loop_vertex_indices:numpy.ndarray) -> dict:
+        '''
+        计算每个UV层中每个loop的UV数据，返回UV名称和(loop数,2)数组的字典，字典顺序就是UV层的创建顺序
+        '''
+        loop_uv_dict = {}
         for texcoord, data in sorted(texcoords.items()):
             # 将原始数据转换为numpy数组（只需转换一次）
             data_np = numpy.array(data, dtype=numpy.float32)
@@ -486,10 +576,7 @@ class MeshImporter:
             cmap = {'x': 0, 'y': 1, 'z': 2, 'w': 3}
             
             for components in components_list:
-                # 创建UV层
                 uv_name = f'TEXCOORD{texcoord if texcoord else ""}.{components}'
-                mesh.uv_layers.new(name=uv_name)
-                blender_uvs = mesh.uv_layers[uv_name]
                 
                 # 获取分量对应的索引
                 c0 = cmap[components[0]]
@@ -500,11 +587,33 @@ class MeshImporter:
                 uvs[:, 0] = data_np[:, c0]           # U分量
                 uvs[:, 1] = 1.0 - data_np[:, c1]     # V分量翻转
                 
-                # 通过顶点索引获取循环的UV数据并展平为一维数组
-                uv_array = uvs[vertex_indices].ravel()
-                
-                # 批量设置UV数据（自动处理numpy数组）
-                blender_uvs.data.foreach_set('uv', uv_array)
+                # 通过顶点索引获取循环的UV数据
+                loop_uv_dict[uv_name] = uvs[loop_vertex_indices]
+        return loop_uv_dict
+
+    @classmethod
+    def sanitize_blend_indices(cls, bone_indices:numpy.ndarray) -> numpy.ndarray:
+        '''
+        这里的处理是很必要的，因为如果BLENDINDICES的格式是R16G16B16A16_UINT，那么长度为8
+        此时游戏中可能会出现值为FF FF 的无效索引表示，虽然在HLSL中表示无效索引，但是导入进来之后，按照R16G16B16A16_UINT来解析就是65535
+        这会导致后面创建顶点组数量时，直接卡死，所以我们要替换为-1才能够正常导入。
+        此问题在第五人格公研服Neox3引擎中发现并测试。
+        虽然导出时变为 00 00和原本的FF FF不一样，但是游戏中显示Mod是正常的，所以可以确定这么处理是没问题的
+
+        没有65535时原样返回，不复制也不改变类型。
+        有65535时，有符号类型直接原地替换，无符号类型放不下-1，才扩展到能容纳原始值的有符号类型后再替换。
+        '''
+        bone_indices = numpy.ascontiguousarray(bone_indices)
+        invalid_mask = bone_indices == 65535
+        if not invalid_mask.any():
+            return bone_indices
+
+        if bone_indices.dtype.kind == 'u':
+            bone_indices = bone_indices.astype(numpy.promote_types(bone_indices.dtype, numpy.int8))
+        elif not bone_indices.flags.writeable:
+            bone_indices = bone_indices.copy()
+        bone_indices[invalid_mask] = -1
+        return bone_indices
 
     @classmethod
     def import_vertex_groups(cls,mesh, obj, blend_indices, blend_weights,component):
@@ -518,21 +627,7 @@ class MeshImporter:
         #     print(blend_indices[0][1])
         #     LOG.newline()
 
-        '''
-        这里的处理是很必要的，因为如果BLENDINDICES的格式是R16G16B16A16_UINT，那么长度为8
-        此时游戏中可能会出现值为FF FF 的无效索引表示，虽然在HLSL中表示无效索引，但是导入进来之后，按照R16G16B16A16_UINT来解析就是65535
-        这会导致后面创建顶点组数量时，直接卡死，所以我们要替换为-1才能够正常导入。
-        此问题在第五人格公研服Neox3引擎中发现并测试。
-        所以在这里要转换为numpy数组处理，方便把所有65535替换为-1
-        虽然导出时变为 00 00和原本的FF FF不一样，但是游戏中显示Mod是正常的，所以可以确定这么处理是没问题的
-        '''
-        for semantic_index, bone_indices_list in blend_indices.items():
-            # 转为 NumPy 数组处理
-            arr = numpy.array(bone_indices_list)
-            arr = numpy.where(arr == 65535, -1, arr)
-            blend_indices[semantic_index] = arr  # 或 .tolist() 如果后面要用 list
-
-
+        # BLENDINDICES中的65535已经在read_mesh_import_data中通过sanitize_blend_indices替换为-1了
         assert (len(blend_indices) == len(blend_weights))
         if blend_indices:
             # We will need to make sure we re-export the same blend indices later -
@@ -540,59 +635,103 @@ class MeshImporter:
             # to use the vertex group index, vertex group name or attach some extra
             # data. Make sure the indices and names match:
             if component is None:
-                num_vertex_groups = max(itertools.chain(*itertools.chain(*blend_indices.values()))) + 1
+                num_vertex_groups = max(int(numpy.max(bone_indices)) for bone_indices in blend_indices.values()) + 1
+                vertex_group_lut = None
             else:
                 num_vertex_groups = max(component.vg_map.values()) + 1
+                # 这里由于C++生成的json文件是无序的，所以我们这里读取的时候要用原始的map而不是转换成列表的索引，避免无序问题
+                # vg_map的key是字符串形式的原始索引，这里转换为查找表，不在map中的索引为-1
+                vg_map_keys = numpy.array([int(key) for key in component.vg_map.keys()], dtype=numpy.int64)
+                vg_map_values = numpy.array(list(component.vg_map.values()), dtype=numpy.int64)
+                vertex_group_lut = numpy.full(int(vg_map_keys.max()) + 1, -1, dtype=numpy.int64)
+                vertex_group_lut[vg_map_keys] = vg_map_values
             
-            for i in range(num_vertex_groups):
-                obj.vertex_groups.new(name=str(i))
-            for vertex in mesh.vertices:
-                for semantic_index in sorted(blend_indices.keys()):
-                    for i, w in zip(blend_indices[semantic_index][vertex.index], blend_weights[semantic_index][vertex.index]):
-                        if w == 0.0:
-                            continue
-                        if component is None:
-                            obj.vertex_groups[i].add((vertex.index,), w, 'REPLACE')
-                        else:
-                            # 这里由于C++生成的json文件是无序的，所以我们这里读取的时候要用原始的map而不是转换成列表的索引，避免无序问题
-                            obj.vertex_groups[component.vg_map[str(i)]].add((vertex.index,), w, 'REPLACE')
+            vertex_group_list = [obj.vertex_groups.new(name=str(i)) for i in range(num_vertex_groups)]
+
+            '''
+            之前是逐个顶点逐个权重调用一次vertex_group.add，这里改为按权重槽位批量添加：
+            按SemanticIndex从小到大、槽位从前到后的顺序，每个槽位中把顶点按(顶点组, 权重)分桶，每个桶只调用一次add。
+            这样每个顶点的顶点组添加顺序和之前逐个顶点添加时完全一致，同一顶点重复出现的顶点组仍然以最后一次的权重为准。
+            '''
+            vertex_count = len(mesh.vertices)
+            for semantic_index in sorted(blend_indices.keys()):
+                bone_indices = numpy.asarray(blend_indices[semantic_index]).reshape(vertex_count, -1)
+                bone_weights = numpy.asarray(blend_weights[semantic_index]).reshape(vertex_count, -1)
+
+                for slot in range(min(bone_indices.shape[1], bone_weights.shape[1])):
+                    slot_weights = bone_weights[:, slot]
+                    vertex_indices = numpy.flatnonzero(slot_weights != 0.0)
+                    if len(vertex_indices) == 0:
+                        continue
+
+                    weights = slot_weights[vertex_indices]
+                    group_indices = bone_indices[vertex_indices, slot].astype(numpy.int64)
+
+                    if vertex_group_lut is None:
+                        # 和之前obj.vertex_groups[i]一致，-1表示最后一个顶点组
+                        group_indices = numpy.where(group_indices < 0, group_indices + num_vertex_groups, group_indices)
+                    else:
+                        invalid_mask = (group_indices < 0) | (group_indices >= len(vertex_group_lut))
+                        group_indices = vertex_group_lut[numpy.where(invalid_mask, 0, group_indices)]
+                        group_indices[invalid_mask] = -1
+                        if (group_indices < 0).any():
+                            raise Fatal("BLENDINDICES contains vertex group indices that are not in the vg_map of Metadata.json")
+
+                    # 按(顶点组, 权重)排序后分桶
+                    sort_indices = numpy.lexsort((weights, group_indices))
+                    sorted_group_indices = group_indices[sort_indices]
+                    sorted_weights = weights[sort_indices]
+                    bucket_starts = numpy.flatnonzero(numpy.r_[True, (sorted_group_indices[1:] != sorted_group_indices[:-1]) | (sorted_weights[1:] != sorted_weights[:-1])])
+                    bucket_ends = numpy.r_[bucket_starts[1:], len(sort_indices)]
+                    sorted_vertex_indices = vertex_indices[sort_indices]
+
+                    for bucket_start, bucket_end in zip(bucket_starts.tolist(), bucket_ends.tolist()):
+                        vertex_group = vertex_group_list[int(sorted_group_indices[bucket_start])]
+                        vertex_group.add(sorted_vertex_indices[bucket_start:bucket_end].tolist(), float(sorted_weights[bucket_start]), 'REPLACE')
 
     @classmethod
-    def import_shapekeys(cls,mesh, obj, shapekeys):
-        if not shapekeys:
+    def import_shapekeys(cls,mesh, obj, shapekey_ids:list[int], shapekey_offsets:numpy.ndarray):
+        '''
+        shapekey_offsets是(形状键数量, 顶点数, 3)的偏移量，计算时会直接原地加上基础形状变为每个形状键的坐标
+        '''
+        if shapekey_offsets is None or len(shapekey_ids) == 0:
             return
-        
+
+        # 可选跳过所有偏移都是0的形状键，这种形状键导入后没有任何效果
+        shapekey_import_mask = [True] * len(shapekey_ids)
+        if Properties_ImportModel.skip_empty_shapekeys():
+            shapekey_import_mask = shapekey_offsets.reshape(len(shapekey_ids), -1).any(axis=1).tolist()
+            print("跳过空形状键数量: " + str(shapekey_import_mask.count(False)))
+            if not any(shapekey_import_mask):
+                return
+
         # ========== 基础形状键预处理 ==========
         basis = obj.shape_key_add(name='Basis')
         basis.interpolation = 'KEY_LINEAR'
         obj.data.shape_keys.use_relative = True
 
-        # 批量获取基础顶点坐标（约快200倍）
+        # 只读取一次基础顶点坐标
         vert_count = len(obj.data.vertices)
         basis_co = numpy.empty(vert_count * 3, dtype=numpy.float32)
         basis.data.foreach_get('co', basis_co)
         basis_co = basis_co.reshape(-1, 3)  # 转换为(N,3)形状
 
-        # ========== 批量处理所有形状键 ==========
-        for sk_id, offsets in shapekeys.items():
-            # 添加新形状键
-            new_sk = obj.shape_key_add(name=f'Deform {sk_id}')
-            new_sk.interpolation = 'KEY_LINEAR'
-
-            # 转换为NumPy数组（假设offsets是列表的列表）
-            offset_arr = numpy.array(offsets, dtype=numpy.float32).reshape(-1, 3)
-
-            # 向量化计算新坐标（比循环快100倍）
-            new_co = basis_co + offset_arr
+        # 一次广播加法算出所有形状键的坐标，原地计算不额外占用内存
+        numpy.add(shapekey_offsets, basis_co, out=shapekey_offsets)
 
-            # 批量写入形状键数据（约快300倍）
-            new_sk.data.foreach_set('co', new_co.ravel())
+        # ========== 逐个写入形状键 ==========
+        for shapekey_index, sk_id in enumerate(shapekey_ids):
+            if not shapekey_import_mask[shapekey_index]:
+                continue
 
-            # 强制解除Blender数据块的引用（重要！避免内存泄漏）
-            del new_sk
+            # 新建的形状键直接复制Basis，不需要计算混合结果
+            # 名称必须保留SemanticIndex，WWMI导出时ShapeKeyUtils.get_shapekey_cache从名称中的deform N解析导出槽位，
+            # 所以跳过空形状键后，其余形状键仍然对应原来的槽位
+            new_sk = obj.shape_key_add(name=f'Deform {sk_id}', from_mix=False)
+            new_sk.interpolation = 'KEY_LINEAR'
 
-        # 清理临时数组
-        del basis_co, offset_arr, new_co
+            # 每个形状键的坐标在内存中是连续的，ravel不会复制
+            new_sk.data.foreach_set('co', shapekey_offsets[shapekey_index].ravel())
 
     @classmethod
     def create_bsdf_with_diffuse_linked(cls, obj, mesh_name:str, directory:str):
@@ -657,7 +796,8 @@ class MeshImporter:
                 if texture_path:
                     tex_image = material.node_tree.nodes.new('ShaderNodeTexImage')
 
-                    tex_image.image = bpy.data.images.load(texture_path)
+                    # 同一张贴图可能被多个模型用到，check_existing让相同路径的贴图只加载一次并共享
+                    tex_image.image = bpy.data.images.load(texture_path, check_existing=True)
 
                     # 因为tga格式贴图有alpha通道，所以必须用CHANNEL_PACKED才能显示正常颜色
                     tex_image.image.alpha_mode = "CHANNEL_PACKED"
@@ -1,5 +1,7 @@
 import json
+import hashlib
 import os
+import numpy
 
 from ..utils.format_utils import FormatUtils
 from ..utils.timer_utils import TimerUtils
@@ -117,9 +119,9 @@ class ObjDataModel:
         self.obj_alias_name = obj_name_split[2]
 
         # 其它属性
-        self.ib = []
+        self.ib = numpy.empty(0, dtype=numpy.uint32) # IndexBuffer统一使用uint32的numpy数组
         self.category_buffer_dict = {}
-        self.index_vertex_id_dict = {} # 仅用于WWMI的索引顶点ID字典，key是顶点索引，value是顶点ID，默认可以为None
+        self.index_vertex_id_ndarray = None # 仅用于WWMI的索引顶点ID数组，下标是顶点索引，值是顶点ID，默认可以为None
         self.condition:M_Condition = M_Condition()
         self.drawindexed_obj:M_DrawIndexed = M_DrawIndexed()
 
@@ -151,6 +153,20 @@ class D3D11GameType:
     CategoryExtractSlotDict:Dict[str,str] =  field(init=False,repr=False)
     CategoryExtractTechniqueDict:Dict[str,str] =  field(init=False,repr=False)
     CategoryStrideDict:Dict[str,int] =  field(init=False,repr=False)
+    # 数据类型相关字段内容的hash，见get_shared_key
+    SharedKey:str = field(init=False,repr=False)
+
+    # __post_init__中读取的所有字段，这些字段都相同的json解析出的D3D11GameType完全相同
+    GameTypeJsonKeyList = ["GPU-PreSkinning", "WorkGameType", "CategoryDrawCategoryMap", "D3D11ElementList"]
+
+    @classmethod
+    def get_shared_key(cls, game_type_json:dict) -> str:
+        '''
+        根据json中数据类型相关的字段计算key，每个DrawIB的tmp.json中CategoryHash等字段不同，
+        但是数据类型相同时这个key相同，可以共享同一个D3D11GameType
+        '''
+        game_type_json_str = json.dumps({json_key: game_type_json.get(json_key,None) for json_key in cls.GameTypeJsonKeyList}, sort_keys=True)
+        return hashlib.sha1(game_type_json_str.encode("utf-8")).hexdigest()
 
     def __post_init__(self):
         self.FileName = os.path.basename(self.FilePath)
@@ -171,6 +187,7 @@ class D3D11GameType:
         with open(self.FilePath, 'r', encoding='utf-8') as f:
             game_type_json = json.load(f)
         
+        self.SharedKey = self.get_shared_key(game_type_json)
         self.GPU_PreSkinning = game_type_json.get("GPU-PreSkinning",False)
 
         self.GameTypeName = game_type_json.get("WorkGameType","")
@@ -11,6 +11,7 @@ from typing import List, Dict, Union
 from dataclasses import dataclass, field, asdict
 
 from ..utils.json_utils import JsonUtils
+from ..utils.parse_cache_utils import ParseCacheUtils
 from ..utils.format_utils import Fatal
 
 from .main_config import GlobalConfig
@@ -42,7 +43,7 @@ class ImportConfig:
 
     def __post_init__(self):
         workspace_import_json_path = os.path.join(GlobalConfig.path_workspace_folder(), "Import.json")
-        draw_ib_gametypename_dict = JsonUtils.LoadFromFile(workspace_import_json_path)
+        draw_ib_gametypename_dict = JsonUtils.LoadFromFileCached(workspace_import_json_path)
         gametypename = draw_ib_gametypename_dict.get(self.draw_ib,"")
 
         # 新版本中，我们把数据类型的信息写到了tmp.json中，这样我们就能够读取tmp.json中的内容来决定生成Mod时的数据类型了。
@@ -50,7 +51,9 @@ class ImportConfig:
         self.extract_gametype_folder_path = extract_gametype_folder_path
         tmp_json_path = os.path.join(extract_gametype_folder_path,"tmp.json")
         if os.path.exists(tmp_json_path):
-            self.d3d11GameType:D3D11GameType = D3D11GameType(tmp_json_path)
+            # 每个DrawIB都有自己的tmp.json，这里按数据类型相关字段的内容共享，数据类型相同的DrawIB复用同一个D3D11GameType
+            gametype_shared_key = D3D11GameType.get_shared_key(JsonUtils.LoadFromFileCached(tmp_json_path))
+            self.d3d11GameType:D3D11GameType = ParseCacheUtils.get_or_create_shared("D3D11GameType", gametype_shared_key, lambda: D3D11GameType(tmp_json_path))
         else:
             raise Fatal("Can't find your tmp.json for generate mod:" + tmp_json_path)
         
@@ -60,7 +63,7 @@ class ImportConfig:
         '''
         extract_gametype_folder_path = GlobalConfig.path_extract_gametype_folder(draw_ib=self.draw_ib,gametype_name=self.d3d11GameType.GameTypeName)
         tmp_json_path = os.path.join(extract_gametype_folder_path,"tmp.json")
-        tmp_json_dict = JsonUtils.LoadFromFile(tmp_json_path)
+        tmp_json_dict = JsonUtils.LoadFromFileCached(tmp_json_path)
 
         self.category_hash_dict = tmp_json_dict["CategoryHash"]
         self.import_model_list = tmp_json_dict["ImportModelList"]
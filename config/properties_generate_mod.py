@@ -73,6 +73,24 @@ class Properties_GenerateMod(bpy.types.PropertyGroup):
         default=False
     ) # type: ignore
 
+    use_r16_uint_index_buffer: bpy.props.BoolProperty(
+        name="IB在顶点数允许时使用R16_UINT格式",
+        description="勾选后，如果某个Component的IndexBuffer中最大索引小于65536，则以R16_UINT格式写出IB文件，并在ini中声明format = DXGI_FORMAT_R16_UINT，可使小部件的IB文件体积和显存上传量减半，超出范围的Component仍然使用R32_UINT",
+        default=False
+    ) # type: ignore
+
+    use_export_cache: bpy.props.BoolProperty(
+        name="使用导出缓存",
+        description="勾选后，每个模型计算得到的IB和Buffer数据会缓存到工作空间的ExportCache文件夹中，下次生成Mod时，模型数据、修改器、数据类型和导出选项都没有变化的模型将直接使用缓存，不再重新计算。\n注意：除上述内容以外的变化不会使缓存失效，可能导出旧的数据，如果怀疑缓存有问题，取消勾选即可强制全部重新计算",
+        default=False
+    ) # type: ignore
+
+    use_parallel_export: bpy.props.BoolProperty(
+        name="多线程计算模型Buffer",
+        description="勾选后，生成Mod时先在主线程中依次从Blender读取所有模型的数据，再使用多个线程同时计算每个模型的IB和Buffer数据，模型数量较多时可明显加快生成速度。\n默认不勾选，逐个模型计算",
+        default=False
+    ) # type: ignore
+
     position_override_filter_draw_type :bpy.props.BoolProperty(
         name="Position替换添加DRAW_TYPE = 1判断",
         description="在NPC与VAT-PreSKinning的NPC冲突时会用到此技术，例如HSR匹诺康尼NPC\n格式：\nif DRAW_TYPE == 1\n  ........\nendif",
@@ -140,6 +158,27 @@ class Properties_GenerateMod(bpy.types.PropertyGroup):
         return bpy.context.scene.properties_generate_mod.recalculate_color
     
 
+    @classmethod
+    def use_r16_uint_index_buffer(cls):
+        '''
+        bpy.context.scene.properties_generate_mod.use_r16_uint_index_buffer
+        '''
+        return bpy.context.scene.properties_generate_mod.use_r16_uint_index_buffer
+
+    @classmethod
+    def use_export_cache(cls):
+        '''
+        bpy.context.scene.properties_generate_mod.use_export_cache
+        '''
+        return bpy.context.scene.properties_generate_mod.use_export_cache
+
+    @classmethod
+    def use_parallel_export(cls):
+        '''
+        bpy.context.scene.properties_generate_mod.use_parallel_export
+        '''
+        return bpy.context.scene.properties_generate_mod.use_parallel_export
+
     @classmethod
     def position_override_filter_draw_type(cls):
         '''
@@ -7,6 +7,19 @@ class Properties_ImportModel(bpy.types.PropertyGroup):
         default=1.0,
     ) # type: ignore
 
+    use_mirror_workflow: bpy.props.BoolProperty(
+        name="使用非镜像工作流",
+        description="默认为False, 启用后导入和导出模型将不再是镜像的，目前3Dmigoto的模型导入后是镜像存粹是由于历史遗留问题是错误的，但是当错误积累成粑粑山，人的习惯和旧的工程很难被改变，所以只有勾选后才能使用非镜像工作流",
+        default=False,
+    ) # type: ignore
+
+    skip_empty_shapekeys: bpy.props.BoolProperty(
+        name="跳过空形状键",
+        description="默认为False, 启用后导入时跳过所有顶点偏移都为0的形状键，这种形状键导入后没有任何效果，跳过可以加快导入并减少内存占用",
+        default=False,
+    ) # type: ignore
+
+
     @classmethod
     def model_scale(cls):
         '''
@@ -14,16 +27,16 @@ class Properties_ImportModel(bpy.types.PropertyGroup):
         '''
         return bpy.context.scene.properties_import_model.model_scale
 
-
-    use_mirror_workflow: bpy.props.BoolProperty(
-        name="使用非镜像工作流",
-        description="默认为False, 启用后导入和导出模型将不再是镜像的，目前3Dmigoto的模型导入后是镜像存粹是由于历史遗留问题是错误的，但是当错误积累成粑粑山，人的习惯和旧的工程很难被改变，所以只有勾选后才能使用非镜像工作流",
-        default=False,
-    ) # type: ignore
-
     @classmethod
     def use_mirror_workflow(cls):
         '''
         bpy.context.scene.properties_import_model.use_mirror_workflow
         '''
         return bpy.context.scene.properties_import_model.use_mirror_workflow
+
+    @classmethod
+    def skip_empty_shapekeys(cls):
+        '''
+        bpy.context.scene.properties_import_model.skip_empty_shapekeys
+        '''
+        return bpy.context.scene.properties_import_model.skip_empty_shapekeys
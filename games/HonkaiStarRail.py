@@ -251,6 +251,7 @@ class ModModelHonkaiStarRail:
         Add Resource IB Section
 
         We default use R32_UINT because R16_UINT have a very small number limit.
+        R16_UINT is only used when enabled and the max index of the component fits in it.
         '''
         for count_i in range(len(draw_ib_model.import_config.part_name_list)):
             partname = draw_ib_model.import_config.part_name_list[count_i]
@@ -260,7 +261,7 @@ class ModModelHonkaiStarRail:
             
             resource_vb_section.append("[" + ib_resource_name + "]")
             resource_vb_section.append("type = Buffer")
-            resource_vb_section.append("format = DXGI_FORMAT_R32_UINT")
+            resource_vb_section.append("format = " + draw_ib_model.PartName_IBFormat_Dict.get(partname,"DXGI_FORMAT_R32_UINT"))
             resource_vb_section.append("filename = Buffer/" + draw_ib_model.draw_ib + "-" + style_partname + ".buf")
             resource_vb_section.new_line()
         
@@ -268,13 +268,14 @@ class ModModelIdentityV:
         Add Resource IB Section
 
         We default use R32_UINT because R16_UINT have a very small number limit.
+        R16_UINT is only used when enabled and the max index of the component fits in it.
         '''
 
         for partname, ib_filename in draw_ib_model.PartName_IBBufferFileName_Dict.items():
             ib_resource_name = draw_ib_model.PartName_IBResourceName_Dict.get(partname,None)
             resource_vb_section.append("[" + ib_resource_name + "]")
             resource_vb_section.append("type = Buffer")
-            resource_vb_section.append("format = DXGI_FORMAT_R32_UINT")
+            resource_vb_section.append("format = " + draw_ib_model.PartName_IBFormat_Dict.get(partname,"DXGI_FORMAT_R32_UINT"))
             resource_vb_section.append("filename = Buffer/" + ib_filename)
             resource_vb_section.new_line()
 
@@ -0,0 +1,63 @@
+'''
+测试在Blender外运行，这里提供最小的bpy等模块替身，只用于让插件模块能够被import，
+测试本身只调用不依赖bpy的numpy计算部分。
+
+插件根目录的__init__.py会导入UI等只能在Blender中运行的模块，所以这里不执行它，
+而是直接把仓库目录注册为一个包，这样插件内部的相对导入可以正常工作。
+'''
+import os
+import sys
+import types
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_PACKAGE_NAME = "TheHerta"
+
+BLENDER_MODULE_NAMES = [
+    "bpy",
+    "bpy.types",
+    "bpy.props",
+    "bpy.utils",
+    "bpy_extras",
+    "bpy_extras.io_utils",
+    "bmesh",
+    "mathutils",
+    "mathutils.kdtree",
+    "bl_math",
+]
+
+
+class _BlenderTypeStub:
+    pass
+
+
+def install_blender_stub_modules():
+    for module_name in BLENDER_MODULE_NAMES:
+        if module_name not in sys.modules:
+            sys.modules[module_name] = mock.MagicMock(name=module_name)
+
+    # 插件中的类会继承这些类型，必须是真正的class
+    bpy_types = sys.modules["bpy"].types
+    for type_name in ["PropertyGroup", "Operator", "Panel", "Menu", "UIList", "AddonPreferences"]:
+        setattr(bpy_types, type_name, type(type_name, (_BlenderTypeStub,), {}))
+
+
+def install_addon_package():
+    if ADDON_PACKAGE_NAME in sys.modules:
+        return
+    addon_package = types.ModuleType(ADDON_PACKAGE_NAME)
+    addon_package.__path__ = [REPO_ROOT]
+    sys.modules[ADDON_PACKAGE_NAME] = addon_package
+
+    # 仓库根目录有__init__.py，pytest会以目录名为模块名import它，这里让它拿到同一个不执行__init__.py的包
+    sys.modules.setdefault(os.path.basename(REPO_ROOT), addon_package)
+
+    # Properties_DBMT_Path在定义类时就会按Windows路径读取config\Config.json，这里直接替换为空的配置类
+    dbmt_path_module = types.ModuleType(ADDON_PACKAGE_NAME + ".config.properties_dbmt_path")
+    dbmt_path_module.Properties_DBMT_Path = type("Properties_DBMT_Path", (_BlenderTypeStub,), {})
+    sys.modules[dbmt_path_module.__name__] = dbmt_path_module
+
+
+install_blender_stub_modules()
+install_addon_package()
+
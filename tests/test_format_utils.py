@@ -0,0 +1,109 @@
+import numpy
+import pytest
+
+from TheHerta.utils.format_utils import FormatUtils
+
+
+def make_blendweights(row_count, column_count, seed):
+    '''
+    生成各种常见情况的权重：随机权重、只有部分非0的权重、低于1/255精度的极小权重、相等的权重
+    '''
+    rng = numpy.random.default_rng(seed)
+    blendweights = rng.random((row_count, column_count)).astype(numpy.float32)
+
+    # 随机把一部分权重清零，模拟只受少数骨骼影响的顶点
+    blendweights[rng.random((row_count, column_count)) < 0.4] = 0
+
+    # 极小权重，归一化后小于1会被忽略
+    tiny_rows = rng.random(row_count) < 0.1
+    blendweights[tiny_rows, -1] = 1e-4
+
+    # 相等的权重，ticket相同时按下标顺序分配误差
+    tie_rows = rng.random(row_count) < 0.1
+    blendweights[tie_rows] = 1.0 / 3
+
+    # 保证每行至少有一个非0权重
+    blendweights[blendweights.sum(axis=1) == 0, 0] = 1.0
+    return blendweights
+
+
+@pytest.mark.parametrize("column_count", [4, 8])
+def test_unorm_blendweights_matches_bk2(column_count):
+    blendweights = make_blendweights(2000, column_count, seed=column_count)
+
+    result = FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights(blendweights)
+
+    expected = FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights_bk2(blendweights)
+    assert result.dtype == numpy.uint8
+    assert numpy.array_equal(result, expected)
+    assert (result.sum(axis=1, dtype=numpy.int64) == 255).all()
+
+
+@pytest.mark.parametrize("column_count", [4, 8])
+@pytest.mark.parametrize("row", [
+    [1.0, 1.0, 1.0, 0.0],
+    [1.0, 1.0, 1.0, 1.0],
+    [0.5, 0.25, 0.25, 0.0],
+    [0.2, 0.2, 0.2, 0.2],
+    [1.0, 1e-6, 1e-6, 1e-6],
+    [1e-6, 0.0, 0.0, 0.0],
+    [0.0, 0.0, 0.0, 0.7],
+    [0.999, 0.001, 0.0, 0.0],
+])
+def test_unorm_blendweights_edge_rows_match_bk2(column_count, row):
+    blendweights = numpy.zeros((1, column_count), dtype=numpy.float32)
+    blendweights[0, :4] = row
+
+    result = FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights(blendweights)
+
+    expected = FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights_bk2(blendweights)
+    assert numpy.array_equal(result, expected)
+    assert result.sum(dtype=numpy.int64) == 255
+
+
+@pytest.mark.parametrize("column_count", [4, 8])
+def test_unorm_blendweights_zero_rows(column_count):
+    # 总和为0的行保持之前导出的结果，255全部分配给第一个权重
+    blendweights = make_blendweights(10, column_count, seed=1)
+    blendweights[[2, 7]] = 0
+
+    result = FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights(blendweights)
+
+    expected_zero_row = [255] + [0] * (column_count - 1)
+    assert result[2].tolist() == expected_zero_row
+    assert result[7].tolist() == expected_zero_row
+    assert (result.sum(axis=1, dtype=numpy.int64) == 255).all()
+
+    nonzero_rows = numpy.ones(len(blendweights), dtype=bool)
+    nonzero_rows[[2, 7]] = False
+    expected = FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights_bk2(blendweights[nonzero_rows])
+    assert numpy.array_equal(result[nonzero_rows], expected)
+
+
+@pytest.mark.parametrize("column_count", [4, 8])
+def test_unorm_blendweights_nan_rows(column_count):
+    # 含有NaN的行全部为0，其它行不受影响
+    blendweights = make_blendweights(10, column_count, seed=2)
+    blendweights[3, 1] = numpy.nan
+    blendweights[5, :] = numpy.nan
+
+    result = FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights(blendweights)
+
+    nan_rows = numpy.zeros(len(blendweights), dtype=bool)
+    nan_rows[[3, 5]] = True
+    assert (result[nan_rows] == 0).all()
+    assert (result[~nan_rows].sum(axis=1, dtype=numpy.int64) == 255).all()
+
+    expected = FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights_bk2(blendweights[~nan_rows])
+    assert numpy.array_equal(result[~nan_rows], expected)
+
+    if column_count == 4:
+        # _bk2中NaN行固定写入4个0，只能在4个权重时整体比较
+        assert numpy.array_equal(result, FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights_bk2(blendweights))
+
+
+def test_unorm_blendweights_empty():
+    result = FormatUtils.convert_4x_float32_to_r8g8b8a8_unorm_blendweights(numpy.zeros((0, 4), dtype=numpy.float32))
+
+    assert result.shape == (0, 4)
+    assert result.dtype == numpy.uint8
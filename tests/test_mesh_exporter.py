@@ -0,0 +1,294 @@
+import collections
+import types
+
+import numpy
+import pytest
+
+from TheHerta.common.mesh_exporter import BufferModel
+
+
+VERTEX_DTYPE = numpy.dtype([
+    ("POSITION", (numpy.float32, 3)),
+    ("NORMAL", (numpy.float32, 3)),
+    ("TANGENT", (numpy.float32, 4)),
+    ("TEXCOORD", (numpy.float16, 2)),
+])
+
+
+def make_buffer_model():
+    return BufferModel(d3d11GameType=None)
+
+
+def make_element_vertex_ndarray(vertex_count, seed):
+    '''
+    从少量基础顶点中重复抽取，保证有大量完全相同的行，
+    数值取0.5的整数倍，保证不同行之间也会出现相同的POSITION和NORMAL
+    '''
+    rng = numpy.random.default_rng(seed)
+    base_vertices = numpy.zeros(max(vertex_count // 4, 1), dtype=VERTEX_DTYPE)
+    for element_name in VERTEX_DTYPE.names:
+        base_vertices[element_name] = rng.integers(-2, 3, size=base_vertices[element_name].shape) * 0.5
+    element_vertex_ndarray = base_vertices[rng.integers(0, len(base_vertices), vertex_count)]
+    element_vertex_ndarray["TANGENT"] = rng.integers(0, 3, size=element_vertex_ndarray["TANGENT"].shape)
+    return element_vertex_ndarray
+
+
+def reference_unique_element_vertex_ndarray(element_vertex_ndarray):
+    '''
+    之前的实现：逐行tobytes()，用OrderedDict.setdefault按第一次出现的顺序编号
+    '''
+    indexed_vertices = collections.OrderedDict()
+    ib = [indexed_vertices.setdefault(vertex.tobytes(), len(indexed_vertices)) for vertex in element_vertex_ndarray]
+    return b"".join(indexed_vertices.keys()), ib
+
+
+def reference_first_occurrence_indices(row_keys):
+    '''
+    之前girlsfrontline2中共享TANGENT的实现：以每行数值的tuple为key，记录第一次出现的行
+    '''
+    first_occurrence_dict = {}
+    return [first_occurrence_dict.setdefault(tuple(row.tolist()), row_index) for row_index, row in enumerate(row_keys)]
+
+
+@pytest.mark.parametrize("vertex_count", [1, 3, 100, 5000])
+def test_unique_element_vertex_ndarray_matches_tobytes_dict(vertex_count):
+    element_vertex_ndarray = make_element_vertex_ndarray(vertex_count, seed=vertex_count)
+
+    unique_vertex_ndarray, ib = make_buffer_model().unique_element_vertex_ndarray(element_vertex_ndarray)
+
+    reference_vb_bytes, reference_ib = reference_unique_element_vertex_ndarray(element_vertex_ndarray)
+    assert unique_vertex_ndarray.tobytes() == reference_vb_bytes
+    assert ib.tolist() == reference_ib
+    assert numpy.array_equal(unique_vertex_ndarray[ib], element_vertex_ndarray)
+
+
+def test_unique_element_vertex_ndarray_keeps_first_occurrence_order():
+    element_vertex_ndarray = numpy.zeros(6, dtype=VERTEX_DTYPE)
+    element_vertex_ndarray["POSITION"][:, 0] = [3, 1, 3, 2, 1, 3]
+
+    unique_vertex_ndarray, ib = make_buffer_model().unique_element_vertex_ndarray(element_vertex_ndarray)
+
+    assert unique_vertex_ndarray["POSITION"][:, 0].tolist() == [3, 1, 2]
+    assert ib.tolist() == [0, 1, 0, 2, 1, 0]
+
+
+def test_unique_element_vertex_ndarray_distinguishes_signed_zero():
+    # 按字节去重，所以-0.0和0.0是不同的顶点，和之前tobytes()的结果一致
+    element_vertex_ndarray = numpy.zeros(4, dtype=VERTEX_DTYPE)
+    element_vertex_ndarray["POSITION"][:, 0] = [0.0, -0.0, 0.0, -0.0]
+
+    unique_vertex_ndarray, ib = make_buffer_model().unique_element_vertex_ndarray(element_vertex_ndarray)
+
+    reference_vb_bytes, reference_ib = reference_unique_element_vertex_ndarray(element_vertex_ndarray)
+    assert unique_vertex_ndarray.tobytes() == reference_vb_bytes
+    assert ib.tolist() == reference_ib == [0, 1, 0, 1]
+
+
+def test_unique_element_vertex_ndarray_odd_itemsize():
+    # 每行不是8字节的倍数时需要补齐后再比较
+    odd_dtype = numpy.dtype([("POSITION", (numpy.float32, 3)), ("BLENDINDICES", (numpy.uint8, 1))])
+    element_vertex_ndarray = numpy.zeros(5, dtype=odd_dtype)
+    element_vertex_ndarray["BLENDINDICES"][:, 0] = [1, 2, 1, 1, 2]
+    element_vertex_ndarray["POSITION"][3, 2] = 1
+
+    unique_vertex_ndarray, ib = make_buffer_model().unique_element_vertex_ndarray(element_vertex_ndarray)
+
+    reference_vb_bytes, reference_ib = reference_unique_element_vertex_ndarray(element_vertex_ndarray)
+    assert unique_vertex_ndarray.tobytes() == reference_vb_bytes
+    assert ib.tolist() == reference_ib
+
+
+def test_unique_element_vertex_ndarray_empty():
+    unique_vertex_ndarray, ib = make_buffer_model().unique_element_vertex_ndarray(numpy.zeros(0, dtype=VERTEX_DTYPE))
+
+    assert len(unique_vertex_ndarray) == 0
+    assert len(ib) == 0
+
+
+@pytest.mark.parametrize("vertex_count", [1, 3, 100, 5000])
+def test_get_first_occurrence_indices_matches_tuple_dict(vertex_count):
+    element_vertex_ndarray = make_element_vertex_ndarray(vertex_count, seed=vertex_count + 1)
+    row_keys = (element_vertex_ndarray["POSITION"] + element_vertex_ndarray["NORMAL"]).reshape(vertex_count, -1)
+
+    first_occurrence_indices = make_buffer_model().get_first_occurrence_indices(row_keys)
+
+    assert first_occurrence_indices.tolist() == reference_first_occurrence_indices(row_keys)
+
+
+def test_get_first_occurrence_indices_signed_zero_and_nan():
+    # 按数值比较，所以-0.0和0.0视为相等，而含有NaN的行只和自己相等，和之前tuple作为key时一致
+    row_keys = numpy.array([
+        [0.0, 1.0],
+        [-0.0, 1.0],
+        [numpy.nan, 1.0],
+        [numpy.nan, 1.0],
+        [0.0, 1.0],
+    ], dtype=numpy.float32)
+
+    first_occurrence_indices = make_buffer_model().get_first_occurrence_indices(row_keys)
+
+    assert first_occurrence_indices.tolist() == [0, 0, 2, 3, 0]
+
+
+@pytest.mark.parametrize("vertex_count", [1, 3, 100, 5000])
+def test_shared_tangent_dedup_matches_previous_loop(vertex_count):
+    '''
+    girlsfrontline2：POSITION+NORMAL相同的顶点共享第一次出现时的TANGENT，然后再按整行去重
+    '''
+    element_vertex_ndarray = make_element_vertex_ndarray(vertex_count, seed=vertex_count + 2)
+    if vertex_count > 50:
+        element_vertex_ndarray["POSITION"][5, 0] = -0.0
+
+    reference_vertices = collections.OrderedDict()
+    shared_tangent_dict = {}
+    reference_ib = []
+    for vertex in element_vertex_ndarray:
+        vertex = vertex.copy()
+        tangent_key = tuple((vertex["POSITION"] + vertex["NORMAL"]).tolist())
+        if tangent_key in shared_tangent_dict:
+            vertex["TANGENT"] = shared_tangent_dict[tangent_key]
+        else:
+            shared_tangent_dict[tangent_key] = vertex["TANGENT"]
+        reference_ib.append(reference_vertices.setdefault(vertex.tobytes(), len(reference_vertices)))
+
+    buffer_model = make_buffer_model()
+    shared_element_vertex_ndarray = element_vertex_ndarray.copy()
+    row_keys = (shared_element_vertex_ndarray["POSITION"] + shared_element_vertex_ndarray["NORMAL"]).reshape(vertex_count, -1)
+    shared_element_vertex_ndarray["TANGENT"] = shared_element_vertex_ndarray["TANGENT"][buffer_model.get_first_occurrence_indices(row_keys)]
+    unique_vertex_ndarray, ib = buffer_model.unique_element_vertex_ndarray(shared_element_vertex_ndarray)
+
+    assert unique_vertex_ndarray.tobytes() == b"".join(reference_vertices.keys())
+    assert ib.tolist() == reference_ib
+
+
+def reference_average_normal_color(indexed_vertices, dtype):
+    '''
+    之前逐个顶点累加法线的实现
+    '''
+    vb = numpy.array(indexed_vertices, dtype=dtype)
+
+    unique_positions, position_indices = numpy.unique([tuple(val['POSITION']) for val in vb], return_inverse=True, axis=0)
+    position_indices = position_indices.reshape(-1)
+
+    accumulated_normals = numpy.zeros((len(unique_positions), 3), dtype=float)
+    counts = numpy.zeros(len(unique_positions), dtype=int)
+    for i, val in enumerate(vb):
+        accumulated_normals[position_indices[i]] += numpy.array(val['NORMAL'], dtype=float)
+        counts[position_indices[i]] += 1
+
+    mask = counts > 0
+    average_normals = numpy.zeros_like(accumulated_normals)
+    average_normals[mask] = (accumulated_normals[mask] / counts[mask][:, None])
+    normalized_normals = ((average_normals + 1) / 2 * 255).astype(numpy.uint8)
+
+    new_color = []
+    for i, val in enumerate(vb):
+        color = [0, 0, 0, val['COLOR'][3]]
+        if mask[position_indices[i]]:
+            color[:3] = normalized_normals[position_indices[i]]
+        new_color.append(color)
+    new_color_array = numpy.array(new_color, dtype=numpy.uint8)
+    for i, val in enumerate(vb):
+        val['COLOR'] = new_color_array[i]
+    return vb
+
+
+def reference_average_normal_tangent(indexed_vertices, dtype):
+    '''
+    之前通过位置tuple查字典，把每组的归一化法线放回每个顶点的实现
+    '''
+    vb = numpy.array(indexed_vertices, dtype=dtype)
+
+    positions = numpy.array([val['POSITION'] for val in vb])
+    normals = numpy.array([val['NORMAL'] for val in vb], dtype=float)
+
+    sort_indices = numpy.lexsort(positions.T)
+    sorted_positions = positions[sort_indices]
+    sorted_normals = normals[sort_indices]
+
+    group_indices = numpy.flatnonzero(numpy.any(sorted_positions[:-1] != sorted_positions[1:], axis=1))
+    group_indices = numpy.r_[0, group_indices + 1, len(sorted_positions)]
+
+    unique_positions = sorted_positions[group_indices[:-1]]
+    accumulated_normals = numpy.add.reduceat(sorted_normals, group_indices[:-1], axis=0)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        normalized_normals = accumulated_normals / numpy.linalg.norm(accumulated_normals, axis=1)[:, numpy.newaxis]
+    normalized_normals[numpy.isnan(normalized_normals)] = 0
+
+    position_normal_dict = dict(zip(map(tuple, unique_positions), normalized_normals))
+    normalized_normals = numpy.array([position_normal_dict[tuple(pos)] for pos in vb['POSITION']])
+
+    w = numpy.where(vb['TANGENT'][:, 3] >= 0, -1.0, 1.0)
+    vb['TANGENT'][:, :3] = normalized_normals
+    vb['TANGENT'][:, 3] = w
+    return vb
+
+
+def make_shared_position_vertices(dtype, vertex_count, seed):
+    '''
+    POSITION从少量取值中抽取，保证大量顶点共享同一个位置，同时混入-0.0和法线相互抵消的位置
+    '''
+    rng = numpy.random.default_rng(seed)
+    indexed_vertices = numpy.zeros(vertex_count, dtype=dtype)
+    indexed_vertices['POSITION'] = rng.integers(0, max(vertex_count // 5, 1), (vertex_count, 3)) * 0.5
+    indexed_vertices['POSITION'][rng.random(vertex_count) < 0.05] = -0.0
+    indexed_vertices['NORMAL'] = rng.uniform(-1, 1, (vertex_count, 3))
+    if "COLOR" in dtype.names:
+        if dtype['COLOR'].base == numpy.uint8:
+            indexed_vertices['COLOR'] = rng.integers(0, 200, (vertex_count, 4))
+        else:
+            indexed_vertices['COLOR'] = rng.uniform(0, 3, (vertex_count, 4))
+    if "TANGENT" in dtype.names:
+        indexed_vertices['TANGENT'] = rng.uniform(-1, 1, (vertex_count, 4))
+    if vertex_count >= 2:
+        # 两个顶点共享一个单独的位置，法线完全抵消，累加结果为零向量
+        indexed_vertices['POSITION'][-2:] = 1000
+        indexed_vertices['NORMAL'][-1] = -indexed_vertices['NORMAL'][-2]
+    return indexed_vertices
+
+
+@pytest.mark.parametrize("position_type,normal_type,color_type", [
+    (numpy.float32, numpy.float32, numpy.uint8),
+    (numpy.float32, numpy.float16, numpy.float16),
+    (numpy.float16, numpy.float32, numpy.float32),
+])
+@pytest.mark.parametrize("vertex_count", [1, 7, 1000])
+def test_average_normal_color_matches_previous_loop(position_type, normal_type, color_type, vertex_count):
+    dtype = numpy.dtype([('POSITION', (position_type, 3)), ('NORMAL', (normal_type, 3)), ('COLOR', (color_type, 4))])
+    d3d11_game_type = types.SimpleNamespace(OrderedFullElementList=['POSITION', 'NORMAL', 'COLOR'])
+    indexed_vertices = make_shared_position_vertices(dtype, vertex_count, seed=vertex_count)
+    original_vertices = indexed_vertices.copy()
+
+    buffer_model = BufferModel(d3d11GameType=d3d11_game_type)
+    buffer_model.recalculate_color = True
+    result = buffer_model.average_normal_color(indexed_vertices, d3d11_game_type, dtype)
+
+    assert result.tobytes() == reference_average_normal_color(original_vertices, dtype).tobytes()
+    assert indexed_vertices.tobytes() == original_vertices.tobytes()
+
+
+@pytest.mark.parametrize("vertex_count", [1, 7, 1000])
+def test_average_normal_tangent_matches_previous_loop(vertex_count):
+    dtype = numpy.dtype([('POSITION', (numpy.float32, 3)), ('NORMAL', (numpy.float32, 3)), ('TANGENT', (numpy.float32, 4))])
+    d3d11_game_type = types.SimpleNamespace(OrderedFullElementList=['POSITION', 'NORMAL', 'TANGENT'])
+    indexed_vertices = make_shared_position_vertices(dtype, vertex_count, seed=vertex_count + 1)
+    original_vertices = indexed_vertices.copy()
+
+    buffer_model = BufferModel(d3d11GameType=d3d11_game_type)
+    buffer_model.recalculate_tangent = True
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        result = buffer_model.average_normal_tangent(indexed_vertices, d3d11_game_type, dtype)
+
+    assert result.tobytes() == reference_average_normal_tangent(original_vertices, dtype).tobytes()
+    assert indexed_vertices.tobytes() == original_vertices.tobytes()
+
+
+def test_average_normal_skipped_when_disabled():
+    dtype = numpy.dtype([('POSITION', (numpy.float32, 3)), ('NORMAL', (numpy.float32, 3)), ('COLOR', (numpy.uint8, 4))])
+    d3d11_game_type = types.SimpleNamespace(OrderedFullElementList=['POSITION', 'NORMAL', 'COLOR'])
+    indexed_vertices = make_shared_position_vertices(dtype, 10, seed=0)
+
+    buffer_model = BufferModel(d3d11GameType=d3d11_game_type)
+    assert buffer_model.average_normal_color(indexed_vertices, d3d11_game_type, dtype) is indexed_vertices
+    assert buffer_model.average_normal_tangent(indexed_vertices, d3d11_game_type, dtype) is indexed_vertices
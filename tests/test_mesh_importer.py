@@ -0,0 +1,76 @@
+import numpy
+
+from TheHerta.common.mesh_importer import MeshImporter
+
+
+FMT_CONTENT = '''stride: 28
+topology: trianglelist
+format: DXGI_FORMAT_R16_UINT
+gametypename: Test
+element[0]:
+  SemanticName: POSITION
+  SemanticIndex: 0
+  Format: R32G32B32_FLOAT
+  InputSlot: 0
+  AlignedByteOffset: 0
+  InputSlotClass: per-vertex
+  InstanceDataStepRate: 0
+element[1]:
+  SemanticName: COLOR
+  SemanticIndex: 0
+  Format: R8G8B8A8_UNORM
+  InputSlot: 0
+  AlignedByteOffset: 12
+  InputSlotClass: per-vertex
+  InstanceDataStepRate: 0
+element[2]:
+  SemanticName: TEXCOORD
+  SemanticIndex: 0
+  Format: R32G32_FLOAT
+  InputSlot: 0
+  AlignedByteOffset: 16
+  InputSlotClass: per-vertex
+  InstanceDataStepRate: 0
+element[3]:
+  SemanticName: BLENDINDICES
+  SemanticIndex: 0
+  Format: R8G8B8A8_UINT
+  InputSlot: 0
+  AlignedByteOffset: 24
+  InputSlotClass: per-vertex
+  InstanceDataStepRate: 0
+'''
+
+
+def write_mesh_files(folder, vertex_count=4):
+    vb_dtype = numpy.dtype([
+        ("POSITION", numpy.float32, 3),
+        ("COLOR", numpy.uint8, 4),
+        ("TEXCOORD", numpy.float32, 2),
+        ("BLENDINDICES", numpy.uint8, 4),
+    ])
+    rng = numpy.random.default_rng(0)
+    vb = numpy.zeros(vertex_count, dtype=vb_dtype)
+    vb["POSITION"] = rng.random((vertex_count, 3))
+    vb["COLOR"] = rng.integers(0, 256, (vertex_count, 4))
+    vb["TEXCOORD"] = rng.random((vertex_count, 2))
+    vb["BLENDINDICES"] = rng.integers(0, 4, (vertex_count, 4))
+
+    (folder / "Body.fmt").write_text(FMT_CONTENT)
+    (folder / "Body.vb").write_bytes(vb.tobytes())
+    (folder / "Body.ib").write_bytes(numpy.array([0, 1, 2, 0, 2, 3], dtype=numpy.uint16).tobytes())
+    return str(folder / "Body.fmt")
+
+
+def test_prepare_import_does_not_print(tmp_path, capsys):
+    # prepare_import在一键导入的工作线程中执行，不能直接输出，日志都要留给主线程输出
+    fmt_path = write_mesh_files(tmp_path)
+
+    mbf, import_data = MeshImporter.prepare_import(fmt_path, "Body", use_mirror_workflow=False, import_merged_vgmap=False)
+
+    assert capsys.readouterr().out == ""
+    assert "prefix: Body" in mbf.log_message_list
+    assert "当前Element: POSITION" in import_data.log_message_list
+    assert "检测到BLENDWEIGHTS为空，但是含有BLENDINDICES数据，特殊情况，默认补充1,0,0,0的BLENDWEIGHTS" in import_data.log_message_list
+    assert import_data.positions.shape == (4, 3)
+    assert mbf.vb_data is None
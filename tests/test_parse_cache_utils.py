@@ -0,0 +1,50 @@
+import json
+
+from TheHerta.common.migoto_format import D3D11GameType
+from TheHerta.utils.parse_cache_utils import ParseCacheUtils
+
+
+def write_tmp_json(folder, category_hash, element_format="R32G32B32_FLOAT"):
+    '''
+    每个DrawIB的tmp.json中CategoryHash等字段不同，数据类型相关字段相同
+    '''
+    folder.mkdir(parents=True)
+    tmp_json_path = folder / "tmp.json"
+    tmp_json_path.write_text(json.dumps({
+        "WorkGameType": "GIMI_Test",
+        "CategoryHash": {"Position": category_hash},
+        "CategoryDrawCategoryMap": {"Position": "Position"},
+        "D3D11ElementList": [
+            {"SemanticName": "POSITION", "SemanticIndex": "0", "Format": element_format, "ByteWidth": 12, "ExtractSlot": "vb0", "ExtractTechnique": "", "Category": "Position"},
+        ],
+    }), encoding="utf-8")
+    return str(tmp_json_path)
+
+
+def get_shared_d3d11_game_type(tmp_json_path):
+    with open(tmp_json_path, "r", encoding="utf-8") as f:
+        game_type_json = json.load(f)
+    return ParseCacheUtils.get_or_create_shared("D3D11GameType", D3D11GameType.get_shared_key(game_type_json), lambda: D3D11GameType(tmp_json_path))
+
+
+def test_draw_ibs_with_same_game_type_share_one_instance(tmp_path):
+    first_tmp_json_path = write_tmp_json(tmp_path / "aaaa1111" / "TYPE_GIMI_Test", "11111111")
+    second_tmp_json_path = write_tmp_json(tmp_path / "bbbb2222" / "TYPE_GIMI_Test", "22222222")
+
+    first_game_type = get_shared_d3d11_game_type(first_tmp_json_path)
+    second_game_type = get_shared_d3d11_game_type(second_tmp_json_path)
+
+    assert first_game_type is second_game_type
+    assert first_game_type.GameTypeName == "GIMI_Test"
+
+
+def test_different_game_type_content_gets_its_own_instance(tmp_path):
+    first_tmp_json_path = write_tmp_json(tmp_path / "aaaa1111" / "TYPE_GIMI_Test", "11111111")
+    second_tmp_json_path = write_tmp_json(tmp_path / "bbbb2222" / "TYPE_GIMI_Test", "22222222", element_format="R16G16B16A16_FLOAT")
+
+    first_game_type = get_shared_d3d11_game_type(first_tmp_json_path)
+    second_game_type = get_shared_d3d11_game_type(second_tmp_json_path)
+
+    assert first_game_type is not second_game_type
+    assert first_game_type.SharedKey != second_game_type.SharedKey
+    assert second_game_type.ElementNameD3D11ElementDict["POSITION"].Format == "R16G16B16A16_FLOAT"
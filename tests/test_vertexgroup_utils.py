@@ -0,0 +1,167 @@
+import types
+
+import numpy
+import pytest
+
+from TheHerta.utils import vertexgroup_utils
+from TheHerta.utils.vertexgroup_utils import VertexGroupUtils
+
+
+def reference_normalize_lock_map(vertex_groups, lock_flags):
+    '''
+    逐个顶点照搬Blender中BKE_defvert_normalize_lock_map的计算，vgroup_subset为所有已有的顶点组
+    vertex_groups为每个顶点的[(顶点组索引, 权重)]列表
+    '''
+    group_total = len(lock_flags)
+    normalized_vertex_groups = []
+    for groups in vertex_groups:
+        groups = [(group_id, numpy.float32(weight)) for group_id, weight in groups]
+        if len(groups) == 1:
+            group_id, weight = groups[0]
+            if group_id < group_total and not lock_flags[group_id]:
+                groups = [(group_id, numpy.float32(1.0))]
+        elif len(groups) > 1:
+            total_weight = numpy.float32(0.0)
+            locked_weight = numpy.float32(0.0)
+            for group_id, weight in groups:
+                if group_id < group_total:
+                    if lock_flags[group_id]:
+                        locked_weight = numpy.float32(locked_weight + weight)
+                    else:
+                        total_weight = numpy.float32(total_weight + weight)
+            if total_weight > 0:
+                scalar = numpy.float32(numpy.float32(1.0) / total_weight) * max(numpy.float32(0.0), numpy.float32(numpy.float32(1.0) - locked_weight))
+                scalar = numpy.float32(scalar)
+                groups = [
+                    (group_id, numpy.float32(min(max(numpy.float32(weight * scalar), 0.0), 1.0)))
+                    if group_id < group_total and not lock_flags[group_id] else (group_id, weight)
+                    for group_id, weight in groups
+                ]
+        normalized_vertex_groups.append(groups)
+    return normalized_vertex_groups
+
+
+def to_csr(vertex_groups):
+    offsets = numpy.zeros(len(vertex_groups) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum([len(groups) for groups in vertex_groups])
+    group_ids = numpy.array([group_id for groups in vertex_groups for group_id, weight in groups], dtype=numpy.int32)
+    weights = numpy.array([weight for groups in vertex_groups for group_id, weight in groups], dtype=numpy.float32)
+    return offsets, group_ids, weights
+
+
+def make_vertex_groups(vertex_count, group_total, seed):
+    rng = numpy.random.default_rng(seed)
+    vertex_groups = []
+    for vertex_index in range(vertex_count):
+        group_count = int(rng.integers(0, 6))
+        group_ids = rng.choice(group_total, size=group_count, replace=False)
+        vertex_groups.append([(int(group_id), float(rng.random())) for group_id in group_ids])
+    return vertex_groups
+
+
+@pytest.mark.parametrize("locked_groups", [[], [1], [0, 3, 5]])
+def test_normalize_all_matches_blender(locked_groups):
+    group_total = 8
+    vertex_groups = make_vertex_groups(500, group_total, seed=len(locked_groups))
+    lock_flags = numpy.zeros(group_total, dtype=bool)
+    lock_flags[locked_groups] = True
+
+    offsets, group_ids, weights = to_csr(vertex_groups)
+    result = VertexGroupUtils.normalize_all_vertex_group_weights(offsets, group_ids, weights, lock_flags)
+
+    expected = to_csr(reference_normalize_lock_map(vertex_groups, lock_flags))[2]
+    assert result.dtype == numpy.float32
+    assert result.tobytes() == expected.tobytes()
+    assert weights.tobytes() == to_csr(vertex_groups)[2].tobytes()
+
+
+def test_normalize_all_ignores_groups_outside_obj_vertex_groups():
+    # obj只有3个顶点组时，索引为3和4的权重既不参与求和也不会被缩放
+    lock_flags = numpy.array([False, True, False])
+    vertex_groups = [
+        [(0, 0.2), (3, 0.6)],
+        [(0, 0.2), (2, 0.2), (4, 0.9)],
+        [(1, 0.5), (0, 0.25), (3, 0.5)],
+        [(4, 0.3)],
+        [(3, 0.3), (4, 0.3)],
+    ]
+
+    offsets, group_ids, weights = to_csr(vertex_groups)
+    result = VertexGroupUtils.normalize_all_vertex_group_weights(offsets, group_ids, weights, lock_flags)
+
+    expected = to_csr(reference_normalize_lock_map(vertex_groups, lock_flags))[2]
+    assert result.tobytes() == expected.tobytes()
+    assert result.tolist() == pytest.approx([1.0, 0.6, 0.5, 0.5, 0.9, 0.5, 0.5, 0.5, 0.3, 0.3, 0.3])
+
+
+class FakeVertexGroup:
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+        self.vertex_weight_dict = {}
+
+    def add(self, vertex_indices, weight, add_type):
+        for vertex_index in vertex_indices:
+            self.vertex_weight_dict[vertex_index] = weight
+
+    def remove(self, vertex_indices):
+        for vertex_index in vertex_indices:
+            self.vertex_weight_dict.pop(vertex_index, None)
+
+
+def make_fake_obj(vertex_group_names, vertex_groups):
+    '''
+    vertex_groups为每个顶点的[(顶点组索引, 权重)]列表，索引可以超出vertex_group_names的范围，模拟残留的顶点组索引
+    '''
+    fake_vertex_groups = [FakeVertexGroup(name, index) for index, name in enumerate(vertex_group_names)]
+    for vertex_index, groups in enumerate(vertex_groups):
+        for group_id, weight in groups:
+            if group_id < len(fake_vertex_groups):
+                fake_vertex_groups[group_id].vertex_weight_dict[vertex_index] = numpy.float32(weight)
+
+    vertices = [
+        types.SimpleNamespace(groups=[types.SimpleNamespace(group=group_id, weight=weight) for group_id, weight in groups])
+        for groups in vertex_groups
+    ]
+    return types.SimpleNamespace(vertex_groups=fake_vertex_groups, data=types.SimpleNamespace(vertices=vertices))
+
+
+def reference_merge_vertex_groups(vertex_group_names, vertex_groups):
+    '''
+    之前逐个顶点的实现：累加每个顶点上同一前缀的所有顶点组的权重，大于0时写入合并后的顶点组，超出范围的索引被忽略
+    '''
+    merged_dict = {}
+    for prefix in dict.fromkeys(name.split(".")[0] for name in vertex_group_names):
+        relevant_group_ids = [group_id for group_id, name in enumerate(vertex_group_names) if name.split(".")[0] == prefix]
+        vertex_weight_dict = {}
+        for vertex_index, groups in enumerate(vertex_groups):
+            combined = sum(float(numpy.float32(weight)) for group_id, weight in groups if group_id in relevant_group_ids)
+            if combined > 0:
+                vertex_weight_dict[vertex_index] = combined
+        merged_dict[prefix] = vertex_weight_dict
+    return merged_dict
+
+
+def test_merge_vertex_groups_with_same_number_ignores_out_of_range_groups(monkeypatch):
+    vertex_group_names = ["0", "1", "0.001", "2", "1.001"]
+    vertex_groups = [
+        [(0, 0.5), (2, 0.25)],
+        [(1, 0.5), (4, 0.5), (7, 0.9)],
+        [(5, 1.0)],
+        [(3, 0.0), (0, 0.125), (6, 0.2)],
+        [(2, 0.75), (3, 0.25)],
+    ]
+    fake_obj = make_fake_obj(vertex_group_names, vertex_groups)
+    fake_bpy = types.SimpleNamespace(
+        context=types.SimpleNamespace(selected_objects=[fake_obj], view_layer=types.SimpleNamespace(objects=types.SimpleNamespace(active=None))),
+        ops=types.SimpleNamespace(object=types.SimpleNamespace(vertex_group_sort=lambda: None)),
+    )
+    monkeypatch.setattr(vertexgroup_utils, "bpy", fake_bpy)
+
+    VertexGroupUtils.merge_vertex_groups_with_same_number()
+
+    result = {vg.name: {vertex_index: float(weight) for vertex_index, weight in vg.vertex_weight_dict.items()} for vg in fake_obj.vertex_groups}
+    expected = reference_merge_vertex_groups(vertex_group_names, vertex_groups)
+    assert result.keys() == expected.keys()
+    for prefix, vertex_weight_dict in expected.items():
+        assert result[prefix] == pytest.approx(vertex_weight_dict)
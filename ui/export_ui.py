@@ -43,6 +43,10 @@ class PanelGenerateModConfig(bpy.types.Panel):
         if GlobalConfig.logic_name == LogicName.HonkaiImpact3:
             layout.prop(context.scene.properties_generate_mod, "recalculate_color",text="算术平均归一化法线存入COLOR(全局)")
 
+        # WWMI的IndexBuffer由WWMI自己的Shader按固定的R32_UINT读取，所以不支持R16_UINT
+        if GlobalConfig.logic_name != LogicName.WutheringWaves:
+            layout.prop(context.scene.properties_generate_mod, "use_r16_uint_index_buffer",text="IB在顶点数允许时使用R16_UINT格式")
+
         layout.prop(context.scene.properties_generate_mod, "position_override_filter_draw_type",text="Position替换添加DRAW_TYPE=1判断")
         layout.prop(context.scene.properties_generate_mod, "vertex_limit_raise_add_filter_index",text="VertexLimitRaise添加filter_index过滤器")
         layout.prop(context.scene.properties_generate_mod, "slot_style_texture_add_filter_index",text="槽位风格贴图添加filter_index过滤器")
@@ -51,6 +55,9 @@ class PanelGenerateModConfig(bpy.types.Panel):
         if GlobalConfig.logic_name == LogicName.ZenlessZoneZero:
             layout.prop(context.scene.properties_generate_mod, "zzz_use_slot_fix")
         
+        layout.prop(context.scene.properties_generate_mod, "use_export_cache",text="使用导出缓存")
+        layout.prop(context.scene.properties_generate_mod, "use_parallel_export",text="多线程计算模型Buffer")
+
         # 所有的游戏都要能支持生成分支架构面板Mod
         layout.prop(context.scene.properties_generate_mod, "generate_branch_mod_gui",text="生成分支架构Mod面板(测试中)")
 
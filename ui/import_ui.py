@@ -2,13 +2,18 @@
 import bpy
 import os
 
+from concurrent.futures import ThreadPoolExecutor, Future
+
 from ..utils.json_utils import JsonUtils
 from ..utils.config_utils import ConfigUtils
 from ..utils.collection_utils import CollectionColor, CollectionUtils
 from ..utils.timer_utils import TimerUtils
 from ..utils.translate_utils import TR
+from ..utils.texture_utils import TextureUtils
 
 from ..config.main_config import GlobalConfig, LogicName
+from ..config.properties_import_model import Properties_ImportModel
+from ..config.properties_wwmi import Properties_WWMI
 
 from ..common.mesh_importer import MeshImporter,MigotoBinaryFile
 
@@ -27,6 +32,7 @@ class PanelModelImportConfig(bpy.types.Panel):
     def draw(self, context):
         layout = self.layout
         layout.prop(context.scene.properties_import_model,"model_scale",text="模型导入大小比例")
+        layout.prop(context.scene.properties_import_model,"skip_empty_shapekeys",text="跳过空形状键")
         
         if GlobalConfig.logic_name == LogicName.WutheringWaves:
             layout.prop(context.scene.properties_wwmi,"import_merged_vgmap",text="使用融合统一顶点组")
@@ -74,11 +80,18 @@ class Import3DMigotoRaw(bpy.types.Operator, ImportHelper):
             for fmt_file in self.files:
                 import_filename_list.append(fmt_file.name)
 
+        # 贴图索引只在本次导入中复用
+        TextureUtils.clear_texture_index()
+
         # 逐个fmt文件导入
         for fmt_file_name in import_filename_list:
             fmt_file_path = os.path.join(dirname, fmt_file_name)
             mbf = MigotoBinaryFile(fmt_path=fmt_file_path)
-            obj_result = MeshImporter.create_mesh_obj_from_mbf(mbf=mbf)
+            # 导入出错时也要关闭vb和ib的内存映射，否则Windows上文件会一直被占用
+            try:
+                obj_result = MeshImporter.create_mesh_obj_from_mbf(mbf=mbf)
+            finally:
+                mbf.close()
             collection.objects.link(obj_result)
         
         # Select all objects under collection (因为用户习惯了导入后就是全部选中的状态). 
@@ -114,6 +127,8 @@ def ImprotFromWorkSpaceSSMTV3(self, context):
     default_show_collection = CollectionUtils.create_new_collection(collection_name="DefaultShow",color_tag=CollectionColor.White,link_to_parent_collection_name=workspace_collection.name)
 
     # 开始读取模型数据
+    # 先在主线程中确定所有要导入的模型，按导入顺序排列
+    import_task_list:list[tuple[str,str]] = [] # (fmt文件路径, 导入后的模型名称)
     for draw_ib_aliasname,import_folder_path in import_drawib_aliasname_folder_path_dict.items():
         print("Importing DrawIB:", draw_ib_aliasname)
 
@@ -131,11 +146,35 @@ def ImprotFromWorkSpaceSSMTV3(self, context):
         part_count = 1
         for prefix in import_prefix_list:
             fmt_file_path = os.path.join(import_folder_path, prefix + ".fmt")
-            mbf = MigotoBinaryFile(fmt_path=fmt_file_path,mesh_name=draw_ib + "-" + str(part_count) + "-" + alias_name)
-            obj_result = MeshImporter.create_mesh_obj_from_mbf(mbf=mbf)
+            import_task_list.append((fmt_file_path, draw_ib + "-" + str(part_count) + "-" + alias_name))
+            part_count = part_count + 1
+
+    # 贴图索引只在本次导入中复用
+    TextureUtils.clear_texture_index()
+
+    # bpy中的选项只能在主线程中读取
+    use_mirror_workflow = Properties_ImportModel.use_mirror_workflow()
+    import_merged_vgmap = Properties_WWMI.import_merged_vgmap()
+
+    # 工作线程负责读取文件、解码和计算numpy数据，主线程只负责按顺序创建mesh，
+    # 这样读取后面模型的时间就和创建前面模型的时间重叠了。
+    # 同时最多只提前准备prefetch_count个模型，避免所有模型的数据同时堆在内存里
+    worker_count = min(4, os.cpu_count() or 1)
+    prefetch_count = worker_count * 2
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        future_list:list[Future] = [None] * len(import_task_list)
+        for task_index in range(len(import_task_list)):
+            for prefetch_index in range(task_index, min(task_index + prefetch_count, len(import_task_list))):
+                if future_list[prefetch_index] is None:
+                    fmt_file_path, mesh_name = import_task_list[prefetch_index]
+                    future_list[prefetch_index] = executor.submit(MeshImporter.prepare_import, fmt_file_path, mesh_name, use_mirror_workflow, import_merged_vgmap)
+
+            mbf, import_data = future_list[task_index].result()
+            future_list[task_index] = None
+
+            obj_result = MeshImporter.create_mesh_obj_from_mbf(mbf=mbf, import_data=import_data)
 
             default_show_collection.objects.link(obj_result)
-            part_count = part_count + 1
 
     # 这里先链接SourceCollection，确保它在上面
     bpy.context.scene.collection.children.link(workspace_collection)
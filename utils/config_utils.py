@@ -5,6 +5,7 @@ import subprocess
 from ..config.main_config import *
 from .json_utils import *
 from .format_utils import Fatal
+from .parse_cache_utils import ParseCacheUtils
 
 
 class DrawIBPair:
@@ -53,7 +54,7 @@ class ConfigUtils:
         workspace_path = GlobalConfig.path_workspace_folder()
 
         game_config_path = os.path.join(workspace_path,"Config.json")
-        game_config_json = JsonUtils.LoadFromFile(game_config_path)
+        game_config_json = JsonUtils.LoadFromFileCached(game_config_path)
  
         draw_ib_list = []
         for item in game_config_json:
@@ -128,9 +129,7 @@ class ConfigUtils:
         drawib = os.path.basename(import_folder_path)
 
         if os.path.exists(tmp_json_path):
-            tmp_json_file = open(tmp_json_path)
-            tmp_json = json.load(tmp_json_file)
-            tmp_json_file.close()
+            tmp_json = cls.load_tmp_json_cached(tmp_json_path)
             import_prefix_list = tmp_json["ImportModelList"]
             if len(import_prefix_list) == 0:
                 import_partname_prefix_list = []
@@ -140,19 +139,27 @@ class ConfigUtils:
                 return import_partname_prefix_list
             else:
                 # import_prefix_list.sort() it's naturally sorted in DBMT so we don't need sort here.
-                return import_prefix_list
+                return list(import_prefix_list)
         else:
             return []
     
 
+    @classmethod
+    def load_tmp_json_cached(cls,tmp_json_path:str) -> dict:
+        '''
+        tmp.json在一次导入中会被读取多次，这里缓存解析结果，文件修改过时会重新读取
+        返回的字典是共享的，只能读取不能修改
+        '''
+        def load_tmp_json(file_path:str) -> dict:
+            with open(file_path) as tmp_json_file:
+                return json.load(tmp_json_file)
+        return ParseCacheUtils.get_or_parse("tmp.json", tmp_json_path, load_tmp_json)
+
     @classmethod
     def read_tmp_json(cls,import_folder_path:str) ->dict:
         tmp_json_path = os.path.join(import_folder_path, "tmp.json")
         if os.path.exists(tmp_json_path):
-            tmp_json_file = open(tmp_json_path)
-            tmp_json = json.load(tmp_json_file)
-            tmp_json_file.close()
-            return tmp_json
+            return cls.load_tmp_json_cached(tmp_json_path)
         else:
             raise Fatal("Target tmp.json didn't exists: " + tmp_json_path)
 
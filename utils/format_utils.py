@@ -225,92 +225,59 @@ class FormatUtils:
     
     @classmethod
     def convert_4x_float32_to_r8g8b8a8_unorm_blendweights(cls, input_array):
-        # 确保输入数组是浮点类型
-        # input_array_float = input_array.astype(numpy.float32)
-    
-        # 创建结果数组
-        result = numpy.zeros_like(input_array, dtype=numpy.uint8)
-        
-        # 处理NaN值
-        nan_mask = numpy.isnan(input_array).any(axis=1)
-        valid_mask = ~nan_mask
-        
-        # 只处理非NaN行
+        '''
+        把每行的权重量化为总和为255的UNORM整数，总和不为0的行和_bk2逐行计算的结果完全一致：
+        每个权重先归一化到255并取整数部分，剩余的精度误差按ticket从大到小每个权重分配1，
+        ticket用完后剩余的误差全部分配给当前最大的权重。
+        总和为0的行和之前的实现保持一致，255全部分配给第一个权重，含有NaN的行全部为0。
+        这里每行只做一次排序就能确定哪些权重分到误差，不再按误差逐个循环分配。
+        支持任意宽度的权重，比如WWMI的8个R8_UNORM权重。
+        '''
+        row_count, column_count = input_array.shape
+        result = numpy.zeros((row_count, column_count), dtype=numpy.uint8)
+        if row_count == 0 or column_count == 0:
+            return result
+
+        # 和_bk2中的sum()一样按列顺序累加，保证浮点误差一致
+        row_sums = input_array[:, 0].copy()
+        for column_index in range(1, column_count):
+            row_sums += input_array[:, column_index]
+
+        # 含有NaN的行全部为0
+        valid_mask = ~numpy.isnan(input_array).any(axis=1)
         valid_input = input_array[valid_mask]
         if valid_input.size == 0:
             return result
-        
-        # 计算每行总和
-        row_sums = valid_input.sum(axis=1, keepdims=True)
-        
-        # 处理零和行
-        zero_sum_mask = (row_sums[:, 0] == 0)
-        non_zero_mask = ~zero_sum_mask
-        
-        # 归一化权重
-        normalized = numpy.zeros_like(valid_input)
-        normalized[non_zero_mask] = valid_input[non_zero_mask] / row_sums[non_zero_mask] * 255.0
-        
-        # 计算整数部分和小数部分
-        int_part = numpy.floor(normalized).astype(numpy.int32)
-        fractional = normalized - int_part
-        
-        # 设置小于1的权重为0
-        small_weight_mask = (normalized < 1) & non_zero_mask[:, numpy.newaxis]
-        int_part[small_weight_mask] = 0
-        fractional[small_weight_mask] = 0
-        
-        # 计算精度误差
-        precision_error = 255 - int_part.sum(axis=1)
-        
-        # 计算tickets
-        tickets = numpy.zeros_like(normalized)
+
         with numpy.errstate(divide='ignore', invalid='ignore'):
-            tickets[non_zero_mask] = numpy.where(
-                (normalized[non_zero_mask] >= 1) & (fractional[non_zero_mask] > 0),
-                255 * fractional[non_zero_mask] / normalized[non_zero_mask],
-                0
-            )
-        
-        # 分配精度误差
-        output = int_part.copy()
-        for i in range(precision_error.max()):
-            # 找出需要分配的行
-            need_allocation = (precision_error > 0)
-            if not numpy.any(need_allocation):
-                break
-            
-            # 找出当前行中ticket最大的位置
-            max_ticket_mask = numpy.zeros_like(tickets, dtype=bool)
-            rows = numpy.where(need_allocation)[0]
-            
-            # 对于有ticket的行
-            has_ticket = (tickets[rows] > 0).any(axis=1)
-            if numpy.any(has_ticket):
-                ticket_rows = rows[has_ticket]
-                row_indices = ticket_rows[:, numpy.newaxis]
-                col_indices = tickets[ticket_rows].argmax(axis=1)
-                max_ticket_mask[ticket_rows, col_indices] = True
-                tickets[ticket_rows, col_indices] = 0
-            
-            # 对于没有ticket的行
-            no_ticket = ~has_ticket & need_allocation[rows]
-            if numpy.any(no_ticket):
-                no_ticket_rows = rows[no_ticket]
-                # 找出当前权重最大的位置
-                max_weight_mask = numpy.zeros_like(tickets, dtype=bool)
-                row_indices = no_ticket_rows[:, numpy.newaxis]
-                col_indices = output[no_ticket_rows].argmax(axis=1)
-                max_weight_mask[no_ticket_rows, col_indices] = True
-                max_ticket_mask |= max_weight_mask
-            
-            # 应用分配
-            output[max_ticket_mask] += 1
-            precision_error[need_allocation] -= 1
-        
-        # 将结果存回
+            valid_row_sums = row_sums[valid_mask]
+            normalized = valid_input / valid_row_sums[:, numpy.newaxis] * 255
+            normalized[valid_row_sums == 0] = 0
+
+            # 小于1的权重低于最小精度1/255，直接忽略
+            counted_mask = normalized >= 1
+            int_part = numpy.where(counted_mask, numpy.floor(normalized), 0)
+
+            # ticket越大说明取整损失的比例越大，优先分配误差
+            tickets = numpy.where(counted_mask, 255 / normalized * (normalized - int_part), 0)
+
+        output = int_part.astype(numpy.int64)
+        precision_error = 255 - output.sum(axis=1)
+
+        # 按ticket从大到小稳定排序，ticket相同时下标小的优先，和_bk2中max()加index()的选择顺序一致
+        ticket_order = numpy.argsort(-tickets, axis=1, kind='stable')
+        ticket_rank = numpy.empty_like(ticket_order)
+        numpy.put_along_axis(ticket_rank, ticket_order, numpy.broadcast_to(numpy.arange(column_count), ticket_order.shape), axis=1)
+
+        # 前min(误差, 正ticket数量)个ticket各分配1
+        ticket_allocation = numpy.clip(numpy.minimum(precision_error, (tickets > 0).sum(axis=1)), 0, None)
+        output += ticket_rank < ticket_allocation[:, numpy.newaxis]
+
+        # ticket用完后剩余的误差全部分配给当前最大的权重
+        remaining_error = numpy.clip(precision_error - ticket_allocation, 0, None)
+        output[numpy.arange(len(output)), output.argmax(axis=1)] += remaining_error
+
         result[valid_mask] = output.astype(numpy.uint8)
-        
         return result
     
     @classmethod
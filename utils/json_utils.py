@@ -1,5 +1,8 @@
+import os
 import json
 
+from .parse_cache_utils import ParseCacheUtils
+
 class JsonUtils:
 
 
@@ -22,4 +25,14 @@ class JsonUtils:
             return {}
         except json.JSONDecodeError:
             print(f"Error: The file at {filepath} is not a valid JSON file.")
-            return {}
\ No newline at end of file
+            return {}
+
+    @classmethod
+    def LoadFromFileCached(cls, filepath: str) -> dict:
+        '''
+        和LoadFromFile一样，但是文件没有修改过时直接返回上次解析的结果
+        返回的字典是共享的，只能读取不能修改
+        '''
+        if not os.path.exists(filepath):
+            return cls.LoadFromFile(filepath)
+        return ParseCacheUtils.get_or_parse("json", filepath, cls.LoadFromFile)
\ No newline at end of file
@@ -3,6 +3,27 @@ import numpy
 
 class MeshUtils:
 
+    @classmethod
+    def flip_triangle_winding(cls,ib) -> numpy.ndarray:
+        '''
+        翻转每个三角形的索引顺序以改变面朝向，导入和导出共用
+        '''
+        return numpy.asarray(ib).reshape(-1, 3)[:, ::-1].flatten()
+
+    @classmethod
+    def get_triangle_loop_starts(cls,polygon_count:int) -> numpy.ndarray:
+        '''
+        全是三角形的mesh中每个polygon的loop_start
+        '''
+        return numpy.arange(0, polygon_count * 3, 3, dtype=numpy.int32)
+
+    @classmethod
+    def get_triangle_loop_totals(cls,polygon_count:int) -> numpy.ndarray:
+        '''
+        全是三角形的mesh中每个polygon的loop_total
+        '''
+        return numpy.full(polygon_count, 3, dtype=numpy.int32)
+
     @classmethod
     def set_import_normals(cls,mesh,normals):
         # Blender4.2 移除了mesh.create_normal_splits()
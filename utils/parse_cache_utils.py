@@ -0,0 +1,56 @@
+import os
+import threading
+
+class ParseCacheUtils:
+    '''
+    配置文件解析结果的共享缓存
+
+    一次导入或生成Mod中，同一个fmt、tmp.json、Config.json、Import.json会被反复读取解析，
+    这里按(解析类型, 文件路径)缓存解析结果，并记录文件的mtime和size，文件被修改过时自动重新解析。
+    导入时fmt在工作线程中解析，所以读写缓存时要加锁。
+
+    注意返回的解析结果是共享的，调用方只能读取，不能修改。
+    '''
+    parse_cache_dict:dict[tuple[str,str],tuple[tuple[int,int],object]] = {}
+    parse_cache_lock = threading.Lock()
+
+    # (类型, 内容key) -> 按内容共享的对象，比如多个DrawIB共用的D3D11GameType
+    shared_object_dict:dict[tuple[str,object],object] = {}
+
+    @classmethod
+    def get_or_parse(cls, parse_type:str, file_path:str, parse_func):
+        '''
+        文件没有变化时直接返回缓存的解析结果，否则调用parse_func(file_path)重新解析并缓存
+        parse_type用于区分同一个文件的不同解析方式，比如tmp.json既会被当作json读取，也会被解析为D3D11GameType
+        '''
+        file_stat = os.stat(file_path)
+        file_stamp = (file_stat.st_mtime_ns, file_stat.st_size)
+        cache_key = (parse_type, os.path.normcase(os.path.abspath(file_path)))
+
+        with cls.parse_cache_lock:
+            cache_value = cls.parse_cache_dict.get(cache_key,None)
+        if cache_value is not None and cache_value[0] == file_stamp:
+            return cache_value[1]
+
+        # 解析不在锁内进行，多个线程同时解析同一个文件时结果相同，后写入的覆盖先写入的即可
+        parse_result = parse_func(file_path)
+        with cls.parse_cache_lock:
+            cls.parse_cache_dict[cache_key] = (file_stamp, parse_result)
+        return parse_result
+
+    @classmethod
+    def get_or_create_shared(cls, shared_type:str, shared_key, create_func):
+        '''
+        和get_or_parse不同，这里不按文件路径缓存，而是按调用方根据内容计算的shared_key缓存，
+        所以不同文件中内容相同的部分可以共享同一个对象，内容变化时shared_key也会变化，自动创建新的对象
+        '''
+        cache_key = (shared_type, shared_key)
+        with cls.parse_cache_lock:
+            shared_object = cls.shared_object_dict.get(cache_key,None)
+        if shared_object is not None:
+            return shared_object
+
+        shared_object = create_func()
+        with cls.parse_cache_lock:
+            # 多个线程同时创建时只保留第一个写入的，保证所有调用方拿到的是同一个对象
+            return cls.shared_object_dict.setdefault(cache_key, shared_object)
@@ -233,43 +233,55 @@ class ShapeKeyUtils:
 
 
     @classmethod
-    def extract_shapekey_data(cls,merged_obj,index_vertex_id_dict):
+    def extract_shapekey_data(cls,merged_obj,index_vertex_id_ndarray):
         '''
         传入一个Obj，提取出其形态键数据为特定格式
+        返回值都是numpy数组：
+        shapekey_offsets 长度128的int32数组，每个形态键在顶点列表中的起始位置
+        shapekey_vertex_ids int32数组，每个形态键顶点对应的顶点索引
+        shapekey_vertex_offsets float32数组，每个形态键顶点6个值，前3个为偏移，后3个固定为0
         '''
         TimerUtils.Start("process shapekey data")
 
-        shapekey_cache = cls.get_shapekey_cache(merged_obj,index_vertex_id_dict)
+        shapekey_cache = cls.get_shapekey_cache(merged_obj,index_vertex_id_ndarray)
 
-        shapekey_offsets = []
-        shapekey_vertex_ids = []
-        shapekey_vertex_offsets = []
+        shapekey_offsets = numpy.zeros(128, dtype=numpy.int32)
+        shapekey_vertex_ids_list = []
+        shapekey_vertex_offsets_list = []
 
         # 从0到128去获取ShapeKey的Index，有就直接加到
         shapekey_verts_count = 0
         for group_id in range(128):
-            shapekey = shapekey_cache.get(group_id, None)
+            shapekey_offsets[group_id] = shapekey_verts_count
 
-            if shapekey is None or len(shapekey_cache[group_id]) == 0:
-                shapekey_offsets.extend([shapekey_verts_count if shapekey_verts_count != 0 else 0])
+            shapekey = shapekey_cache.get(group_id, None)
+            if shapekey is None:
                 continue
 
-            shapekey_offsets.extend([shapekey_verts_count])
+            index_ids, vertex_offsets = shapekey
+            shapekey_vertex_ids_list.append(index_ids)
+            shapekey_vertex_offsets_list.append(vertex_offsets)
+            shapekey_verts_count += len(index_ids)
 
-            for draw_index, vertex_offsets in shapekey.items():
-                shapekey_vertex_ids.extend([draw_index])
-                shapekey_vertex_offsets.extend(vertex_offsets + [0, 0, 0])
-                shapekey_verts_count += 1
+        if shapekey_verts_count == 0:
+            TimerUtils.End("process shapekey data") 
+            return shapekey_offsets, numpy.empty(0, dtype=numpy.int32), numpy.empty(0, dtype=numpy.float32)
+
+        shapekey_vertex_ids = numpy.concatenate(shapekey_vertex_ids_list).astype(numpy.int32)
+        shapekey_vertex_offsets = numpy.zeros((shapekey_verts_count, 6), dtype=numpy.float32)
+        shapekey_vertex_offsets[:, :3] = numpy.concatenate(shapekey_vertex_offsets_list)
 
         TimerUtils.End("process shapekey data") 
-        return shapekey_offsets,shapekey_vertex_ids,shapekey_vertex_offsets
+        return shapekey_offsets,shapekey_vertex_ids,shapekey_vertex_offsets.ravel()
     
 
 
     @classmethod
-    def get_shapekey_cache(cls, merged_obj, index_vertex_id_dict):
+    def get_shapekey_cache(cls, merged_obj, index_vertex_id_ndarray):
         '''
         Numpy优化版本，快很多
+        返回 {形态键ID: (index_id数组, 偏移数组)}，顺序和之前的字典版本完全一致：
+        先按顶点ID升序，同一个顶点ID的多个index_id按升序排列。
         '''
         # TimerUtils.Start("shapekey_cache")
         obj = merged_obj
@@ -278,15 +290,13 @@ class ShapeKeyUtils:
         
         if mesh_shapekeys is None:
             print(f"obj: {obj.name} 不含有形态键，跳过处理")
-            TimerUtils.End("shapekey_cache")
-            return None, None, None
+            return {}
 
-        # 构建顶点索引到全局index_id的反向映射
-        vertex_to_indices = {}
-        for index_id, vertex_id in index_vertex_id_dict.items():
-            if vertex_id not in vertex_to_indices:
-                vertex_to_indices[vertex_id] = []
-            vertex_to_indices[vertex_id].append(index_id)
+        # 构建顶点索引到全局index_id的反向映射，CSR形式：
+        # 稳定排序后，同一个顶点ID对应的index_id是连续的，并且按升序排列
+        index_count = len(index_vertex_id_ndarray)
+        vertex_sorted_index_ids = numpy.argsort(index_vertex_id_ndarray, kind="stable")
+        vertex_sorted_vertex_ids = index_vertex_id_ndarray[vertex_sorted_index_ids]
 
         # 获取基础坐标
         base_data = mesh_shapekeys.key_blocks['Basis'].data
@@ -325,31 +335,48 @@ class ShapeKeyUtils:
             # 计算向量长度并过滤小偏移
             lengths = numpy.linalg.norm(offsets, axis=1)
             valid_mask = lengths >= 1e-9
-            valid_vertex_ids = numpy.where(valid_mask)[0]
             
-            if not valid_vertex_ids.size:
+            if not valid_mask.any():
                 # 这里一般不会触发
                 # print("valid_vertex_ids.size not, continue!")
                 continue
-                
-            # 按形态键初始化缓存
+
+            # 处理有效顶点，直接从CSR反向表中取出所有关联的index_id
+            index_ids = vertex_sorted_index_ids[valid_mask[vertex_sorted_vertex_ids]]
+            index_offsets = offsets[index_vertex_id_ndarray[index_ids]]
+
+            if index_ids.size == 0:
+                continue
+
             if shapekey_idx not in shapekey_cache:
-                shapekey_cache[shapekey_idx] = {}
-                
-            # 处理有效顶点
-            for v_idx in valid_vertex_ids:
-                offset_list = offsets[v_idx].tolist()
-                # 获取关联的全局index_id
-                if v_idx in vertex_to_indices:
-                    for index_id in vertex_to_indices[v_idx]:
-                        shapekey_cache[shapekey_idx][index_id] = offset_list
+                shapekey_cache[shapekey_idx] = (index_ids, index_offsets)
+                continue
+
+            # 多个形态键使用同一个ID时，已有的index_id保持原来的位置并使用新的偏移，新的index_id追加到末尾
+            existing_index_ids, existing_index_offsets = shapekey_cache[shapekey_idx]
+            new_positions = numpy.full(index_count, -1, dtype=numpy.int64)
+            new_positions[index_ids] = numpy.arange(len(index_ids))
+            existing_new_positions = new_positions[existing_index_ids]
+            overwritten_mask = existing_new_positions >= 0
+
+            existing_index_offsets = existing_index_offsets.copy()
+            existing_index_offsets[overwritten_mask] = index_offsets[existing_new_positions[overwritten_mask]]
+
+            is_existing = numpy.zeros(index_count, dtype=bool)
+            is_existing[existing_index_ids] = True
+            appended_mask = ~is_existing[index_ids]
+
+            shapekey_cache[shapekey_idx] = (
+                numpy.concatenate((existing_index_ids, index_ids[appended_mask])),
+                numpy.concatenate((existing_index_offsets, index_offsets[appended_mask])),
+            )
 
         # TimerUtils.End("shapekey_cache")
         return shapekey_cache
     
 
     @classmethod
-    def extract_shapekey_data_v2(cls, merged_obj, index_vertex_id_dict):
+    def extract_shapekey_data_v2(cls, merged_obj, index_vertex_id_ndarray):
         '''
         旧代码分成俩不好理解，所以整合成了一个，方便理解。
         传入一个 Obj，直接输出形态键三数组（功能与旧代码完全一致）
@@ -364,7 +391,7 @@ class ShapeKeyUtils:
 
         # ----- 1. vertex_id -> [draw_index,...] 反向表
         v2d = {}
-        for draw_idx, v_idx in index_vertex_id_dict.items():
+        for draw_idx, v_idx in enumerate(index_vertex_id_ndarray.tolist()):
             v2d.setdefault(v_idx, []).append(draw_idx)
 
         # ----- 2. 读 Basis
@@ -1,18 +1,48 @@
 import os
 
 class TextureUtils:
+    # 目录 -> 目录下所有文件的(文件名, 完整路径)列表，顺序和os.walk一致
+    texture_file_index_dict:dict[str,list[tuple[str,str]]] = {}
+
+    # (目录, 后缀, 前缀长度) -> {文件名前缀: 完整路径}，每个前缀只记录os.walk中第一个匹配的文件
+    texture_lookup_dict:dict[tuple[str,str,int],dict[str,str]] = {}
+
+    @classmethod
+    def clear_texture_index(cls):
+        '''
+        清空贴图文件索引，每次导入开始前调用，保证能找到上次导入之后新生成的贴图
+        '''
+        cls.texture_file_index_dict.clear()
+        cls.texture_lookup_dict.clear()
+
+    @classmethod
+    def get_texture_file_index(cls,directory) -> list[tuple[str,str]]:
+        '''
+        每个目录只os.walk一次，之后同一次导入中的所有模型都复用这个索引
+        '''
+        texture_file_index = cls.texture_file_index_dict.get(directory,None)
+        if texture_file_index is None:
+            texture_file_index = []
+            for root, dirs, files in os.walk(directory):
+                for file in files:
+                    texture_file_index.append((file, os.path.join(root, file)))
+            cls.texture_file_index_dict[directory] = texture_file_index
+        return texture_file_index
+
     @classmethod
     def find_texture(cls,texture_prefix, texture_suffix, directory):
         '''
         查找目标目录下，满足指定后缀和前缀的贴图文件
         '''
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if file.endswith(texture_suffix) and file.startswith(texture_prefix):
-                    texture_path = os.path.join(root, file)
-                    return texture_path
-        return None
-    
+        lookup_key = (directory, texture_suffix, len(texture_prefix))
+        prefix_path_dict = cls.texture_lookup_dict.get(lookup_key,None)
+        if prefix_path_dict is None:
+            prefix_path_dict = {}
+            for file, texture_path in cls.get_texture_file_index(directory):
+                if file.endswith(texture_suffix):
+                    prefix_path_dict.setdefault(file[:len(texture_prefix)], texture_path)
+            cls.texture_lookup_dict[lookup_key] = prefix_path_dict
+        return prefix_path_dict.get(texture_prefix,None)
+
 
 
-    
\ No newline at end of file
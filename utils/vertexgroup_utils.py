@@ -4,6 +4,7 @@ import numpy
 import math
 
 from mathutils import Vector,Matrix
+from mathutils.kdtree import KDTree
 
 from .format_utils import Fatal
 
@@ -17,16 +18,15 @@ class VertexGroupUtils:
         if obj.type == "MESH":
             # obj = bpy.context.active_object
             obj.update_from_editmode()
-            vgroup_used = {i: False for i, k in enumerate(obj.vertex_groups)}
 
-            for v in obj.data.vertices:
-                for g in v.groups:
-                    if g.weight > 0.0:
-                        vgroup_used[g.group] = True
+            # 一次性读取所有权重，只要有一个顶点的权重大于0就算使用了
+            offsets, group_ids, weights = cls.get_vertex_group_weight_csr(obj.data)
+            vgroup_used = numpy.zeros(len(obj.vertex_groups), dtype=bool)
+            used_group_ids = group_ids[weights > 0.0]
+            vgroup_used[used_group_ids[used_group_ids < len(vgroup_used)]] = True
 
-            for i, used in sorted(vgroup_used.items(), reverse=True):
-                if not used:
-                    obj.vertex_groups.remove(obj.vertex_groups[i])
+            for i in reversed(numpy.flatnonzero(~vgroup_used).tolist()):
+                obj.vertex_groups.remove(obj.vertex_groups[i])
 
     @classmethod
     def remove_all_vertex_groups(cls,obj):
@@ -37,71 +37,94 @@ class VertexGroupUtils:
             for x in obj.vertex_groups:
                 obj.vertex_groups.remove(x)
 
+    @classmethod
+    def set_vertex_group_weights(cls,vertex_group,vertex_indices:numpy.ndarray,weights:numpy.ndarray):
+        '''
+        把顶点按权重分组，每种权重只调用一次vertex_group.add
+        '''
+        if len(vertex_indices) == 0:
+            return
+        unique_weights, weight_inverse = numpy.unique(weights, return_inverse=True)
+        sort_indices = numpy.argsort(weight_inverse, kind='stable')
+        bucket_starts = numpy.searchsorted(weight_inverse[sort_indices], numpy.arange(len(unique_weights)))
+        bucket_ends = numpy.r_[bucket_starts[1:], len(sort_indices)]
+        sorted_vertex_indices = vertex_indices[sort_indices]
+        for weight, bucket_start, bucket_end in zip(unique_weights.tolist(), bucket_starts.tolist(), bucket_ends.tolist()):
+            vertex_group.add(sorted_vertex_indices[bucket_start:bucket_end].tolist(), weight, 'REPLACE')
+
     @classmethod
     def merge_vertex_groups_with_same_number(cls):
         # Author: SilentNightSound#7430
         # Combines vertex groups with the same prefix into one, a fast alternative to the Vertex Weight Mix that works for multiple groups
         # You will likely want to use blender_fill_vg_gaps.txt after this to fill in any gaps caused by merging groups together
-        # Nico: we only need mode 3 here.
+        # Nico: we only need mode 3 here, 也就是合并所有名称前缀(.之前的部分)相同的顶点组
 
+        '''
+        每个obj只读取一次所有权重，按(顶点, 名称前缀)排序后用reduceat求和，再按权重分组批量写回。
+        每个前缀合并到其中索引最小的顶点组中并改名为前缀，其余同前缀的顶点组删除，
+        合并后权重不大于0的顶点不保留在顶点组中，最后按名称排序，结果和之前逐个顶点计算一致。
+        '''
         selected_obj = [obj for obj in bpy.context.selected_objects]
-        vgroup_names = []
-
-        ##### USAGE INSTRUCTIONS
-        # MODE 1: Runs the merge on a specific list of vertex groups in the selected object(s). Can add more names or fewer to the list - change the names to what you need
-        # MODE 2: Runs the merge on a range of vertex groups in the selected object(s). Replace smallest_group_number with the lower bound, and largest_group_number with the upper bound
-        # MODE 3 (DEFAULT): Runs the merge on ALL vertex groups in the selected object(s)
-
-        # Select the mode you want to run:
-        mode = 3
-
-        # Required data for MODE 1:
-        vertex_groups = ["replace_with_first_vertex_group_name", "second_vertex_group_name", "third_name_etc"]
-
-        # Required data for MODE 2:
-        smallest_group_number = 000
-        largest_group_number = 999
-
-        ######
-
-        if mode == 1:
-            vgroup_names = [vertex_groups]
-        elif mode == 2:
-            vgroup_names = [[f"{i}" for i in range(smallest_group_number, largest_group_number + 1)]]
-        elif mode == 3:
-            vgroup_names = [[x.name.split(".")[0] for x in y.vertex_groups] for y in selected_obj]
-        else:
-            raise Fatal("Mode not recognized, exiting")
-
-        if not vgroup_names:
+        if not selected_obj:
             raise Fatal(
                 "No vertex groups found, please double check an object is selected and required data has been entered")
 
-        for cur_obj, cur_vgroup in zip(selected_obj, itertools.cycle(vgroup_names)):
-            for vname in cur_vgroup:
-                relevant = [x.name for x in cur_obj.vertex_groups if x.name.split(".")[0] == f"{vname}"]
-
-                if relevant:
-
-                    vgroup = cur_obj.vertex_groups.new(name=f"x{vname}")
+        for cur_obj in selected_obj:
+            vertex_group_list = list(cur_obj.vertex_groups)
+            if vertex_group_list:
+                vgroup_prefix_list = [vg.name.split(".")[0] for vg in vertex_group_list]
+                unique_prefixes, group_prefix_ids = numpy.unique(vgroup_prefix_list, return_inverse=True)
+                group_prefix_ids = group_prefix_ids.reshape(-1)
+                prefix_group_counts = numpy.bincount(group_prefix_ids, minlength=len(unique_prefixes))
+
+                # (1) 读取所有权重，并按(顶点, 前缀)求和
+                offsets, group_ids, weights = cls.get_vertex_group_weight_csr(cur_obj.data)
+                vertex_ids = numpy.repeat(numpy.arange(len(offsets) - 1, dtype=numpy.int64), numpy.diff(offsets))
+
+                # 顶点上可能残留超出obj顶点组数量的索引，这些权重不属于任何顶点组，和之前一样直接忽略
+                in_range_mask = group_ids < len(vertex_group_list)
+                vertex_ids = vertex_ids[in_range_mask]
+                weights = weights[in_range_mask]
+                entry_prefix_ids = group_prefix_ids[group_ids[in_range_mask]]
+
+                merge_keys = vertex_ids * len(unique_prefixes) + entry_prefix_ids
+                sort_indices = numpy.argsort(merge_keys, kind='stable')
+                sorted_merge_keys = merge_keys[sort_indices]
+                merge_starts = numpy.flatnonzero(numpy.r_[True, sorted_merge_keys[1:] != sorted_merge_keys[:-1]]) if len(sorted_merge_keys) else numpy.zeros(0, dtype=numpy.int64)
+                merged_weights = numpy.add.reduceat(weights[sort_indices].astype(numpy.float64), merge_starts) if len(merge_starts) else numpy.zeros(0)
+                merged_vertex_ids = vertex_ids[sort_indices][merge_starts]
+                merged_prefix_ids = entry_prefix_ids[sort_indices][merge_starts]
+
+                # 按前缀分段，方便取出每个前缀的所有顶点
+                prefix_sort_indices = numpy.argsort(merged_prefix_ids, kind='stable')
+                prefix_starts = numpy.searchsorted(merged_prefix_ids[prefix_sort_indices], numpy.arange(len(unique_prefixes) + 1))
+
+                # (2) 每个前缀保留索引最小的顶点组作为合并目标，先删除其余的，避免改名时重名
+                target_vertex_group_dict = {}
+                for vg, prefix_id in zip(vertex_group_list, group_prefix_ids.tolist()):
+                    if prefix_id not in target_vertex_group_dict:
+                        target_vertex_group_dict[prefix_id] = vg
+                    else:
+                        cur_obj.vertex_groups.remove(vg)
 
-                    for vert_id, vert in enumerate(cur_obj.data.vertices):
-                        available_groups = [v_group_elem.group for v_group_elem in vert.groups]
+                # (3) 写回合并后的权重
+                for prefix_id, target_vg in target_vertex_group_dict.items():
+                    segment = prefix_sort_indices[prefix_starts[prefix_id]:prefix_starts[prefix_id + 1]]
+                    segment_vertex_ids = merged_vertex_ids[segment]
+                    segment_weights = merged_weights[segment]
+                    keep_mask = segment_weights > 0
 
-                        combined = 0
-                        for v in relevant:
-                            if cur_obj.vertex_groups[v].index in available_groups:
-                                combined += cur_obj.vertex_groups[v].weight(vert_id)
+                    zero_vertex_ids = segment_vertex_ids[~keep_mask]
+                    if len(zero_vertex_ids) != 0:
+                        target_vg.remove(zero_vertex_ids.tolist())
 
-                        if combined > 0:
-                            vgroup.add([vert_id], combined, 'ADD')
+                    # 只有一个顶点组的前缀，权重没有变化，不需要重新写入
+                    if prefix_group_counts[prefix_id] > 1:
+                        cls.set_vertex_group_weights(target_vg, segment_vertex_ids[keep_mask], segment_weights[keep_mask])
 
-                    for vg in [x for x in cur_obj.vertex_groups if x.name.split(".")[0] == f"{vname}"]:
-                        cur_obj.vertex_groups.remove(vg)
-
-                    for vg in cur_obj.vertex_groups:
-                        if vg.name[0].lower() == "x":
-                            vg.name = vg.name[1:]
+                    prefix = str(unique_prefixes[prefix_id])
+                    if target_vg.name != prefix:
+                        target_vg.name = prefix
 
             bpy.context.view_layer.objects.active = cur_obj
             bpy.ops.object.vertex_group_sort()
@@ -223,133 +246,240 @@ class VertexGroupUtils:
                 origin_name, real_keys[i - 1])
             
     @classmethod
-    def get_vertex_group_weight(cls,vgroup, vertex):
+    def calculate_vertex_influence_area(cls,obj) -> numpy.ndarray:
         '''
         Credit to @Comilarex
         https://gamebanana.com/tools/19057
-        '''
-        for group in vertex.groups:
-            if group.group == vgroup.index:
-                return group.weight
-        return 0.0
 
-    @classmethod
-    def calculate_vertex_influence_area(cls,obj):
+        每个面的面积平均分给它的每个顶点，用foreach_get一次性读取后按loop累加
         '''
-        Credit to @Comilarex
-        https://gamebanana.com/tools/19057
-        '''
-        vertex_area = [0.0] * len(obj.data.vertices)
-        
-        for face in obj.data.polygons:
-            # Assuming the area is evenly distributed among the vertices
-            area_per_vertex = face.area / len(face.vertices)
-            for vert_idx in face.vertices:
-                vertex_area[vert_idx] += area_per_vertex
+        mesh = obj.data
+        polygon_count = len(mesh.polygons)
+        polygon_areas = numpy.empty(polygon_count, dtype=numpy.float32)
+        polygon_loop_totals = numpy.empty(polygon_count, dtype=numpy.int32)
+        mesh.polygons.foreach_get("area", polygon_areas)
+        mesh.polygons.foreach_get("loop_total", polygon_loop_totals)
+
+        loop_vertex_indices = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+        mesh.loops.foreach_get("vertex_index", loop_vertex_indices)
 
-        return vertex_area
+        # Assuming the area is evenly distributed among the vertices
+        # 面的loop在mesh.loops中是按面的顺序连续存放的，所以直接repeat就能得到每个loop分到的面积
+        loop_areas = numpy.repeat(polygon_areas.astype(numpy.float64) / polygon_loop_totals, polygon_loop_totals)
+        return numpy.bincount(loop_vertex_indices, weights=loop_areas, minlength=len(mesh.vertices))
 
     @classmethod
-    def get_weighted_center(cls, obj, vgroup):
+    def get_weighted_centers(cls, obj):
         '''
         Credit to @Comilarex
         https://gamebanana.com/tools/19057
+
+        一次计算出obj所有顶点组按 权重*顶点影响面积 加权的世界坐标中心
+        返回(centers, valid_mask)，centers形状为(顶点组数量, 3)，没有任何有效权重的顶点组valid_mask为False
         '''
-        total_weight_area = 0.0
-        weighted_position_sum = Vector((0.0, 0.0, 0.0))
+        mesh = obj.data
+        vertex_count = len(mesh.vertices)
+        vertex_group_count = len(obj.vertex_groups)
 
         # Calculate the area influenced by each vertex
         vertex_influence_area = cls.calculate_vertex_influence_area(obj)
 
-        for vertex in obj.data.vertices:
-            weight = cls.get_vertex_group_weight(vgroup, vertex)
-            influence_area = vertex_influence_area[vertex.index]
-            weight_area = weight * influence_area
+        vertex_coords = numpy.empty(vertex_count * 3, dtype=numpy.float32)
+        mesh.vertices.foreach_get("co", vertex_coords)
+        matrix_world = numpy.array(obj.matrix_world, dtype=numpy.float64)
+        world_coords = vertex_coords.reshape(-1, 3) @ matrix_world[:3, :3].T + matrix_world[:3, 3]
 
-            if weight_area > 0:
-                weighted_position_sum += obj.matrix_world @ vertex.co * weight_area
-                total_weight_area += weight_area
+        # 稀疏权重矩阵乘以(面积*坐标)，用bincount按顶点组累加
+        offsets, group_ids, weights = cls.get_vertex_group_weight_csr(mesh)
+        vertex_ids = numpy.repeat(numpy.arange(vertex_count, dtype=numpy.int64), numpy.diff(offsets))
+        weight_areas = weights.astype(numpy.float64) * vertex_influence_area[vertex_ids]
 
-        if total_weight_area > 0:
-            return weighted_position_sum / total_weight_area
-        else:
-            return None
+        positive_mask = (weight_areas > 0) & (group_ids < vertex_group_count)
+        group_ids = group_ids[positive_mask]
+        weight_areas = weight_areas[positive_mask]
+        vertex_ids = vertex_ids[positive_mask]
+
+        total_weight_areas = numpy.bincount(group_ids, weights=weight_areas, minlength=vertex_group_count)
+        weighted_position_sums = numpy.empty((vertex_group_count, 3), dtype=numpy.float64)
+        for axis in range(3):
+            weighted_position_sums[:, axis] = numpy.bincount(group_ids, weights=weight_areas * world_coords[vertex_ids, axis], minlength=vertex_group_count)
+
+        valid_mask = total_weight_areas > 0
+        centers = numpy.zeros((vertex_group_count, 3), dtype=numpy.float64)
+        centers[valid_mask] = weighted_position_sums[valid_mask] / total_weight_areas[valid_mask][:, numpy.newaxis]
+        return centers, valid_mask
 
     @classmethod
     def match_vertex_groups(cls, base_obj, target_obj):
         '''
         Credit to @Comilarex
         https://gamebanana.com/tools/19057
+
+        把base_obj的每个顶点组改名为加权中心距离最近的target_obj顶点组的名称，最近邻查找使用KDTree
         '''
         # Rename all vertex groups in base_obj to "unknown"
         for base_group in base_obj.vertex_groups:
             base_group.name = "unknown"
 
         # Precompute centers for all target vertex groups
-        target_centers = {}
-        for target_group in target_obj.vertex_groups:
-            target_centers[target_group.name] = cls.get_weighted_center(target_obj, target_group)
+        target_centers, target_valid_mask = cls.get_weighted_centers(target_obj)
+        target_group_names = [target_group.name for target_group in target_obj.vertex_groups]
+        target_valid_indices = numpy.flatnonzero(target_valid_mask).tolist()
+        if len(target_valid_indices) == 0:
+            return
+
+        target_kdtree = KDTree(len(target_valid_indices))
+        for target_index in target_valid_indices:
+            target_kdtree.insert(target_centers[target_index].tolist(), target_index)
+        target_kdtree.balance()
 
         # Perform the matching and renaming process
-        for base_group in base_obj.vertex_groups:
-            base_center = cls.get_weighted_center(base_obj, base_group)
-            if base_center is None:
+        base_centers, base_valid_mask = cls.get_weighted_centers(base_obj)
+        for base_group, base_center, base_valid in zip(list(base_obj.vertex_groups), base_centers.tolist(), base_valid_mask.tolist()):
+            if not base_valid:
                 continue
 
-            best_match = None
-            best_distance = float('inf')
+            best_co, best_match_index, best_distance = target_kdtree.find(base_center)
+            if best_match_index is not None:
+                base_group.name = target_group_names[best_match_index]
 
-            for target_group_name, target_center in target_centers.items():
-                if target_center is None:
-                    continue
 
-                distance = (base_center - target_center).length
-                if distance < best_distance:
-                    best_distance = distance
-                    best_match = target_group_name
+    @classmethod
+    def get_vertex_group_weight_csr(cls,mesh):
+        '''
+        一次性读取mesh中所有顶点的(顶点, 顶点组, 权重)，以CSR形式返回(offsets, group_ids, weights)
+        第i个顶点的顶点组和权重为group_ids[offsets[i]:offsets[i+1]]和weights[offsets[i]:offsets[i+1]]，
+        顺序和v.groups中的顺序一致，包含权重为0的顶点组
+        '''
+        vertex_groups_list = [v.groups for v in mesh.vertices]
+        group_counts = numpy.fromiter(map(len, vertex_groups_list), dtype=numpy.int64, count=len(vertex_groups_list))
 
-            if best_match:
-                base_group.name = best_match
+        offsets = numpy.zeros(len(vertex_groups_list) + 1, dtype=numpy.int64)
+        numpy.cumsum(group_counts, out=offsets[1:])
+        total_count = int(offsets[-1])
 
+        group_elements = list(itertools.chain.from_iterable(vertex_groups_list))
+        group_ids = numpy.fromiter((g.group for g in group_elements), dtype=numpy.int64, count=total_count)
+        weights = numpy.fromiter((g.weight for g in group_elements), dtype=numpy.float32, count=total_count)
+        return offsets, group_ids, weights
 
     @classmethod
-    def get_blendweights_blendindices_v1(cls,mesh,normalize_weights:bool = False):
-        mesh_loops = mesh.loops
-        mesh_loops_length = len(mesh_loops)
-        mesh_vertices = mesh.vertices
+    def get_normalize_all_lock_flags(cls,obj):
+        '''
+        返回Normalize All时每个顶点组是否锁定，规则和bpy.ops.object.vertex_group_normalize_all()的默认参数一致：
+        只要有顶点组被锁定，当前激活的顶点组也视为锁定(lock_active)。
+        没有顶点组或者所有顶点组都被锁定时无法执行Normalize All，返回None
+        '''
+        lock_flags = numpy.array([vg.lock_weight for vg in obj.vertex_groups], dtype=bool)
+        if len(lock_flags) == 0:
+            return None
 
-        loop_vertex_indices = numpy.empty(mesh_loops_length, dtype=int)
-        mesh_loops.foreach_get("vertex_index", loop_vertex_indices)
+        active_index = obj.vertex_groups.active_index
+        if lock_flags.any() and 0 <= active_index < len(lock_flags):
+            lock_flags[active_index] = True
 
-        max_groups = 4
+        if lock_flags.all():
+            return None
+        return lock_flags
+
+    @classmethod
+    def normalize_all_vertex_group_weights(cls,offsets,group_ids,weights,lock_flags):
+        '''
+        在CSR权重上执行和vertex_group_normalize_all()相同的规格化，返回新的weights，不修改obj和mesh：
+        - 只有一个顶点组的顶点，这个顶点组没有锁定时权重直接设为1
+        - 有多个顶点组的顶点，没有锁定的权重按比例缩放到1减去锁定权重之和，结果限制在0到1之间
+        计算都使用float32并按顶点组顺序累加，和Blender中的计算方式一致
+        '''
+        vertex_count = len(offsets) - 1
+        group_counts = numpy.diff(offsets)
+        vertex_ids = numpy.repeat(numpy.arange(vertex_count, dtype=numpy.int64), group_counts)
 
-        # Extract and sort the top 4 groups by weight for each vertex.
-        sorted_groups = [
-            sorted(v.groups, key=lambda x: x.weight, reverse=True)[:max_groups]
-            for v in mesh_vertices
-        ]
+        # 和Blender一样只处理obj已有的顶点组，超出obj顶点组数量的索引既不参与求和也不会被缩放
+        in_range_mask = group_ids < len(lock_flags)
+        locked_mask = numpy.zeros(len(group_ids), dtype=bool)
+        locked_mask[in_range_mask] = lock_flags[group_ids[in_range_mask]]
+        unlocked_mask = in_range_mask & ~locked_mask
 
-        # Initialize arrays to hold all groups and weights with zeros.
-        all_groups = numpy.zeros((len(mesh_vertices), max_groups), dtype=int)
-        all_weights = numpy.zeros((len(mesh_vertices), max_groups), dtype=numpy.float32)
+        weights = weights.astype(numpy.float32)
+        element_group_counts = group_counts[vertex_ids]
 
+        # 这里的顶点组数量和Blender一样包含超出范围的顶点组
+        weights[(element_group_counts == 1) & unlocked_mask] = 1.0
 
-        # Fill the pre-allocated arrays with group indices and weights.
-        for v_index, groups in enumerate(sorted_groups):
-            num_groups = min(len(groups), max_groups)
-            all_groups[v_index, :num_groups] = [g.group for g in groups][:num_groups]
-            all_weights[v_index, :num_groups] = [g.weight for g in groups][:num_groups]
+        multi_mask = element_group_counts > 1
+        unlocked_multi_mask = multi_mask & unlocked_mask
+        locked_multi_mask = multi_mask & locked_mask
 
-        # Initialize the blendindices and blendweights with zeros.
-        blendindices = numpy.zeros((mesh_loops_length, max_groups), dtype=numpy.uint32)
-        blendweights = numpy.zeros((mesh_loops_length, max_groups), dtype=numpy.float32)
+        unlocked_sums = numpy.zeros(vertex_count, dtype=numpy.float32)
+        locked_sums = numpy.zeros(vertex_count, dtype=numpy.float32)
+        numpy.add.at(unlocked_sums, vertex_ids[unlocked_multi_mask], weights[unlocked_multi_mask])
+        numpy.add.at(locked_sums, vertex_ids[locked_multi_mask], weights[locked_multi_mask])
+
+        # 没有未锁定权重的顶点不会被缩放，这里除以0的结果不会被用到
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            scalars = (numpy.float32(1.0) / unlocked_sums) * numpy.maximum(numpy.float32(0.0), numpy.float32(1.0) - locked_sums)
+
+        scale_mask = unlocked_multi_mask & (unlocked_sums[vertex_ids] > 0)
+        weights[scale_mask] = numpy.clip(weights[scale_mask] * scalars[vertex_ids[scale_mask]], 0.0, 1.0)
+        return weights
+
+    @classmethod
+    def get_sorted_vertex_group_weights(cls,mesh,max_groups:int = None,remove_zero_weights:bool = False,normalize_all_lock_flags = None):
+        '''
+        每个顶点的顶点组按权重从大到小稳定排序，权重相同时保持v.groups中的顺序，和sorted(v.groups, key=weight, reverse=True)一致
+        max_groups为None时取所有顶点中最大的顶点组数量，超出max_groups的部分直接丢弃
+        normalize_all_lock_flags不为None时，先按get_normalize_all_lock_flags的锁定情况执行Normalize All
+        返回(all_groups, all_weights)，形状都是(顶点数, max_groups)，不足的部分补0
+        '''
+        offsets, group_ids, weights = cls.get_vertex_group_weight_csr(mesh)
+        vertex_count = len(offsets) - 1
+
+        if normalize_all_lock_flags is not None:
+            weights = cls.normalize_all_vertex_group_weights(offsets, group_ids, weights, normalize_all_lock_flags)
+        vertex_ids = numpy.repeat(numpy.arange(vertex_count, dtype=numpy.int64), numpy.diff(offsets))
+
+        if remove_zero_weights:
+            nonzero_mask = weights > 0
+            vertex_ids = vertex_ids[nonzero_mask]
+            group_ids = group_ids[nonzero_mask]
+            weights = weights[nonzero_mask]
+
+        # 分段排序：先按顶点，再按权重从大到小，lexsort是稳定的，所以权重相同时保持原顺序
+        sort_indices = numpy.lexsort((-weights, vertex_ids))
+        vertex_ids = vertex_ids[sort_indices]
+
+        # 每个元素在所属顶点中的排名
+        group_counts = numpy.bincount(vertex_ids, minlength=vertex_count)
+        segment_starts = numpy.zeros(vertex_count, dtype=numpy.int64)
+        numpy.cumsum(group_counts[:-1], out=segment_starts[1:])
+        ranks = numpy.arange(len(vertex_ids), dtype=numpy.int64) - segment_starts[vertex_ids]
+
+        if max_groups is None:
+            max_groups = int(group_counts.max()) if vertex_count > 0 else 0
+
+        keep_mask = ranks < max_groups
+        all_groups = numpy.zeros((vertex_count, max_groups), dtype=int)
+        all_weights = numpy.zeros((vertex_count, max_groups), dtype=numpy.float32)
+        all_groups[vertex_ids[keep_mask], ranks[keep_mask]] = group_ids[sort_indices][keep_mask]
+        all_weights[vertex_ids[keep_mask], ranks[keep_mask]] = weights[sort_indices][keep_mask]
+        return all_groups, all_weights
+
+    @classmethod
+    def get_blendweights_blendindices_v1(cls,mesh,normalize_weights:bool = False,normalize_all_lock_flags = None):
+        mesh_loops = mesh.loops
+        mesh_loops_length = len(mesh_loops)
+
+        loop_vertex_indices = numpy.empty(mesh_loops_length, dtype=int)
+        mesh_loops.foreach_get("vertex_index", loop_vertex_indices)
+
+        max_groups = 4
 
-        # Map from loop_vertex_indices to precomputed data using advanced indexing.
-        valid_mask = (0 <= numpy.array(loop_vertex_indices)) & (numpy.array(loop_vertex_indices) < len(mesh_vertices))
-        valid_indices = loop_vertex_indices[valid_mask]
+        # 每个顶点按权重取前4个顶点组
+        all_groups, all_weights = cls.get_sorted_vertex_group_weights(mesh, max_groups=max_groups, normalize_all_lock_flags=normalize_all_lock_flags)
 
-        blendindices[valid_mask] = all_groups[valid_indices]
-        blendweights[valid_mask] = all_weights[valid_indices]
+        # 按loop展开
+        blendindices = all_groups[loop_vertex_indices].astype(numpy.uint32)
+        blendweights = all_weights[loop_vertex_indices]
 
         # XXX 必须对当前obj对象执行权重规格化，否则模型细分后会导致模型坑坑洼洼
         
@@ -363,53 +493,32 @@ class VertexGroupUtils:
         return blendweights_dict, blendindices_dict
     
     @classmethod
-    def get_blendweights_blendindices_v3(cls,mesh, normalize_weights: bool = False):
+    def get_blendweights_blendindices_v3(cls,mesh, normalize_weights: bool = False,normalize_all_lock_flags = None):
         print("get_blendweights_blendindices_v3")
         print(normalize_weights)
 
         mesh_loops = mesh.loops
         mesh_loops_length = len(mesh_loops)
-        mesh_vertices = mesh.vertices
         
         # 获取循环顶点的顶点索引
         loop_vertex_indices = numpy.empty(mesh_loops_length, dtype=int)
         mesh_loops.foreach_get("vertex_index", loop_vertex_indices)
-        
-        # 计算每个顶点的最大组数（向上取整到最近的4的倍数）
-        max_groups_per_vertex = 0
-        for v in mesh_vertices:
-            group_count = len(v.groups)
-            if group_count > max_groups_per_vertex:
-                max_groups_per_vertex = group_count
-        
-        # 将最大组数对齐到4的倍数（每个语义索引包含4个权重）
-        max_groups_per_vertex = ((max_groups_per_vertex + 3) // 4) * 4
-        num_sets = max_groups_per_vertex // 4  # 需要的语义索引数量
 
-        # print("num_sets: " + str(num_sets))
-        
-        # 如果最大组数小于4，至少需要1组
-        if num_sets == 0 and max_groups_per_vertex > 0:
-            num_sets = 1
+        # 提取并排序顶点组，宽度为每个顶点的最大组数
+        all_groups, all_weights = cls.get_sorted_vertex_group_weights(mesh, normalize_all_lock_flags=normalize_all_lock_flags)
         
+        # 将最大组数对齐到4的倍数（每个语义索引包含4个权重）
         groups_per_set = 4
+        num_sets = (all_groups.shape[1] + groups_per_set - 1) // groups_per_set  # 需要的语义索引数量
         total_groups = num_sets * groups_per_set
 
-        # 提取并排序顶点组（取前 total_groups 个）
-        sorted_groups = [
-            sorted(v.groups, key=lambda x: x.weight, reverse=True)[:total_groups]
-            for v in mesh_vertices
-        ]
-
-        # 初始化存储数组
-        all_groups = numpy.zeros((len(mesh_vertices), total_groups), dtype=int)
-        all_weights = numpy.zeros((len(mesh_vertices), total_groups), dtype=numpy.float32)
+        # print("num_sets: " + str(num_sets))
 
-        # 填充权重和索引数据
-        for v_idx, groups in enumerate(sorted_groups):
-            count = min(len(groups), total_groups)
-            all_groups[v_idx, :count] = [g.group for g in groups][:count]
-            all_weights[v_idx, :count] = [g.weight for g in groups][:count]
+        # 补0到total_groups
+        padding = total_groups - all_groups.shape[1]
+        if padding > 0:
+            all_groups = numpy.pad(all_groups, ((0, 0), (0, padding)))
+            all_weights = numpy.pad(all_weights, ((0, 0), (0, padding)))
 
         # 关键步骤：整体归一化所有权重
         if normalize_weights:
@@ -420,30 +529,17 @@ class VertexGroupUtils:
             # 归一化权重
             all_weights = all_weights / weight_sums[:, numpy.newaxis]
 
-
-        # 将数据重塑为 [顶点数, 组数, 4]
-        all_weights_reshaped = all_weights.reshape(len(mesh_vertices), num_sets, groups_per_set)
-        all_groups_reshaped = all_groups.reshape(len(mesh_vertices), num_sets, groups_per_set)
-
         # 初始化输出字典
         blendweights_dict = {}
         blendindices_dict = {}
 
+        # 先按loop展开，再按每4个切分为独立的语义索引
+        loop_groups = all_groups[loop_vertex_indices].astype(numpy.uint32)
+        loop_weights = all_weights[loop_vertex_indices]
 
-        # 为每组数据创建独立数组
         for set_idx in range(num_sets):
-            # 初始化当前组的存储
-            blendweights = numpy.zeros((mesh_loops_length, groups_per_set), dtype=numpy.float32)
-            blendindices = numpy.zeros((mesh_loops_length, groups_per_set), dtype=numpy.uint32)
-            
-            # 创建有效索引掩码
-            valid_mask = (0 <= loop_vertex_indices) & (loop_vertex_indices < len(mesh_vertices))
-            valid_indices = loop_vertex_indices[valid_mask]
-            
-            # 映射数据到循环顶点
-            blendweights[valid_mask] = all_weights_reshaped[valid_indices, set_idx, :]
-            blendindices[valid_mask] = all_groups_reshaped[valid_indices, set_idx, :]
-
+            blendweights = numpy.ascontiguousarray(loop_weights[:, set_idx * groups_per_set:(set_idx + 1) * groups_per_set])
+            blendindices = numpy.ascontiguousarray(loop_groups[:, set_idx * groups_per_set:(set_idx + 1) * groups_per_set])
             
             # 3. 关键：再把每行 4 个权重重新归一化到 1（和 v1 最后一行等价）
             if normalize_weights:
@@ -452,82 +548,48 @@ class VertexGroupUtils:
                 numpy.putmask(row_sum, row_sum == 0, 1.0)
                 blendweights = blendweights / row_sum
 
-            
             # 存储到字典（使用SemanticIndex作为键）
             blendweights_dict[set_idx] = blendweights
             blendindices_dict[set_idx] = blendindices
 
-        # blendweights = blendweights / numpy.sum(blendweights, axis=1)[:, None]
-        # print("blendweights_dict: " + str(blendweights_dict[2][0]))
-        # print("blendindices_dict: " + str(blendindices_dict[2][0]))
-
         return blendweights_dict, blendindices_dict
-    
-
-
 
     @classmethod
-    def get_blendweights_blendindices_v4(cls, mesh, normalize_weights: bool = False,blend_size = 4):
+    def get_blendweights_blendindices_v4(cls, mesh, normalize_weights: bool = False,blend_size = 4,normalize_all_lock_flags = None):
         """
         目前只有鸣潮在使用，尚未在其它游戏中进行测试
         TODO 需要测试其它游戏是否兼容。
         """
         # -------------------- 基础数据 --------------------
         mesh_loops = mesh.loops
-        mesh_verts = mesh.vertices
         n_loops = len(mesh_loops)
 
         # 提前把每条 loop 对应的顶点索引抓出来
         loop_vertex_indices = numpy.empty(n_loops, dtype=int)
         mesh_loops.foreach_get("vertex_index", loop_vertex_indices)
 
-        # -------------------- 1. 收集每个顶点的所有非零权重组 --------------------
-        # 用 Python list 先存，因为每组数量不固定
-        vert_groups_weights = []   # [[(group_id, weight), ...], ...] 长度 = 顶点数
-        for v in mesh_verts:
-            # 只保留 weight > 0 的组，防止空数据
-            gw = [(g.group, g.weight) for g in v.groups if g.weight > 0]
-            # 按权重从大到小排序，方便后续直接取前 N 个
-            gw.sort(key=lambda x: x[1], reverse=True)
-            vert_groups_weights.append(gw)
+        # -------------------- 1. 收集每个顶点的所有非零权重组，按权重从大到小排序 --------------------
+        all_groups, all_weights = cls.get_sorted_vertex_group_weights(mesh, remove_zero_weights=True, normalize_all_lock_flags=normalize_all_lock_flags)
 
         # -------------------- 2. 计算“真实最大组数”并补齐到 4 的倍数 --------------------
-        # 先找所有顶点里真实存在的最大组数
-        real_max_groups = max(len(gw) for gw in vert_groups_weights) if vert_groups_weights else 0
-        # 补齐到 4 的倍数
+        real_max_groups = all_groups.shape[1]
         aligned_max_groups = 4 * math.ceil(real_max_groups / 4) if real_max_groups else 4
 
         if aligned_max_groups < blend_size:
             aligned_max_groups = blend_size
 
-        # -------------------- 3. 一次性申请对齐后的 ndarray --------------------
-        # 所有顶点一起存，方便后面用高级索引一次性映射到 loop
-        all_groups = numpy.zeros((len(mesh_verts), aligned_max_groups), dtype=int)
-        all_weights = numpy.zeros((len(mesh_verts), aligned_max_groups), dtype=numpy.float32)
-
-        # -------------------- 4. 填充数据 & 可选归一化 --------------------
-        for v_idx, gw in enumerate(vert_groups_weights):
-            # 把真实数据写进去
-            for col, (g_id, w) in enumerate(gw):
-                all_groups[v_idx, col] = g_id
-                all_weights[v_idx, col] = w
-
-            # 如果 normalize_weights=True，对该顶点权重归一化（保留 0 的位置仍为 0）
-            weight_sum = all_weights[v_idx].sum()
-            if weight_sum > 0:
-                all_weights[v_idx] /= weight_sum
-
-        # -------------------- 5. 把“逐顶点”数据映射到“逐 loop” --------------------
-        # 先检查索引合法性，防止越界
-        valid_mask = (0 <= loop_vertex_indices) & (loop_vertex_indices < len(mesh_verts))
-        valid_vidx = loop_vertex_indices[valid_mask]
-
-        blendindices = numpy.zeros((n_loops, aligned_max_groups), dtype=numpy.uint32)
-        blendweights = numpy.zeros((n_loops, aligned_max_groups), dtype=numpy.float32)
-
-        # 高级索引一次性拷贝
-        blendindices[valid_mask] = all_groups[valid_vidx]
-        blendweights[valid_mask] = all_weights[valid_vidx]
-
-        # -------------------- 6. 返回兼容旧接口的字典 --------------------
-        return {0: blendweights}, {0: blendindices}
\ No newline at end of file
+        padding = aligned_max_groups - real_max_groups
+        all_groups = numpy.pad(all_groups, ((0, 0), (0, padding)))
+        all_weights = numpy.pad(all_weights, ((0, 0), (0, padding)))
+
+        # -------------------- 3. 归一化（保留 0 的位置仍为 0） --------------------
+        weight_sums = all_weights.sum(axis=1)
+        nonzero_mask = weight_sums > 0
+        all_weights[nonzero_mask] /= weight_sums[nonzero_mask][:, None]
+
+        # -------------------- 4. 把“逐顶点”数据映射到“逐 loop” --------------------
+        blendindices = all_groups[loop_vertex_indices].astype(numpy.uint32)
+        blendweights = all_weights[loop_vertex_indices]
+
+        # -------------------- 5. 返回兼容旧接口的字典 --------------------
+        return {0: blendweights}, {0: blendindices}